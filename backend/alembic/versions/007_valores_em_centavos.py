@@ -0,0 +1,62 @@
+"""Store monetary values as integer cents (BIGINT) instead of float
+
+Revision ID: 007_valores_em_centavos
+Revises: 006_add_total_parcial
+Create Date: 2026-10-18
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "007_valores_em_centavos"
+down_revision = "006_add_total_parcial"
+branch_labels = None
+depends_on = None
+
+# (tabela, coluna float antiga, coluna em centavos nova)
+_COLUNAS = [
+    ("boletos", "valor", "valor_centavos"),
+    ("xmls_nfe", "valor_total", "valor_total_centavos"),
+    ("operacoes", "valor_bruto", "valor_bruto_centavos"),
+    ("operacoes", "valor_liquido", "valor_liquido_centavos"),
+]
+
+
+def upgrade() -> None:
+    # 1. Colunas em centavos + backfill a partir dos floats
+    for tabela, antiga, nova in _COLUNAS:
+        op.add_column(tabela, sa.Column(nova, sa.BigInteger(), nullable=True))
+        op.execute(f"UPDATE {tabela} SET {nova} = ROUND({antiga}::numeric * 100)::bigint")
+        op.drop_column(tabela, antiga)
+
+    # 2. Duplicatas: acrescenta valor_centavos em cada item do JSONB
+    op.execute(
+        """
+        UPDATE xmls_nfe SET duplicatas = (
+          SELECT jsonb_agg(
+            dup || jsonb_build_object(
+              'valor_centavos', ROUND(COALESCE((dup->>'valor')::numeric, 0) * 100)::bigint
+            )
+          )
+          FROM jsonb_array_elements(duplicatas) AS dup
+        )
+        WHERE duplicatas IS NOT NULL AND jsonb_array_length(duplicatas) > 0
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute(
+        """
+        UPDATE xmls_nfe SET duplicatas = (
+          SELECT jsonb_agg(dup - 'valor_centavos')
+          FROM jsonb_array_elements(duplicatas) AS dup
+        )
+        WHERE duplicatas IS NOT NULL AND jsonb_array_length(duplicatas) > 0
+        """
+    )
+
+    for tabela, antiga, nova in _COLUNAS:
+        op.add_column(tabela, sa.Column(antiga, sa.Float(), nullable=True))
+        op.execute(f"UPDATE {tabela} SET {antiga} = {nova} / 100.0")
+        op.drop_column(tabela, nova)
@@ -0,0 +1,28 @@
+"""Add validacao_fingerprint to boletos and row version to xmls_nfe
+
+Revision ID: 008_validacao_fingerprint
+Revises: 007_valores_em_centavos
+Create Date: 2026-10-18
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "008_validacao_fingerprint"
+down_revision = "007_valores_em_centavos"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Boletos existentes ficam sem fingerprint: o primeiro reprocessamento valida tudo
+    op.add_column("boletos", sa.Column("validacao_fingerprint", sa.String(64), nullable=True))
+    op.add_column(
+        "xmls_nfe",
+        sa.Column("versao", sa.Integer(), nullable=False, server_default="1"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("xmls_nfe", "versao")
+    op.drop_column("boletos", "validacao_fingerprint")
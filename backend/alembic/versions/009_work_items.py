@@ -0,0 +1,48 @@
+"""Add work_items table (page extraction / email sending queue)
+
+Revision ID: 009_work_items
+Revises: 008_validacao_fingerprint
+Create Date: 2026-10-18
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = "009_work_items"
+down_revision = "008_validacao_fingerprint"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "work_items",
+        sa.Column("id", postgresql.UUID(as_uuid=True), primary_key=True, server_default=sa.text("uuid_generate_v4()")),
+        sa.Column("tipo", sa.String(30), nullable=False),
+        sa.Column("operacao_id", postgresql.UUID(as_uuid=True), sa.ForeignKey("operacoes.id"), nullable=False),
+        sa.Column("payload", postgresql.JSONB(), nullable=False, server_default="{}"),
+        sa.Column("status", sa.String(20), nullable=False, server_default="pendente"),
+        sa.Column("tentativas", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("worker_id", sa.String(100), nullable=True),
+        sa.Column("heartbeat_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("erro", sa.Text(), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("concluido_at", sa.DateTime(timezone=True), nullable=True),
+    )
+    op.create_index(
+        "ix_work_items_pendentes", "work_items", ["created_at"],
+        postgresql_where=sa.text("status = 'pendente'"),
+    )
+    op.create_index(
+        "ix_work_items_em_execucao", "work_items", ["heartbeat_at"],
+        postgresql_where=sa.text("status = 'em_execucao'"),
+    )
+    op.create_index("ix_work_items_operacao_id", "work_items", ["operacao_id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_work_items_operacao_id", table_name="work_items")
+    op.drop_index("ix_work_items_em_execucao", table_name="work_items")
+    op.drop_index("ix_work_items_pendentes", table_name="work_items")
+    op.drop_table("work_items")
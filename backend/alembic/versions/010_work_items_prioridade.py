@@ -0,0 +1,41 @@
+"""Add prioridade and usuario_id to work_items (fair-share claims)
+
+Revision ID: 010_work_items_prioridade
+Revises: 009_work_items
+Create Date: 2026-10-18
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = "010_work_items_prioridade"
+down_revision = "009_work_items"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "work_items",
+        sa.Column("usuario_id", postgresql.UUID(as_uuid=True), sa.ForeignKey("usuarios.id"), nullable=True),
+    )
+    op.add_column(
+        "work_items",
+        sa.Column("prioridade", sa.SmallInteger(), nullable=False, server_default="1"),
+    )
+    op.drop_index("ix_work_items_pendentes", table_name="work_items")
+    op.create_index(
+        "ix_work_items_pendentes", "work_items", ["prioridade", "created_at"],
+        postgresql_where=sa.text("status = 'pendente'"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_work_items_pendentes", table_name="work_items")
+    op.create_index(
+        "ix_work_items_pendentes", "work_items", ["created_at"],
+        postgresql_where=sa.text("status = 'pendente'"),
+    )
+    op.drop_column("work_items", "prioridade")
+    op.drop_column("work_items", "usuario_id")
@@ -0,0 +1,55 @@
+"""Add dashboard_rollup (day x FIDC x status) and index operacoes.created_at
+
+Revision ID: 011_dashboard_rollup
+Revises: 010_work_items_prioridade
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = "011_dashboard_rollup"
+down_revision = "010_work_items_prioridade"
+branch_labels = None
+depends_on = None
+
+# Copia congelada do calculo nesta revisao: a migration nao acompanha mudancas
+# futuras do modelo. O recalculo mantido e o de app/backfill_dashboard.py.
+BACKFILL_SQL = """
+INSERT INTO dashboard_rollup (
+    dia, fidc_id, status, operacoes, total_boletos, total_aprovados,
+    total_parcialmente_aprovados, total_rejeitados, valor_bruto_centavos, valor_liquido_centavos
+)
+SELECT
+    (created_at AT TIME ZONE 'UTC')::date, fidc_id, status, count(*),
+    coalesce(sum(total_boletos), 0), coalesce(sum(total_aprovados), 0),
+    coalesce(sum(total_parcialmente_aprovados), 0), coalesce(sum(total_rejeitados), 0),
+    coalesce(sum(valor_bruto_centavos), 0), coalesce(sum(valor_liquido_centavos), 0)
+FROM operacoes
+WHERE created_at IS NOT NULL
+GROUP BY 1, 2, 3
+"""
+
+
+def upgrade() -> None:
+    op.create_table(
+        "dashboard_rollup",
+        sa.Column("dia", sa.Date(), primary_key=True),
+        sa.Column("fidc_id", postgresql.UUID(as_uuid=True), sa.ForeignKey("fidcs.id"), primary_key=True),
+        sa.Column("status", sa.String(30), primary_key=True),
+        sa.Column("operacoes", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("total_boletos", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.Column("total_aprovados", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.Column("total_parcialmente_aprovados", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.Column("total_rejeitados", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.Column("valor_bruto_centavos", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.Column("valor_liquido_centavos", sa.BigInteger(), nullable=False, server_default="0"),
+    )
+    op.create_index("ix_operacoes_created_at", "operacoes", ["created_at"])
+    op.execute(BACKFILL_SQL)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_operacoes_created_at", table_name="operacoes")
+    op.drop_table("dashboard_rollup")
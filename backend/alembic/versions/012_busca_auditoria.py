@@ -0,0 +1,78 @@
+"""Add trigram search columns/indexes for the auditoria search
+
+Revision ID: 012_busca_auditoria
+Revises: 011_dashboard_rollup
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "012_busca_auditoria"
+down_revision = "011_dashboard_rollup"
+branch_labels = None
+depends_on = None
+
+# Mesma regra de app/extractors/similaridade.py::normalizar_nome
+# (upper, sem acentos, sem pontuacao, espacos colapsados)
+_NOME_NORMALIZADO = """
+nullif(btrim(regexp_replace(regexp_replace(
+    translate(upper(btrim({col})), 'ÁÀÃÂÄÉÈÊËÍÌÎÏÓÒÕÔÖÚÙÛÜÇ', 'AAAAAEEEEIIIIOOOOOUUUUC'),
+    '[^\\w\\s]', '', 'g'), '\\s+', ' ', 'g')), '')
+"""
+
+BACKFILL_BOLETOS = f"""
+UPDATE boletos SET
+    busca_nome = {_NOME_NORMALIZADO.format(col="pagador")},
+    busca_cnpj = nullif(regexp_replace(cnpj, '\\D', '', 'g'), '')
+WHERE pagador IS NOT NULL OR cnpj IS NOT NULL
+"""
+
+BACKFILL_XMLS = f"""
+UPDATE xmls_nfe SET busca_nome = {_NOME_NORMALIZADO.format(col="nome_destinatario")}
+WHERE nome_destinatario IS NOT NULL
+"""
+
+_TRGM = {"postgresql_using": "gin"}
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+
+    op.add_column("boletos", sa.Column("busca_nome", sa.String(300), nullable=True))
+    op.add_column("boletos", sa.Column("busca_cnpj", sa.String(20), nullable=True))
+    op.add_column("xmls_nfe", sa.Column("busca_nome", sa.String(300), nullable=True))
+    op.execute(BACKFILL_BOLETOS)
+    op.execute(BACKFILL_XMLS)
+
+    op.create_index(
+        "ix_boletos_busca_nome_trgm", "boletos", ["busca_nome"],
+        postgresql_ops={"busca_nome": "gin_trgm_ops"}, **_TRGM,
+    )
+    op.create_index(
+        "ix_boletos_busca_cnpj_trgm", "boletos", ["busca_cnpj"],
+        postgresql_ops={"busca_cnpj": "gin_trgm_ops"}, **_TRGM,
+    )
+    op.create_index(
+        "ix_boletos_numero_nota_trgm", "boletos", ["numero_nota"],
+        postgresql_ops={"numero_nota": "gin_trgm_ops"}, **_TRGM,
+    )
+    op.create_index(
+        "ix_xmls_nfe_busca_nome_trgm", "xmls_nfe", ["busca_nome"],
+        postgresql_ops={"busca_nome": "gin_trgm_ops"}, **_TRGM,
+    )
+    # Volta dos XMLs encontrados para os boletos vinculados
+    op.create_index("ix_boletos_xml_nfe_id", "boletos", ["xml_nfe_id"])
+    op.create_index("ix_boletos_created_at", "boletos", ["created_at"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_boletos_created_at", table_name="boletos")
+    op.drop_index("ix_boletos_xml_nfe_id", table_name="boletos")
+    op.drop_index("ix_xmls_nfe_busca_nome_trgm", table_name="xmls_nfe")
+    op.drop_index("ix_boletos_numero_nota_trgm", table_name="boletos")
+    op.drop_index("ix_boletos_busca_cnpj_trgm", table_name="boletos")
+    op.drop_index("ix_boletos_busca_nome_trgm", table_name="boletos")
+    op.drop_column("xmls_nfe", "busca_nome")
+    op.drop_column("boletos", "busca_cnpj")
+    op.drop_column("boletos", "busca_nome")
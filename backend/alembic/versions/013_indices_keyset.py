@@ -0,0 +1,28 @@
+"""Composite (created_at, id) indexes for keyset pagination
+
+Revision ID: 013_indices_keyset
+Revises: 012_busca_auditoria
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+
+revision = "013_indices_keyset"
+down_revision = "012_busca_auditoria"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Substituem os indices so em created_at (o prefixo continua atendendo as mesmas consultas)
+    op.create_index("ix_operacoes_created_at_id", "operacoes", ["created_at", "id"])
+    op.create_index("ix_boletos_created_at_id", "boletos", ["created_at", "id"])
+    op.drop_index("ix_operacoes_created_at", table_name="operacoes")
+    op.drop_index("ix_boletos_created_at", table_name="boletos")
+
+
+def downgrade() -> None:
+    op.create_index("ix_boletos_created_at", "boletos", ["created_at"])
+    op.create_index("ix_operacoes_created_at", "operacoes", ["created_at"])
+    op.drop_index("ix_boletos_created_at_id", table_name="boletos")
+    op.drop_index("ix_operacoes_created_at_id", table_name="operacoes")
@@ -0,0 +1,238 @@
+"""Store the 5 validation layers in compact columns instead of 5 JSONB documents
+
+Revision ID: 014_validacao_compacta
+Revises: 013_indices_keyset
+Create Date: 2026-10-19
+"""
+
+import re
+from types import SimpleNamespace
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = "014_validacao_compacta"
+down_revision = "013_indices_keyset"
+branch_labels = None
+depends_on = None
+
+# Codigo de cada camada inferido da mensagem gravada (mesmos codigos de
+# app/extractors/validator.py). "Não validado" vale para qualquer camada.
+_PREFIXOS = {
+    1: [("XML não encontrado", 2), ("XML inválido", 3), ("XML vinculado", 4), ("Número da nota divergente", 5)],
+    2: [("CNPJ não disponível", 1), ("CNPJ confere", 2)],
+    3: [("Nome não disponível", 1), ("Similaridade baixa", 3)],
+    4: [("Valor do boleto não", 1), ("Valor do XML não", 2), ("Valor confere", 3)],
+    5: [("Nenhum email", 2)],
+}
+_PADRAO = {1: 1, 2: 3, 3: 2, 4: 4, 5: 1}
+
+
+def _codigo(n: int) -> str:
+    msg = f"validacao_camada{n}->>'mensagem'"
+    ramos = [f"WHEN validacao_camada{n} IS NULL OR validacao_camada{n} = 'null' THEN 0",
+             f"WHEN {msg} LIKE 'Não validado%' THEN 15"]
+    ramos += [f"WHEN {msg} LIKE '{prefixo}%' THEN {cod}" for prefixo, cod in _PREFIXOS[n]]
+    return f"(CASE {' '.join(ramos)} ELSE {_PADRAO[n]} END)"
+
+
+def _bit(n: int, chave: str, bit: int) -> str:
+    return f"(CASE WHEN (validacao_camada{n}->>'{chave}')::boolean THEN {1 << bit} ELSE 0 END)"
+
+
+_MASCARA = " + ".join(
+    [_bit(n, "aprovado", n - 1) for n in range(1, 6)] + [_bit(n, "bloqueia", n + 4) for n in range(1, 6)]
+)
+_CODIGOS = " + ".join(f"({_codigo(n)} << {4 * (n - 1)})" for n in range(1, 6))
+
+# Mesmas chaves de app/services/validacao_compacta.py::_extra_camada; valores
+# vazios (null, "", [], {}) ficam de fora, como no codificador
+_EXTRA = """
+(SELECT jsonb_object_agg(e.key, e.value) FROM jsonb_each(jsonb_build_object(
+    'nf', CASE WHEN coalesce(validacao_camada1->'detalhes'->>'nf_xml', validacao_camada1->'detalhes'->>'numero_nota')
+                    <> ltrim(coalesce(numero_nota, ''), '0')
+               THEN coalesce(validacao_camada1->'detalhes'->'nf_xml', validacao_camada1->'detalhes'->'numero_nota') END,
+    'erro', CASE WHEN validacao_camada1->>'mensagem' LIKE 'XML inválido: %'
+                 THEN to_jsonb(substr(validacao_camada1->>'mensagem', 15)) END,
+    'vinculo', validacao_camada1->'detalhes'->'vinculo',
+    'candidato', validacao_camada1->'detalhes'->'candidato',
+    'cnpj_xml', CASE WHEN validacao_camada2->'detalhes'->>'cnpj_xml'
+                          <> regexp_replace(coalesce(cnpj, ''), '\\D', '', 'g')
+                     THEN validacao_camada2->'detalhes'->'cnpj_xml' END,
+    'nome_xml', validacao_camada3->'detalhes'->'nome_xml',
+    'parcela', validacao_camada4->'detalhes'->'parcela',
+    'alerta_parcela', validacao_camada4->'detalhes'->'alerta_parcela',
+    'emails', validacao_camada5->'detalhes'->'emails',
+    'emails_invalidos', validacao_camada5->'detalhes'->'emails_invalidos'
+)) AS e
+WHERE e.value NOT IN ('null'::jsonb, '""'::jsonb, '[]'::jsonb, '{}'::jsonb))
+"""
+
+BACKFILL = f"""
+UPDATE boletos SET
+    validacao_mascara = {_MASCARA},
+    validacao_codigos = {_CODIGOS},
+    validacao_similaridade = round((validacao_camada3->'detalhes'->>'similaridade')::numeric * 10),
+    validacao_diferenca_centavos =
+        valor_centavos - round((validacao_camada4->'detalhes'->>'valor_xml')::numeric * 100),
+    validacao_extra = {_EXTRA}
+WHERE coalesce(validacao_camada1, validacao_camada2, validacao_camada3,
+               validacao_camada4, validacao_camada5) IS NOT NULL
+"""
+
+_CAMADAS = [f"validacao_camada{n}" for n in range(1, 6)]
+_COMPACTAS = ["validacao_mascara", "validacao_codigos", "validacao_similaridade",
+              "validacao_diferenca_centavos", "validacao_extra"]
+
+
+def upgrade() -> None:
+    op.add_column("boletos", sa.Column("validacao_mascara", sa.SmallInteger(), nullable=False, server_default="0"))
+    op.add_column("boletos", sa.Column("validacao_codigos", sa.Integer(), nullable=False, server_default="0"))
+    op.add_column("boletos", sa.Column("validacao_similaridade", sa.SmallInteger(), nullable=True))
+    op.add_column("boletos", sa.Column("validacao_diferenca_centavos", sa.BigInteger(), nullable=True))
+    op.add_column("boletos", sa.Column("validacao_extra", postgresql.JSONB(), nullable=True))
+    op.execute(BACKFILL)
+    for coluna in _CAMADAS:
+        op.drop_column("boletos", coluna)
+    # O espaco das colunas removidas so volta ao disco com VACUUM FULL / pg_repack
+
+
+# ── Decodificador congelado (downgrade) ─────────────────────
+# Copia de app/services/validacao_compacta.py::decodificar_camada e dos
+# codigos de app/extractors/validator.py nesta revisao: a migration nao
+# acompanha mudancas futuras do app.
+
+_NOMES = {1: "XML", 2: "CNPJ", 3: "Nome", 4: "Valor", 5: "Email"}
+_NAO_VALIDADO = 15
+_SIMILARIDADE_MINIMA = 0.85
+_TABELA_ACENTOS = str.maketrans("ÁÀÃÂÄÉÈÊËÍÌÎÏÓÒÕÔÖÚÙÛÜÇ", "AAAAAEEEEIIIIOOOOOUUUUC")
+
+
+def _normalizar_nome(nome: str) -> str:
+    nome = re.sub(r"[^\w\s]", "", nome.upper().strip().translate(_TABELA_ACENTOS))
+    return re.sub(r"\s+", " ", nome).strip()
+
+
+def _mensagem_e_detalhes(b, n: int, cod: int, extra: dict) -> tuple[str, dict]:
+    if cod == _NAO_VALIDADO:
+        return "Não validado (camada anterior falhou)", {}
+
+    if n == 1:
+        nf_boleto = (b.numero_nota or "").lstrip("0")
+        nf_xml = extra.get("nf", nf_boleto)
+        if cod == 2:
+            detalhes = {"candidato": extra["candidato"]} if extra.get("candidato") else {}
+            return f"XML não encontrado para nota {b.numero_nota or '?'}", detalhes
+        if cod == 3:
+            return f"XML inválido: {extra.get('erro') or 'erro desconhecido'}", {}
+        if cod == 4:
+            vinculo = extra.get("vinculo") or {}
+            return (
+                f"XML vinculado automaticamente (NF boleto={nf_boleto or '?'}, XML={nf_xml}, "
+                f"confiança {vinculo.get('confianca', 0) * 100:.0f}%)",
+                {"numero_nota": nf_xml, "nf_boleto": nf_boleto, "vinculo": vinculo},
+            )
+        if cod == 5:
+            return (
+                f"Número da nota divergente: boleto={nf_boleto}, XML={nf_xml}",
+                {"nf_boleto": nf_boleto, "nf_xml": nf_xml},
+            )
+        return "XML válido e número da nota confere", {"numero_nota": nf_xml}
+
+    if n == 2:
+        cnpj_boleto = re.sub(r"\D", "", b.cnpj or "")
+        if cod == 2:
+            return "CNPJ confere", {"cnpj": cnpj_boleto}
+        cnpj_xml = extra.get("cnpj_xml", "")
+        detalhes = {"cnpj_boleto": cnpj_boleto, "cnpj_xml": cnpj_xml}
+        if cod == 1:
+            return "CNPJ não disponível para comparação", detalhes
+        return f"CNPJ divergente! Boleto={cnpj_boleto}, XML={cnpj_xml}", detalhes
+
+    if n == 3:
+        nome_boleto = _normalizar_nome(b.pagador or "")
+        nome_xml = extra.get("nome_xml", "")
+        if cod == 1:
+            return "Nome não disponível para comparação", {"nome_boleto": nome_boleto, "nome_xml": nome_xml}
+        pct = (b.validacao_similaridade or 0) / 10
+        detalhes = {"similaridade": pct, "nome_boleto": nome_boleto, "nome_xml": nome_xml}
+        if cod == 2:
+            return f"Similaridade {pct}% (>={_SIMILARIDADE_MINIMA * 100:.0f}%)", detalhes
+        return f"Similaridade baixa ({pct}%)", detalhes
+
+    if n == 4:
+        centavos = b.valor_centavos or 0
+        diferenca = b.validacao_diferenca_centavos or 0
+        detalhes: dict = {}
+        if cod == 1:
+            mensagem = "Valor do boleto não disponível para comparação"
+        elif cod == 2:
+            mensagem = "Valor do XML não disponível para comparação"
+            detalhes = {"valor_boleto": centavos / 100}
+        elif cod == 3:
+            mensagem = "Valor confere"
+            detalhes = {"valor_boleto": centavos / 100, "valor_xml": (centavos - diferenca) / 100}
+        else:
+            mensagem = f"Valor divergente! Diferença R$ {abs(diferenca) / 100:.2f}"
+            detalhes = {
+                "valor_boleto": centavos / 100,
+                "valor_xml": (centavos - diferenca) / 100,
+                "diferenca": abs(diferenca) / 100,
+            }
+        detalhes.update({k: extra[k] for k in ("parcela", "alerta_parcela") if k in extra})
+        return mensagem, detalhes
+
+    emails_invalidos = extra.get("emails_invalidos", [])
+    if cod == 1:
+        emails = extra.get("emails", [])
+        return f"{len(emails)} email(s) válido(s)", {"emails": emails, "emails_invalidos": emails_invalidos}
+    msg = "Nenhum email válido encontrado"
+    if emails_invalidos:
+        msg += f" (filtrados: {emails_invalidos})"
+    return msg, {"emails_invalidos": emails_invalidos}
+
+
+def _decodificar_camada(b, n: int) -> dict | None:
+    cod = ((b.validacao_codigos or 0) >> (4 * (n - 1))) & 0xF
+    if cod == 0:
+        return None
+    mascara = b.validacao_mascara or 0
+    mensagem, detalhes = _mensagem_e_detalhes(b, n, cod, b.validacao_extra or {})
+    return {
+        "camada": n,
+        "nome": _NOMES[n],
+        "aprovado": bool(mascara & (1 << (n - 1))),
+        "mensagem": mensagem,
+        "bloqueia": bool(mascara & (1 << (n + 4))),
+        "detalhes": detalhes,
+    }
+
+
+def downgrade() -> None:
+    for coluna in _CAMADAS:
+        op.add_column("boletos", sa.Column(coluna, postgresql.JSONB(), nullable=True))
+
+    boletos = sa.table(
+        "boletos",
+        sa.column("id"), sa.column("pagador"), sa.column("cnpj"), sa.column("numero_nota"),
+        sa.column("valor_centavos"),
+        *[sa.column(c) for c in _COMPACTAS[:-1]],
+        sa.column("validacao_extra", postgresql.JSONB()),
+        *[sa.column(c, postgresql.JSONB(none_as_null=True)) for c in _CAMADAS],
+    )
+    conn = op.get_bind()
+    linhas = conn.execute(
+        sa.select(*[boletos.c[c] for c in ("id", "pagador", "cnpj", "numero_nota", "valor_centavos", *_COMPACTAS)])
+        .where(boletos.c.validacao_codigos != 0)
+    ).all()
+    for linha in linhas:
+        registro = SimpleNamespace(**linha._mapping)
+        conn.execute(
+            boletos.update()
+            .where(boletos.c.id == linha.id)
+            .values({f"validacao_camada{n}": _decodificar_camada(registro, n) for n in range(1, 6)})
+        )
+
+    for coluna in reversed(_COMPACTAS):
+        op.drop_column("boletos", coluna)
@@ -0,0 +1,144 @@
+"""Monthly range partitioning of boletos, envios and audit_log on created_at
+
+Revision ID: 015_particoes_mensais
+Revises: 014_validacao_compacta
+Create Date: 2026-10-19
+"""
+
+from datetime import date, datetime, timezone
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "015_particoes_mensais"
+down_revision = "014_validacao_compacta"
+branch_labels = None
+depends_on = None
+
+_TRGM = {"postgresql_using": "gin"}
+
+# Congelado nesta revisao (app/services/particoes.py e Settings podem mudar);
+# meses alem destes sao criados por python -m app.manutencao_particoes
+TABELAS = ("boletos", "envios", "audit_log")
+MESES_FUTUROS = 3
+
+# Indices e FKs recriados na tabela pai (propagam para cada particao)
+INDICES = {
+    "boletos": [
+        ("ix_boletos_operacao_id", ["operacao_id"], {}),
+        ("ix_boletos_status", ["status"], {}),
+        ("ix_boletos_numero_nota", ["numero_nota"], {}),
+        ("ix_boletos_xml_nfe_id", ["xml_nfe_id"], {}),
+        ("ix_boletos_created_at_id", ["created_at", "id"], {}),
+        ("ix_boletos_busca_nome_trgm", ["busca_nome"], {"postgresql_ops": {"busca_nome": "gin_trgm_ops"}, **_TRGM}),
+        ("ix_boletos_busca_cnpj_trgm", ["busca_cnpj"], {"postgresql_ops": {"busca_cnpj": "gin_trgm_ops"}, **_TRGM}),
+        ("ix_boletos_numero_nota_trgm", ["numero_nota"], {"postgresql_ops": {"numero_nota": "gin_trgm_ops"}, **_TRGM}),
+    ],
+    "envios": [
+        ("ix_envios_operacao_id", ["operacao_id"], {}),
+    ],
+    "audit_log": [
+        ("ix_audit_log_operacao_id", ["operacao_id"], {}),
+        ("ix_audit_log_created_at", ["created_at"], {}),
+    ],
+}
+
+FKS = {
+    "boletos": [("operacao_id", "operacoes"), ("xml_nfe_id", "xmls_nfe")],
+    "envios": [("operacao_id", "operacoes"), ("usuario_id", "usuarios")],
+    "audit_log": [("operacao_id", "operacoes"), ("usuario_id", "usuarios")],
+}
+
+
+def _inicio_mes(dia: date) -> date:
+    return dia.replace(day=1)
+
+
+def _somar_meses(mes: date, n: int) -> date:
+    total = mes.year * 12 + mes.month - 1 + n
+    return date(total // 12, total % 12 + 1, 1)
+
+
+def _nome_particao(tabela: str, mes: date) -> str:
+    return f"{tabela}_{mes:%Y_%m}"
+
+
+def _limite(mes) -> str:
+    return f"'{mes.isoformat()} 00:00:00+00'"
+
+
+def _sequencia(conn, tabela: str) -> str | None:
+    return conn.execute(sa.text("SELECT pg_get_serial_sequence(:t, 'id')"), {"t": tabela}).scalar()
+
+
+def _recriar_restricoes(tabela: str, pk: list[str]) -> None:
+    op.create_primary_key(f"{tabela}_pkey", tabela, pk)
+    for coluna, ref in FKS[tabela]:
+        op.create_foreign_key(f"{tabela}_{coluna}_fkey", tabela, ref, [coluna], ["id"])
+    for nome, colunas, kwargs in INDICES[tabela]:
+        op.create_index(nome, tabela, colunas, **kwargs)
+
+
+def _particionar(conn, tabela: str) -> None:
+    legado = f"{tabela}_legado"
+    sequencia = _sequencia(conn, tabela)
+
+    op.execute(f"UPDATE {tabela} SET created_at = now() WHERE created_at IS NULL")
+    op.execute(f"ALTER TABLE {tabela} RENAME TO {legado}")
+    op.execute(f"CREATE TABLE {tabela} (LIKE {legado} INCLUDING DEFAULTS) PARTITION BY RANGE (created_at)")
+    op.execute(f"ALTER TABLE {tabela} ALTER COLUMN created_at SET NOT NULL")
+
+    # Um mes por particao, do registro mais antigo ate MESES_FUTUROS adiante
+    mais_antigo = conn.execute(sa.text(f"SELECT min(created_at) FROM {legado}")).scalar()
+    atual = _inicio_mes(datetime.now(timezone.utc).date())
+    mes = _inicio_mes(mais_antigo.astimezone(timezone.utc).date()) if mais_antigo else atual
+    ultimo = _somar_meses(atual, MESES_FUTUROS)
+    while mes <= ultimo:
+        seguinte = _somar_meses(mes, 1)
+        op.execute(
+            f"CREATE TABLE {_nome_particao(tabela, mes)} PARTITION OF {tabela} "
+            f"FOR VALUES FROM ({_limite(mes)}) TO ({_limite(seguinte)})"
+        )
+        mes = seguinte
+    op.execute(f"CREATE TABLE {tabela}_default PARTITION OF {tabela} DEFAULT")
+
+    op.execute(f"INSERT INTO {tabela} SELECT * FROM {legado}")
+    if sequencia:
+        # A sequencia do id (audit_log) sobrevive ao DROP da tabela antiga
+        op.execute(f"ALTER SEQUENCE {sequencia} OWNED BY NONE")
+    op.execute(f"DROP TABLE {legado}")
+    if sequencia:
+        op.execute(f"ALTER SEQUENCE {sequencia} OWNED BY {tabela}.id")
+
+    # Indices criados depois da carga, em cada particao
+    _recriar_restricoes(tabela, ["id", "created_at"])
+
+
+def _desparticionar(conn, tabela: str) -> None:
+    particionada = f"{tabela}_particionada"
+    sequencia = _sequencia(conn, tabela)
+
+    op.execute(f"ALTER TABLE {tabela} RENAME TO {particionada}")
+    op.execute(f"CREATE TABLE {tabela} (LIKE {particionada} INCLUDING DEFAULTS)")
+    op.execute(f"ALTER TABLE {tabela} ALTER COLUMN created_at DROP NOT NULL")
+    op.execute(f"INSERT INTO {tabela} SELECT * FROM {particionada}")
+    if sequencia:
+        op.execute(f"ALTER SEQUENCE {sequencia} OWNED BY NONE")
+    op.execute(f"DROP TABLE {particionada} CASCADE")
+    if sequencia:
+        op.execute(f"ALTER SEQUENCE {sequencia} OWNED BY {tabela}.id")
+
+    _recriar_restricoes(tabela, ["id"])
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    for tabela in TABELAS:
+        _particionar(conn, tabela)
+
+
+def downgrade() -> None:
+    # Particoes ja arquivadas (esquema PARTICOES_ESQUEMA_ARQUIVO) nao voltam
+    conn = op.get_bind()
+    for tabela in TABELAS:
+        _desparticionar(conn, tabela)
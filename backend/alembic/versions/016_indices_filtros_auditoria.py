@@ -0,0 +1,49 @@
+"""Partial/expression indexes for the auditoria validation filters
+
+Revision ID: 016_indices_filtros_auditoria
+Revises: 015_particoes_mensais
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "016_indices_filtros_auditoria"
+down_revision = "015_particoes_mensais"
+branch_labels = None
+depends_on = None
+
+
+# Layout de app/services/validacao_compacta.py congelado nesta revisao:
+# bit n-1 = camada n aprovada, bit n+4 = camada n bloqueia, 4 bits de codigo
+# por camada em validacao_codigos
+CAMADAS = range(1, 6)
+MASCARA_BLOQUEIA = sum(1 << (n + 4) for n in CAMADAS)
+
+
+# Mesmos predicados que app/routers/auditoria.py monta (constantes inline),
+# senao o planner nao usa o indice parcial
+def _reprovada(camada: int) -> str:
+    m = 0xF << (4 * (camada - 1))
+    return f"(validacao_mascara & {1 << (camada - 1)}) = 0 AND (validacao_codigos & {m}) NOT IN (0, {m})"
+
+
+# Indices parciais so com as linhas que casam (poucas: a maioria passa), na
+# ordem da listagem (created_at, id)
+PARCIAIS = {
+    **{f"ix_boletos_reprovada_camada{n}": _reprovada(n) for n in CAMADAS},
+    "ix_boletos_bloqueante": f"(validacao_mascara & {MASCARA_BLOQUEIA}) <> 0",
+    "ix_boletos_juros": "juros_detectado",
+}
+
+
+def upgrade() -> None:
+    for nome, predicado in PARCIAIS.items():
+        op.create_index(nome, "boletos", ["created_at", "id"], postgresql_where=sa.text(predicado))
+    op.create_index("ix_boletos_validacao_similaridade", "boletos", ["validacao_similaridade"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_boletos_validacao_similaridade", table_name="boletos")
+    for nome in reversed(PARCIAIS):
+        op.drop_index(nome, table_name="boletos")
@@ -0,0 +1,47 @@
+"""Backfill do rollup do dashboard — recalcula dashboard_rollup a partir de operacoes.
+
+Run: python -m app.backfill_dashboard  (from backend/ directory)
+
+Necessario so se o rollup divergir (ex.: operacoes alteradas por SQL manual,
+fora do ORM). Roda numa transacao com operacoes travada contra escrita, entao
+nenhuma mudanca concorrente se perde entre o DELETE e o INSERT.
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+# Ensure backend/ is in path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy import text
+
+from app.database import engine
+
+# Fonte unica do recalculo (a migration 011 tem uma copia congelada propria)
+BACKFILL_SQL = """
+INSERT INTO dashboard_rollup (
+    dia, fidc_id, status, operacoes, total_boletos, total_aprovados,
+    total_parcialmente_aprovados, total_rejeitados, valor_bruto_centavos, valor_liquido_centavos
+)
+SELECT
+    (created_at AT TIME ZONE 'UTC')::date, fidc_id, status, count(*),
+    coalesce(sum(total_boletos), 0), coalesce(sum(total_aprovados), 0),
+    coalesce(sum(total_parcialmente_aprovados), 0), coalesce(sum(total_rejeitados), 0),
+    coalesce(sum(valor_bruto_centavos), 0), coalesce(sum(valor_liquido_centavos), 0)
+FROM operacoes
+WHERE created_at IS NOT NULL
+GROUP BY 1, 2, 3
+"""
+
+
+async def backfill() -> None:
+    async with engine.begin() as conn:
+        await conn.execute(text("LOCK TABLE operacoes IN SHARE MODE"))
+        await conn.execute(text("DELETE FROM dashboard_rollup"))
+        result = await conn.execute(text(BACKFILL_SQL))
+        print(f"Rollup recalculado: {result.rowcount} linha(s) dia x FIDC x status")
+
+
+if __name__ == "__main__":
+    asyncio.run(backfill())
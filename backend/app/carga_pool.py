@@ -0,0 +1,115 @@
+"""Teste de carga do pool de conexoes.
+
+Run: python -m app.carga_pool [--concorrencia 50] [--requisicoes 2000] [--consulta-ms 20] [--comparar]
+     (from backend/ directory; usa DATABASE_URL)
+
+Dispara ``--concorrencia`` tarefas simultaneas que, ate somar ``--requisicoes``,
+pegam uma conexao do pool e seguram por ``--consulta-ms`` (``pg_sleep``),
+como requisicoes concorrentes de upload. Mostra vazao, espera pelo pool
+(p50/p95/p99/max), latencia total, pico de conexoes em uso e timeouts com os
+valores de Settings (DB_POOL_*, DB_CACHE_STATEMENTS) ou os sobrescritos na
+linha de comando. ``--comparar`` roda antes com os padroes do SQLAlchemy
+(pool 5 + 10 extras, timeout 30s, sem pre-ping, cache 100) para comparacao.
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+
+# Ensure backend/ is in path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy import exc, text
+
+from app.config import settings
+from app.services.pool_conexoes import criar_engine
+
+PADRAO_SQLALCHEMY = {
+    "pool_size": 5,
+    "max_overflow": 10,
+    "pool_timeout": 30.0,
+    "pool_recycle": -1,
+    "pool_pre_ping": False,
+    "prepared_statement_cache_size": 100,
+}
+
+
+def _percentis(valores: list[float]) -> str:
+    if len(valores) < 2:
+        return "sem amostras"
+    q = statistics.quantiles(valores, n=100)
+    return f"p50={q[49] * 1000:.1f}ms p95={q[94] * 1000:.1f}ms p99={q[98] * 1000:.1f}ms max={max(valores) * 1000:.1f}ms"
+
+
+async def rodar(nome: str, ajustes: dict, concorrencia: int, requisicoes: int, consulta_ms: float) -> None:
+    engine = criar_engine(settings.DATABASE_URL, nome, **ajustes)
+    pool = engine.pool
+    esperas: list[float] = []
+    latencias: list[float] = []
+    timeouts = 0
+    erros = 0
+    pico = 0
+    restantes = requisicoes
+
+    async def tarefa() -> None:
+        nonlocal restantes, timeouts, erros, pico
+        while restantes > 0:
+            restantes -= 1
+            inicio = time.perf_counter()
+            try:
+                async with engine.connect() as conn:
+                    esperas.append(time.perf_counter() - inicio)
+                    pico = max(pico, engine.pool.checkedout())
+                    await conn.execute(text("SELECT pg_sleep(:s)"), {"s": consulta_ms / 1000})
+            except exc.TimeoutError:
+                timeouts += 1
+                continue
+            except (OSError, exc.SQLAlchemyError) as e:
+                erros += 1
+                print(f"  erro: {e}")
+                continue
+            latencias.append(time.perf_counter() - inicio)
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(tarefa() for _ in range(concorrencia)))
+    duracao = time.perf_counter() - inicio
+    await engine.dispose()
+
+    print(f"== {nome}: pool={pool.size()} extras={pool._max_overflow} timeout={pool._timeout}s "
+          f"pre_ping={pool._pre_ping} cache={ajustes.get('prepared_statement_cache_size', settings.DB_CACHE_STATEMENTS)}")
+    print(f"  {len(latencias)} ok, {timeouts} timeout(s), {erros} erro(s) em {duracao:.2f}s "
+          f"({len(latencias) / duracao:.0f} req/s), pico em uso {pico}")
+    print(f"  espera pelo pool: {_percentis(esperas)}")
+    print(f"  latencia total:   {_percentis(latencias)}")
+
+
+async def main(args) -> None:
+    ajustes = {}
+    for opcao, valor in (
+        ("pool_size", args.tamanho),
+        ("max_overflow", args.extra),
+        ("pool_timeout", args.timeout),
+        ("prepared_statement_cache_size", args.cache),
+    ):
+        if valor is not None:
+            ajustes[opcao] = valor
+    print(f"{args.concorrencia} tarefas, {args.requisicoes} requisicoes, {args.consulta_ms}ms por consulta")
+    if args.comparar:
+        await rodar("padrao_sqlalchemy", PADRAO_SQLALCHEMY, args.concorrencia, args.requisicoes, args.consulta_ms)
+    await rodar("configurado", ajustes, args.concorrencia, args.requisicoes, args.consulta_ms)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Teste de carga do pool de conexoes")
+    parser.add_argument("--concorrencia", type=int, default=50)
+    parser.add_argument("--requisicoes", type=int, default=2000)
+    parser.add_argument("--consulta-ms", type=float, default=20.0, help="tempo com a conexao presa")
+    parser.add_argument("--tamanho", type=int, help="sobrescreve DB_POOL_TAMANHO")
+    parser.add_argument("--extra", type=int, help="sobrescreve DB_POOL_EXTRA")
+    parser.add_argument("--timeout", type=float, help="sobrescreve DB_POOL_TIMEOUT_SEGUNDOS")
+    parser.add_argument("--cache", type=int, help="sobrescreve DB_CACHE_STATEMENTS")
+    parser.add_argument("--comparar", action="store_true", help="roda antes com os padroes do SQLAlchemy")
+    asyncio.run(main(parser.parse_args()))
@@ -1,13 +1,31 @@
 from collections.abc import AsyncGenerator
 
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 from sqlalchemy.orm import DeclarativeBase
 
 from app.config import settings
+from app.services import metrics
+from app.services.consultas_sql import instrumentar
+from app.services.pool_conexoes import criar_engine
+from app.services.replica import EstadoReplica
 
-engine = create_async_engine(settings.DATABASE_URL, echo=False)
+engine = criar_engine(settings.DATABASE_URL, "primario")
+instrumentar(engine.sync_engine)
 async_session = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
+# Replica de leitura opcional (app/services/replica.py)
+engine_leitura = None
+async_session_leitura = None
+estado_replica = None
+if settings.DATABASE_REPLICA_URL:
+    engine_leitura = criar_engine(settings.DATABASE_REPLICA_URL, "replica")
+    instrumentar(engine_leitura.sync_engine)
+    async_session_leitura = async_sessionmaker(engine_leitura, class_=AsyncSession, expire_on_commit=False)
+    estado_replica = EstadoReplica(
+        engine_leitura, settings.REPLICA_ATRASO_MAXIMO_SEGUNDOS, settings.REPLICA_VERIFICACAO_SEGUNDOS,
+    )
+
 
 class Base(DeclarativeBase):
     pass
@@ -16,3 +34,21 @@ class Base(DeclarativeBase):
 async def get_db() -> AsyncGenerator[AsyncSession, None]:
     async with async_session() as session:
         yield session
+
+
+async def get_db_leitura() -> AsyncGenerator[AsyncSession, None]:
+    """Sessao para rotas so de leitura: replica se saudavel, senao primario."""
+    if estado_replica is not None and await estado_replica.disponivel():
+        async with async_session_leitura() as session:
+            try:
+                # Abre a conexao ja aqui: se a replica caiu, ainda da para cair no primario
+                await session.connection()
+            except (OSError, SQLAlchemyError):
+                estado_replica.marcar_falha()
+            else:
+                metrics.REPLICA_LEITURAS.labels("replica").inc()
+                yield session
+                return
+    metrics.REPLICA_LEITURAS.labels("primario").inc()
+    async with async_session() as session:
+        yield session
@@ -8,6 +8,14 @@ from the legacy system as documented in docs/legacy_mintlify/extratores-por-fidc
 import re
 from abc import ABC, abstractmethod
 from dataclasses import dataclass, field
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+
+
+def formatar_centavos(valor_centavos: int) -> str:
+    """Formata centavos no padrão pt-BR: 283334 -> "R$ 2.833,34"."""
+    inteiro, centavos = divmod(valor_centavos, 100)
+    parte_inteira = f"{inteiro:,}".replace(",", ".")
+    return f"R$ {parte_inteira},{centavos:02d}"
 
 
 @dataclass
@@ -19,11 +27,16 @@ class DadosBoleto:
     numero_nota: str | None = None
     vencimento: str | None = None  # DD-MM
     vencimento_completo: str | None = None  # DD/MM/YYYY
-    valor: float | None = None
+    valor_centavos: int | None = None
     valor_formatado: str | None = None  # R$ X.XXX,XX
     fidc_detectada: str | None = None
     erros: list[str] = field(default_factory=list)
 
+    @property
+    def valor(self) -> float | None:
+        """Valor em reais (derivado de valor_centavos)."""
+        return self.valor_centavos / 100 if self.valor_centavos is not None else None
+
 
 class BaseExtractor(ABC):
     """Classe base para todos os extratores de FIDC."""
@@ -205,11 +218,11 @@ class BaseExtractor(ABC):
         return None
 
     @staticmethod
-    def formatar_valor(valor_str: str | None) -> tuple[float | None, str | None]:
-        """Converte string de valor para float e formato R$ X.XXX,XX.
+    def formatar_valor(valor_str: str | None) -> tuple[int | None, str | None]:
+        """Converte string de valor para centavos e formato R$ X.XXX,XX.
 
         Aceita: "2.833,34" / "2833.34" / "2833,34"
-        Retorna: (2833.34, "R$ 2.833,34")
+        Retorna: (283334, "R$ 2.833,34")
         """
         if not valor_str:
             return None, None
@@ -224,14 +237,8 @@ class BaseExtractor(ABC):
         # Se não tem vírgula, assume formato com ponto decimal
 
         try:
-            valor_float = float(limpo)
-        except ValueError:
+            valor_centavos = int((Decimal(limpo) * 100).to_integral_value(rounding=ROUND_HALF_UP))
+        except (InvalidOperation, ValueError):
             return None, None
 
-        # Formata para pt-BR
-        inteiro = int(valor_float)
-        centavos = round((valor_float - inteiro) * 100)
-        parte_inteira = f"{inteiro:,}".replace(",", ".")
-        formatado = f"R$ {parte_inteira},{centavos:02d}"
-
-        return valor_float, formatado
+        return valor_centavos, formatar_centavos(valor_centavos)
@@ -5,7 +5,11 @@ Seleciona o extrator correto baseado em palavras-chave detectadas
 no texto do boleto PDF ou pelo FIDC escolhido na operação.
 """
 
+import hashlib
 import logging
+import sys
+from functools import lru_cache
+from pathlib import Path
 
 from app.extractors.base import BaseExtractor
 from app.extractors.capital import CapitalExtractor
@@ -50,6 +54,21 @@ def get_extractor_by_name(nome_fidc: str) -> BaseExtractor:
     return cls()
 
 
+@lru_cache
+def versao_extrator(nome_fidc: str) -> str:
+    """Versão do extrator do FIDC: hash do código-fonte da classe e das bases.
+
+    Qualquer mudança no extrator (regex, parsing, helpers de BaseExtractor)
+    muda a versão, sem precisar incrementar VERSAO_REGRAS.
+    """
+    cls = _FIDC_MAP.get(nome_fidc.upper().strip(), GenericExtractor)
+    h = hashlib.sha256()
+    for classe in cls.__mro__:
+        if classe.__module__.startswith("app.extractors."):
+            h.update(Path(sys.modules[classe.__module__].__file__).read_bytes())
+    return h.hexdigest()[:16]
+
+
 def detect_fidc_from_text(texto: str) -> BaseExtractor | None:
     """Detecta o FIDC automaticamente pelo texto do boleto.
 
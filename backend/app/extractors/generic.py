@@ -25,14 +25,14 @@ class GenericExtractor(BaseExtractor):
         dados.cnpj = self._extrair_cnpj(linhas)
 
         valor_str = self._extrair_valor(texto)
-        dados.valor, dados.valor_formatado = self.formatar_valor(valor_str)
+        dados.valor_centavos, dados.valor_formatado = self.formatar_valor(valor_str)
 
         if not dados.pagador:
             dados.erros.append("Pagador não encontrado")
         if not dados.vencimento:
             dados.vencimento = "A definir"
             dados.erros.append("Data de vencimento não encontrada")
-        if dados.valor is None:
+        if dados.valor_centavos is None:
             dados.erros.append("Valor não encontrado")
         if not dados.numero_nota:
             dados.erros.append("Número da nota não encontrado")
@@ -0,0 +1,69 @@
+"""
+Similaridade de nomes (Camada 3) — normalização e ratio com cache.
+
+Os mesmos pagadores/destinatários se repetem em centenas de boletos de uma
+operação, então tanto a normalização quanto o score de cada par ficam em
+caches LRU do processo.
+
+O score é exatamente o de ``SequenceMatcher(None, a, b).ratio()`` (Ratcliff/
+Obershelp), preservando a semântica do limiar de 85% do legado. Uma distância
+de edição (Levenshtein) seria mais rápida, mas produz scores diferentes e
+moveria a fronteira dos 85%.
+"""
+
+import re
+from difflib import SequenceMatcher
+from functools import lru_cache
+
+# Mesmo mapa de acentos do legado, aplicado em uma única passada
+_TABELA_ACENTOS = str.maketrans(
+    "ÁÀÃÂÄÉÈÊËÍÌÎÏÓÒÕÔÖÚÙÛÜÇ",
+    "AAAAAEEEEIIIIOOOOOUUUUC",
+)
+_RE_PONTUACAO = re.compile(r"[^\w\s]")
+_RE_ESPACOS = re.compile(r"\s+")
+
+# SequenceMatcher só aplica a heurística autojunk a partir de 200 caracteres;
+# abaixo disso, strings idênticas sempre têm ratio 1.0.
+_AUTOJUNK_MIN_LEN = 200
+
+
+@lru_cache(maxsize=4096)
+def normalizar_nome(nome: str) -> str:
+    """Normaliza nome para comparação fuzzy: upper, sem acentos, sem pontuação."""
+    nome = nome.upper().strip().translate(_TABELA_ACENTOS)
+    nome = _RE_PONTUACAO.sub("", nome)
+    return _RE_ESPACOS.sub(" ", nome).strip()
+
+
+@lru_cache(maxsize=16384)
+def similaridade(nome_a: str, nome_b: str) -> float:
+    """Ratio de similaridade entre dois nomes já normalizados (0.0 a 1.0).
+
+    A ordem dos argumentos importa (o ratio do SequenceMatcher não é
+    simétrico): ``nome_a`` é o do boleto e ``nome_b`` o do XML.
+    """
+    if nome_a == nome_b and len(nome_a) < _AUTOJUNK_MIN_LEN:
+        return 1.0
+    return SequenceMatcher(None, nome_a, nome_b).ratio()
+
+
+# ── Colunas de busca (auditoria) ──────────────────────────────
+
+
+def nome_busca(nome: str | None) -> str | None:
+    """Valor de ``busca_nome``: o nome normalizado (mesma regra da Camada 3).
+
+    A migration 012 aplica a mesma normalização em SQL no backfill; a rota
+    de auditoria normaliza o termo buscado com esta função.
+    """
+    if not nome:
+        return None
+    return normalizar_nome(nome) or None
+
+
+def cnpj_busca(cnpj: str | None) -> str | None:
+    """Valor de ``busca_cnpj``: apenas os dígitos do CNPJ/CPF."""
+    if not cnpj:
+        return None
+    return re.sub(r"\D", "", cnpj) or None
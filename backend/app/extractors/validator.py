@@ -4,44 +4,77 @@ Validação em 5 Camadas — compara dados do boleto PDF vs XML NFe.
 Replicado exatamente do legado conforme docs/legacy_mintlify:
   - Camada 1: XML existe e é válido
   - Camada 2: CNPJ do boleto == CNPJ do XML (14 dígitos exatos)
-  - Camada 3: Nome fuzzy matching >= 85% (SequenceMatcher)
+  - Camada 3: Nome fuzzy matching >= 85% (SequenceMatcher, com cache)
   - Camada 4: Valor com tolerância ZERO (0 centavos)
   - Camada 5: >= 1 email válido encontrado
 
 Tolerância de valor: ZERO (configurável se necessário).
+
+Todos os valores são comparados em centavos inteiros; os detalhes gravados
+continuam em reais para a API.
 """
 
 import re
 from dataclasses import dataclass, field
-from difflib import SequenceMatcher
 
 from app.extractors.base import DadosBoleto
-from app.extractors.xml_parser import DadosXmlNfe
+from app.extractors.similaridade import normalizar_nome, similaridade as calcular_similaridade
+from app.extractors.xml_parser import DadosXmlNfe, valor_centavos_duplicata
 
 # Constantes do legado
 TOLERANCIA_VALOR_CENTAVOS = 0
 SIMILARIDADE_MINIMA = 0.85
 MAX_EMAILS_POR_CLIENTE = 2
 
+# Versão das regras de validação. Incrementar sempre que uma camada mudar de
+# comportamento: invalida os resultados memoizados (Boleto.validacao_fingerprint)
+# e força o reprocessamento completo. Mudanças nos extratores já invalidam
+# sozinhas (factory.versao_extrator entra no fingerprint).
+VERSAO_REGRAS = "2026.10.1"
+
+# Códigos de resultado por camada (4 bits cada em Boleto.validacao_codigos).
+# A mensagem é renderizada a partir do código na leitura
+# (app/services/validacao_compacta.py); 0 = camada ausente.
+XML_OK, XML_NAO_ENCONTRADO, XML_INVALIDO, XML_VINCULADO, XML_NF_DIVERGENTE = 1, 2, 3, 4, 5
+CNPJ_INDISPONIVEL, CNPJ_OK, CNPJ_DIVERGENTE = 1, 2, 3
+NOME_INDISPONIVEL, NOME_OK, NOME_BAIXO = 1, 2, 3
+VALOR_BOLETO_INDISPONIVEL, VALOR_XML_INDISPONIVEL, VALOR_OK, VALOR_DIVERGENTE = 1, 2, 3, 4
+EMAIL_OK, EMAIL_NENHUM = 1, 2
+NAO_VALIDADO = 15
+
 
-def _eh_parcela(valor_boleto: float, valor_total_xml: float) -> bool:
+def _eh_parcela(centavos_boleto: int, centavos_total_xml: int) -> bool:
     """Detecta se valor do boleto é uma fração razoável do total (parcela).
 
     Verifica se total_xml / valor_boleto ≈ inteiro (2-12).
     Tolerância: 1 centavo por parcela.
     """
-    if valor_boleto <= 0 or valor_total_xml <= 0:
+    if centavos_boleto <= 0 or centavos_total_xml <= 0:
         return False
-    if valor_boleto >= valor_total_xml:
+    if centavos_boleto >= centavos_total_xml:
         return False
-    ratio = valor_total_xml / valor_boleto
-    n = round(ratio)
+    n = round(centavos_total_xml / centavos_boleto)
     if 2 <= n <= 12:
-        diff = abs(valor_total_xml - n * valor_boleto)
-        return diff <= n * 0.01
+        diff = abs(centavos_total_xml - n * centavos_boleto)
+        return diff <= n
     return False
 
 
+def _eh_parcela_xml(dados_boleto: DadosBoleto, dados_xml: DadosXmlNfe) -> bool:
+    """Detecta se o boleto paga uma parcela do XML.
+
+    Com 2+ duplicatas no <cobr>, o valor do boleto precisa bater exatamente
+    (em centavos) com alguma delas — funciona com parcelas desiguais. Sem
+    duplicatas, cai na heurística de fração do total (_eh_parcela).
+    """
+    if len(dados_xml.duplicatas) >= 2 and dados_boleto.valor_centavos is not None:
+        return any(
+            valor_centavos_duplicata(dup) == dados_boleto.valor_centavos
+            for dup in dados_xml.duplicatas
+        )
+    return _eh_parcela(dados_boleto.valor_centavos or 0, dados_xml.valor_total_centavos)
+
+
 @dataclass
 class ResultadoCamada:
     """Resultado de uma camada de validação."""
@@ -52,6 +85,7 @@ class ResultadoCamada:
     mensagem: str
     bloqueia: bool = False  # True = rejeita o boleto
     detalhes: dict = field(default_factory=dict)
+    codigo: int = 0  # código do resultado (constantes acima)
 
 
 @dataclass
@@ -91,12 +125,17 @@ class ResultadoValidacao:
 def validar_5_camadas(
     dados_boleto: DadosBoleto,
     dados_xml: DadosXmlNfe | None,
+    vinculo: dict | None = None,
 ) -> ResultadoValidacao:
-    """Executa a validação completa em 5 camadas."""
+    """Executa a validação completa em 5 camadas.
+
+    ``vinculo`` descreve um XML localizado sem NF correspondente (ver
+    app.services.xml_matcher): vínculo automático ou apenas sugestão.
+    """
     resultado = ResultadoValidacao()
 
     # ── Camada 1: XML ─────────────────────────────────────────
-    c1 = _validar_camada1_xml(dados_boleto, dados_xml)
+    c1 = _validar_camada1_xml(dados_boleto, dados_xml, vinculo)
     resultado.camadas.append(c1)
     if c1.bloqueia:
         resultado.aprovado = False
@@ -153,9 +192,7 @@ def validar_5_camadas(
         only_l4 = (
             len(blocking_failures) == 1 and blocking_failures[0].camada == 4
         )
-        if only_l4 and _eh_parcela(
-            dados_boleto.valor or 0, dados_xml.valor_total
-        ):
+        if only_l4 and _eh_parcela_xml(dados_boleto, dados_xml):
             resultado.parcialmente_aprovado = True
             resultado.aprovado = True  # override — parcela aceita
             resultado.motivo_rejeicao = None
@@ -171,7 +208,9 @@ def validar_5_camadas(
 
 
 def _validar_camada1_xml(
-    dados_boleto: DadosBoleto, dados_xml: DadosXmlNfe | None
+    dados_boleto: DadosBoleto,
+    dados_xml: DadosXmlNfe | None,
+    vinculo: dict | None = None,
 ) -> ResultadoCamada:
     """Camada 1: XML existe + válido + número da nota confere."""
     if dados_xml is None:
@@ -180,7 +219,9 @@ def _validar_camada1_xml(
             nome="XML",
             aprovado=False,
             mensagem=f"XML não encontrado para nota {dados_boleto.numero_nota or '?'}",
+            codigo=XML_NAO_ENCONTRADO,
             bloqueia=True,
+            detalhes={"candidato": vinculo} if vinculo else {},
         )
 
     if not dados_xml.xml_valido:
@@ -189,6 +230,7 @@ def _validar_camada1_xml(
             nome="XML",
             aprovado=False,
             mensagem=f"XML inválido: {dados_xml.erro or 'erro desconhecido'}",
+            codigo=XML_INVALIDO,
             bloqueia=True,
         )
 
@@ -196,12 +238,26 @@ def _validar_camada1_xml(
     nf_boleto = (dados_boleto.numero_nota or "").lstrip("0")
     nf_xml = (dados_xml.numero_nota or "").lstrip("0")
 
+    if vinculo and vinculo.get("automatico"):
+        return ResultadoCamada(
+            camada=1,
+            nome="XML",
+            aprovado=True,
+            mensagem=(
+                f"XML vinculado automaticamente (NF boleto={nf_boleto or '?'}, XML={nf_xml}, "
+                f"confiança {vinculo['confianca'] * 100:.0f}%)"
+            ),
+            detalhes={"numero_nota": nf_xml, "nf_boleto": nf_boleto, "vinculo": vinculo},
+            codigo=XML_VINCULADO,
+        )
+
     if nf_boleto and nf_xml and nf_boleto != nf_xml:
         return ResultadoCamada(
             camada=1,
             nome="XML",
             aprovado=False,
             mensagem=f"Número da nota divergente: boleto={nf_boleto}, XML={nf_xml}",
+            codigo=XML_NF_DIVERGENTE,
             bloqueia=True,
             detalhes={"nf_boleto": nf_boleto, "nf_xml": nf_xml},
         )
@@ -211,6 +267,7 @@ def _validar_camada1_xml(
         nome="XML",
         aprovado=True,
         mensagem="XML válido e número da nota confere",
+        codigo=XML_OK,
         detalhes={"numero_nota": nf_xml},
     )
 
@@ -226,6 +283,7 @@ def _validar_camada2_cnpj(dados_boleto: DadosBoleto, dados_xml: DadosXmlNfe) ->
             nome="CNPJ",
             aprovado=True,
             mensagem="CNPJ não disponível para comparação",
+            codigo=CNPJ_INDISPONIVEL,
             detalhes={"cnpj_boleto": cnpj_boleto, "cnpj_xml": cnpj_xml},
         )
 
@@ -235,6 +293,7 @@ def _validar_camada2_cnpj(dados_boleto: DadosBoleto, dados_xml: DadosXmlNfe) ->
             nome="CNPJ",
             aprovado=True,
             mensagem="CNPJ confere",
+            codigo=CNPJ_OK,
             detalhes={"cnpj": cnpj_boleto},
         )
 
@@ -243,6 +302,7 @@ def _validar_camada2_cnpj(dados_boleto: DadosBoleto, dados_xml: DadosXmlNfe) ->
         nome="CNPJ",
         aprovado=False,
         mensagem=f"CNPJ divergente! Boleto={cnpj_boleto}, XML={cnpj_xml}",
+        codigo=CNPJ_DIVERGENTE,
         bloqueia=True,
         detalhes={"cnpj_boleto": cnpj_boleto, "cnpj_xml": cnpj_xml},
     )
@@ -262,10 +322,11 @@ def _validar_camada3_nome(dados_boleto: DadosBoleto, dados_xml: DadosXmlNfe) ->
             nome="Nome",
             aprovado=True,
             mensagem="Nome não disponível para comparação",
+            codigo=NOME_INDISPONIVEL,
             detalhes={"nome_boleto": nome_boleto, "nome_xml": nome_xml},
         )
 
-    similaridade = SequenceMatcher(None, nome_boleto, nome_xml).ratio()
+    similaridade = calcular_similaridade(nome_boleto, nome_xml)
     pct = round(similaridade * 100, 1)
 
     if similaridade >= SIMILARIDADE_MINIMA:
@@ -274,6 +335,7 @@ def _validar_camada3_nome(dados_boleto: DadosBoleto, dados_xml: DadosXmlNfe) ->
             nome="Nome",
             aprovado=True,
             mensagem=f"Similaridade {pct}% (>={SIMILARIDADE_MINIMA * 100:.0f}%)",
+            codigo=NOME_OK,
             detalhes={"similaridade": pct, "nome_boleto": nome_boleto, "nome_xml": nome_xml},
         )
 
@@ -282,6 +344,7 @@ def _validar_camada3_nome(dados_boleto: DadosBoleto, dados_xml: DadosXmlNfe) ->
         nome="Nome",
         aprovado=False,
         mensagem=f"Similaridade baixa ({pct}%)",
+        codigo=NOME_BAIXO,
         bloqueia=False,  # NUNCA bloqueia
         detalhes={"similaridade": pct, "nome_boleto": nome_boleto, "nome_xml": nome_xml},
     )
@@ -292,30 +355,31 @@ def _validar_camada4_valor(dados_boleto: DadosBoleto, dados_xml: DadosXmlNfe) ->
 
     Prioridade: valor da duplicata (se vencimento confere) > valor total.
     """
-    valor_boleto = dados_boleto.valor
-    if valor_boleto is None:
+    centavos_boleto = dados_boleto.valor_centavos
+    if centavos_boleto is None:
         return ResultadoCamada(
             camada=4,
             nome="Valor",
             aprovado=True,
             mensagem="Valor do boleto não disponível para comparação",
+            codigo=VALOR_BOLETO_INDISPONIVEL,
         )
 
     # Prioridade: duplicata com vencimento correspondente
-    valor_xml = _obter_valor_xml_correspondente(dados_boleto, dados_xml)
+    centavos_xml = _obter_valor_xml_correspondente(dados_boleto, dados_xml)
+    valor_boleto = centavos_boleto / 100
 
-    if valor_xml is None or valor_xml == 0:
+    if not centavos_xml:
         return ResultadoCamada(
             camada=4,
             nome="Valor",
             aprovado=True,
             mensagem="Valor do XML não disponível para comparação",
+            codigo=VALOR_XML_INDISPONIVEL,
             detalhes={"valor_boleto": valor_boleto},
         )
 
-    # Converte para centavos para comparação exata
-    centavos_boleto = round(valor_boleto * 100)
-    centavos_xml = round(valor_xml * 100)
+    valor_xml = centavos_xml / 100
     diferenca = abs(centavos_boleto - centavos_xml)
 
     if diferenca <= TOLERANCIA_VALOR_CENTAVOS:
@@ -324,6 +388,7 @@ def _validar_camada4_valor(dados_boleto: DadosBoleto, dados_xml: DadosXmlNfe) ->
             nome="Valor",
             aprovado=True,
             mensagem="Valor confere",
+            codigo=VALOR_OK,
             detalhes={"valor_boleto": valor_boleto, "valor_xml": valor_xml},
         )
 
@@ -333,6 +398,7 @@ def _validar_camada4_valor(dados_boleto: DadosBoleto, dados_xml: DadosXmlNfe) ->
         nome="Valor",
         aprovado=False,
         mensagem=f"Valor divergente! Diferença R$ {diferenca_reais:.2f}",
+        codigo=VALOR_DIVERGENTE,
         bloqueia=True,
         detalhes={
             "valor_boleto": valor_boleto,
@@ -342,6 +408,11 @@ def _validar_camada4_valor(dados_boleto: DadosBoleto, dados_xml: DadosXmlNfe) ->
     )
 
 
+def revalidar_camada5(dados_xml: DadosXmlNfe) -> ResultadoCamada:
+    """Reexecuta apenas a Camada 5 (emails editados no XML)."""
+    return _validar_camada5_email(dados_xml)
+
+
 def _validar_camada5_email(dados_xml: DadosXmlNfe) -> ResultadoCamada:
     """Camada 5: >= 1 email válido encontrado."""
     emails_validos = dados_xml.emails
@@ -352,6 +423,7 @@ def _validar_camada5_email(dados_xml: DadosXmlNfe) -> ResultadoCamada:
             nome="Email",
             aprovado=True,
             mensagem=f"{len(emails_validos)} email(s) válido(s)",
+            codigo=EMAIL_OK,
             detalhes={"emails": emails_validos, "emails_invalidos": dados_xml.emails_invalidos},
         )
 
@@ -364,6 +436,7 @@ def _validar_camada5_email(dados_xml: DadosXmlNfe) -> ResultadoCamada:
         nome="Email",
         aprovado=False,
         mensagem=msg,
+        codigo=EMAIL_NENHUM,
         bloqueia=True,
         detalhes={"emails_invalidos": dados_xml.emails_invalidos},
     )
@@ -379,27 +452,11 @@ def _limpar_cnpj(cnpj: str) -> str:
 
 def _normalizar_nome(nome: str) -> str:
     """Normaliza nome para comparação fuzzy: upper, sem acentos, sem pontuação."""
-    nome = nome.upper().strip()
-    # Remove acentos simples (sem dependência de unidecode)
-    acentos = {
-        "Á": "A", "À": "A", "Ã": "A", "Â": "A", "Ä": "A",
-        "É": "E", "È": "E", "Ê": "E", "Ë": "E",
-        "Í": "I", "Ì": "I", "Î": "I", "Ï": "I",
-        "Ó": "O", "Ò": "O", "Õ": "O", "Ô": "O", "Ö": "O",
-        "Ú": "U", "Ù": "U", "Û": "U", "Ü": "U",
-        "Ç": "C",
-    }
-    for ac, sub in acentos.items():
-        nome = nome.replace(ac, sub)
-    # Remove pontuação
-    nome = re.sub(r"[^\w\s]", "", nome)
-    # Normaliza espaços
-    nome = re.sub(r"\s+", " ", nome).strip()
-    return nome
+    return normalizar_nome(nome)
 
 
-def _obter_valor_xml_correspondente(dados_boleto: DadosBoleto, dados_xml: DadosXmlNfe) -> float | None:
-    """Obtém valor do XML correspondente ao boleto.
+def _obter_valor_xml_correspondente(dados_boleto: DadosBoleto, dados_xml: DadosXmlNfe) -> int | None:
+    """Obtém valor do XML correspondente ao boleto, em centavos.
 
     Prioridade:
     1. Duplicata com vencimento correspondente
@@ -415,11 +472,11 @@ def _obter_valor_xml_correspondente(dados_boleto: DadosBoleto, dados_xml: DadosX
 
             for dup in dados_xml.duplicatas:
                 if dup.get("vencimento") == venc_iso:
-                    return dup.get("valor", 0.0)
+                    return valor_centavos_duplicata(dup)
 
     # Fallback: valor total
-    if dados_xml.valor_total > 0:
-        return dados_xml.valor_total
+    if dados_xml.valor_total_centavos > 0:
+        return dados_xml.valor_total_centavos
 
     return None
 
@@ -430,27 +487,27 @@ def _detectar_juros_multa(dados_boleto: DadosBoleto, dados_xml: DadosXmlNfe) ->
     Se valor boleto > valor NF: flag como juros, registra alerta.
     Usa valor NF (original) para filename. NÃO bloqueia envio.
     """
-    valor_boleto = dados_boleto.valor
-    valor_xml = dados_xml.valor_total
+    centavos_boleto = dados_boleto.valor_centavos
+    centavos_xml = dados_xml.valor_total_centavos
 
-    if valor_boleto is None or valor_xml is None or valor_xml == 0:
+    if centavos_boleto is None or not centavos_xml:
         return {"tem_juros_multa": False}
 
     # Verifica contra duplicata correspondente primeiro
-    valor_ref = _obter_valor_xml_correspondente(dados_boleto, dados_xml) or valor_xml
+    centavos_ref = _obter_valor_xml_correspondente(dados_boleto, dados_xml) or centavos_xml
 
-    diferenca = valor_boleto - valor_ref
+    diferenca = centavos_boleto - centavos_ref
 
     if diferenca <= 0:
         return {"tem_juros_multa": False}
 
-    percentual = (diferenca / valor_ref) * 100
+    percentual = (diferenca / centavos_ref) * 100
 
     return {
         "tem_juros_multa": True,
-        "valor_boleto": valor_boleto,
-        "valor_xml": valor_ref,
-        "diferenca": round(diferenca, 2),
+        "valor_boleto": centavos_boleto / 100,
+        "valor_xml": centavos_ref / 100,
+        "diferenca": diferenca / 100,
         "percentual": round(percentual, 2),
     }
 
@@ -465,5 +522,6 @@ def _preencher_camadas_restantes(resultado: ResultadoValidacao, a_partir_de: int
                 nome=nomes[i],
                 aprovado=False,
                 mensagem="Não validado (camada anterior falhou)",
+                codigo=NAO_VALIDADO,
             )
         )
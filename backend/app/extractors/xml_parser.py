@@ -7,7 +7,7 @@ Replicado do legado (xml_nfe_reader.py) conforme docs/legacy_mintlify.
 import re
 import xml.etree.ElementTree as ET
 from dataclasses import dataclass, field
-from decimal import Decimal, InvalidOperation
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
 from pathlib import Path
 
 
@@ -19,7 +19,7 @@ class DadosXmlNfe:
     numero_nota: str = ""
     cnpj: str = ""
     nome_destinatario: str = ""
-    valor_total: float = 0.0
+    valor_total_centavos: int = 0
     emails: list[str] = field(default_factory=list)
     emails_invalidos: list[str] = field(default_factory=list)
     duplicatas: list[dict] = field(default_factory=list)
@@ -27,6 +27,11 @@ class DadosXmlNfe:
     nome_arquivo: str = ""
     erro: str | None = None
 
+    @property
+    def valor_total(self) -> float:
+        """Valor total em reais (derivado de valor_total_centavos)."""
+        return self.valor_total_centavos / 100
+
 
 # Namespace da NFe
 _NS = {"nf": "http://www.portalfiscal.inf.br/nfe"}
@@ -78,7 +83,7 @@ def parse_xml_nfe(file_path: str | Path) -> DadosXmlNfe:
             _processar_emails(email_str, dados)
 
     # ── Valor total ───────────────────────────────────────────
-    dados.valor_total = _extrair_valor_total(nfe_node)
+    dados.valor_total_centavos = _extrair_valor_total(nfe_node)
 
     # ── Duplicatas (cobrança) ─────────────────────────────────
     dados.duplicatas = _extrair_duplicatas(nfe_node)
@@ -89,6 +94,7 @@ def parse_xml_nfe(file_path: str | Path) -> DadosXmlNfe:
         "cnpj": dados.cnpj,
         "nome": dados.nome_destinatario,
         "valor_total": dados.valor_total,
+        "valor_total_centavos": dados.valor_total_centavos,
         "emails": dados.emails,
         "duplicatas": dados.duplicatas,
     }
@@ -131,8 +137,24 @@ def _extrair_numero_nota(nfe_node: ET.Element) -> str:
     return ""
 
 
-def _extrair_valor_total(nfe_node: ET.Element) -> float:
-    """Extrai valor total da NFe (ICMSTot > vNF ou vProd)."""
+def valor_centavos_duplicata(dup: dict) -> int:
+    """Valor de uma duplicata em centavos.
+
+    Duplicatas gravadas antes da migração para centavos só têm ``valor``.
+    """
+    centavos = dup.get("valor_centavos")
+    if centavos is not None:
+        return centavos
+    return round((dup.get("valor") or 0.0) * 100)
+
+
+def _centavos(valor_str: str) -> int:
+    """Converte decimal do XML ("1234.56") para centavos, sem passar por float."""
+    return int((Decimal(valor_str) * 100).to_integral_value(rounding=ROUND_HALF_UP))
+
+
+def _extrair_valor_total(nfe_node: ET.Element) -> int:
+    """Extrai valor total da NFe em centavos (ICMSTot > vNF ou vProd)."""
     total = _find(nfe_node, "total")
     if total is not None:
         icms_tot = _find(total, "ICMSTot")
@@ -141,17 +163,17 @@ def _extrair_valor_total(nfe_node: ET.Element) -> float:
             vnf = _text(icms_tot, "vNF")
             if vnf:
                 try:
-                    return float(Decimal(vnf))
+                    return _centavos(vnf)
                 except (InvalidOperation, ValueError):
                     pass
             # Fallback: vProd
             vprod = _text(icms_tot, "vProd")
             if vprod:
                 try:
-                    return float(Decimal(vprod))
+                    return _centavos(vprod)
                 except (InvalidOperation, ValueError):
                     pass
-    return 0.0
+    return 0
 
 
 def _extrair_duplicatas(nfe_node: ET.Element) -> list[dict]:
@@ -174,15 +196,16 @@ def _extrair_duplicatas(nfe_node: ET.Element) -> list[dict]:
         vdup = _text(dup, "vDup") or "0"
 
         try:
-            valor = float(Decimal(vdup))
+            valor_centavos = _centavos(vdup)
         except (InvalidOperation, ValueError):
-            valor = 0.0
+            valor_centavos = 0
 
         duplicatas.append(
             {
                 "numero": ndup,
                 "vencimento": dvenc,  # YYYY-MM-DD
-                "valor": valor,
+                "valor": valor_centavos / 100,
+                "valor_centavos": valor_centavos,
             }
         )
 
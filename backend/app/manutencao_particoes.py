@@ -0,0 +1,57 @@
+"""Manutencao das particoes mensais de boletos, envios e audit_log.
+
+Run: python -m app.manutencao_particoes [--simular]  (from backend/ directory)
+
+Rodar pelo menos uma vez por mes (cron). Cria as particoes do mes corrente e
+dos proximos PARTICOES_MESES_FUTUROS meses e arquiva (DETACH + mover para o
+esquema PARTICOES_ESQUEMA_ARQUIVO) as mais antigas que PARTICOES_RETENCAO_MESES.
+Particoes arquivadas continuam no banco, fora das tabelas quentes e dos seus
+indices; audit_log nunca sai antes de 2 anos. Cada particao e tratada numa
+transacao propria.
+"""
+
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+
+# Ensure backend/ is in path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.config import settings
+from app.database import engine
+from app.services import particoes
+
+
+async def manter(simular: bool = False) -> None:
+    hoje = particoes.hoje_utc()
+    for tabela in particoes.TABELAS:
+        async with engine.connect() as conn:
+            existentes = await particoes.particoes_mensais(conn, tabela)
+        criar = particoes.meses_a_criar(existentes, hoje, settings.PARTICOES_MESES_FUTUROS)
+        arquivar = particoes.meses_a_arquivar(existentes, hoje, tabela, settings.PARTICOES_RETENCAO_MESES)
+
+        for mes in criar:
+            nome = particoes.nome_particao(tabela, mes)
+            if simular:
+                print(f"[simulacao] criar {nome}")
+                continue
+            async with engine.begin() as conn:
+                movidas = await particoes.criar_particao(conn, tabela, mes)
+            print(f"Criada {nome}" + (f" ({movidas} linha(s) movidas da default)" if movidas else ""))
+
+        for mes in arquivar:
+            nome = existentes[mes]
+            destino = f"{settings.PARTICOES_ESQUEMA_ARQUIVO}.{nome}"
+            if simular:
+                print(f"[simulacao] arquivar {nome} -> {destino}")
+                continue
+            async with engine.begin() as conn:
+                await particoes.arquivar_particao(conn, tabela, nome, settings.PARTICOES_ESQUEMA_ARQUIVO)
+            print(f"Arquivada {nome} -> {destino}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cria e arquiva particoes mensais")
+    parser.add_argument("--simular", action="store_true", help="so lista o que seria feito")
+    asyncio.run(manter(parser.parse_args().simular))
@@ -1,10 +1,12 @@
 from app.models.audit_log import AuditLog
 from app.models.boleto import Boleto
+from app.models.dashboard_rollup import DashboardRollup
 from app.models.email_layout import EmailLayout
 from app.models.envio import Envio
 from app.models.fidc import Fidc
 from app.models.operacao import Operacao
 from app.models.usuario import Usuario
+from app.models.work_item import WorkItem
 from app.models.xml_nfe import XmlNfe
 
-__all__ = ["Usuario", "Fidc", "Operacao", "XmlNfe", "Boleto", "Envio", "AuditLog", "EmailLayout"]
+__all__ = ["Usuario", "Fidc", "Operacao", "XmlNfe", "Boleto", "Envio", "AuditLog", "EmailLayout", "WorkItem", "DashboardRollup"]
@@ -10,6 +10,8 @@ from app.database import Base
 
 class AuditLog(Base):
     __tablename__ = "audit_log"
+    # Particoes mensais (app/services/particoes.py): a PK inclui created_at
+    __table_args__ = {"postgresql_partition_by": "RANGE (created_at)"}
 
     id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
     operacao_id: Mapped[uuid.UUID | None] = mapped_column(UUID(as_uuid=True), ForeignKey("operacoes.id"), nullable=True)
@@ -19,4 +21,9 @@ class AuditLog(Base):
     entidade_id: Mapped[str] = mapped_column(String(100), nullable=True)
     detalhes: Mapped[dict | None] = mapped_column(JSONB, nullable=True)
     ip_address: Mapped[str | None] = mapped_column(String(45), nullable=True)
-    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), primary_key=True, default=lambda: datetime.now(timezone.utc)
+    )
+
+    # Identidade no ORM continua so pelo id
+    __mapper_args__ = {"primary_key": [id]}
@@ -1,15 +1,22 @@
 import uuid
 from datetime import date, datetime, timezone
 
-from sqlalchemy import Boolean, Date, DateTime, Float, ForeignKey, String
+from sqlalchemy import BigInteger, Boolean, Date, DateTime, ForeignKey, Integer, SmallInteger, String
 from sqlalchemy.dialects.postgresql import JSONB, UUID
 from sqlalchemy.orm import Mapped, mapped_column
 
 from app.database import Base
+from app.services.validacao_compacta import decodificar_camada
+
+# Colunas adiadas: acessar sem undefer levanta erro em vez de fazer uma consulta
+# escondida (que, na sessao async, falharia de qualquer forma)
+_VALIDACAO = {"deferred": True, "deferred_group": "validacao", "deferred_raiseload": True}
 
 
 class Boleto(Base):
     __tablename__ = "boletos"
+    # Particoes mensais (app/services/particoes.py): a PK inclui created_at
+    __table_args__ = {"postgresql_partition_by": "RANGE (created_at)"}
 
     id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     operacao_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), ForeignKey("operacoes.id"), nullable=False)
@@ -21,21 +28,58 @@ class Boleto(Base):
     numero_nota: Mapped[str | None] = mapped_column(String(20), nullable=True)
     vencimento: Mapped[str | None] = mapped_column(String(10), nullable=True)  # DD-MM
     vencimento_date: Mapped[date | None] = mapped_column(Date, nullable=True)
-    valor: Mapped[float | None] = mapped_column(Float, nullable=True)
+    valor_centavos: Mapped[int | None] = mapped_column(BigInteger, nullable=True)
     valor_formatado: Mapped[str | None] = mapped_column(String(30), nullable=True)
     fidc_detectada: Mapped[str | None] = mapped_column(String(50), nullable=True)
+    # Colunas de busca da auditoria (indices pg_trgm), preenchidas por campos_extraidos
+    busca_nome: Mapped[str | None] = mapped_column(String(300), nullable=True)  # pagador normalizado
+    busca_cnpj: Mapped[str | None] = mapped_column(String(20), nullable=True)  # so digitos
     status: Mapped[str] = mapped_column(String(30), nullable=False, default="pendente")  # pendente | aprovado | parcialmente_aprovado | rejeitado
     motivo_rejeicao: Mapped[str | None] = mapped_column(String(500), nullable=True)
-    validacao_camada1: Mapped[dict | None] = mapped_column(JSONB, nullable=True)
-    validacao_camada2: Mapped[dict | None] = mapped_column(JSONB, nullable=True)
-    validacao_camada3: Mapped[dict | None] = mapped_column(JSONB, nullable=True)
-    validacao_camada4: Mapped[dict | None] = mapped_column(JSONB, nullable=True)
-    validacao_camada5: Mapped[dict | None] = mapped_column(JSONB, nullable=True)
+    # 5 camadas em forma compacta (app/services/validacao_compacta.py); so o extra
+    # JSONB fica adiado (app/services/projecoes.py::com_validacao)
+    validacao_mascara: Mapped[int] = mapped_column(SmallInteger, nullable=False, default=0)
+    validacao_codigos: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    validacao_similaridade: Mapped[int | None] = mapped_column(SmallInteger, nullable=True)  # decimos de %
+    validacao_diferenca_centavos: Mapped[int | None] = mapped_column(BigInteger, nullable=True)
+    validacao_extra: Mapped[dict | None] = mapped_column(JSONB, nullable=True, **_VALIDACAO)
     juros_detectado: Mapped[bool] = mapped_column(Boolean, default=False)
+    validacao_fingerprint: Mapped[str | None] = mapped_column(String(64), nullable=True)  # sha256 das entradas
     arquivo_path: Mapped[str | None] = mapped_column(String(1000), nullable=True)
-    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), primary_key=True, default=lambda: datetime.now(timezone.utc)
+    )
     updated_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True),
         default=lambda: datetime.now(timezone.utc),
         onupdate=lambda: datetime.now(timezone.utc),
     )
+
+    # Identidade no ORM continua so pelo id (db.get(Boleto, id))
+    __mapper_args__ = {"primary_key": [id]}
+
+    @property
+    def valor(self) -> float | None:
+        """Valor em reais (derivado de valor_centavos)."""
+        return self.valor_centavos / 100 if self.valor_centavos is not None else None
+
+    # Camadas no formato historico (dict), remontadas das colunas compactas
+    @property
+    def validacao_camada1(self) -> dict | None:
+        return decodificar_camada(self, 1)
+
+    @property
+    def validacao_camada2(self) -> dict | None:
+        return decodificar_camada(self, 2)
+
+    @property
+    def validacao_camada3(self) -> dict | None:
+        return decodificar_camada(self, 3)
+
+    @property
+    def validacao_camada4(self) -> dict | None:
+        return decodificar_camada(self, 4)
+
+    @property
+    def validacao_camada5(self) -> dict | None:
+        return decodificar_camada(self, 5)
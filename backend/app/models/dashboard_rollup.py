@@ -0,0 +1,114 @@
+"""
+Rollup do dashboard: totais de operacoes por dia (UTC de created_at) x FIDC x status.
+
+Mantido na mesma transacao de qualquer mudanca em ``Operacao`` feita pelo
+ORM (criar, processar, reprocessar, finalizar, cancelar, excluir, envio...):
+o listener ``after_flush`` subtrai a contribuicao antiga da operacao e soma
+a nova com INSERT ... ON CONFLICT DO UPDATE. Para recalcular do zero:
+``python -m app.backfill_dashboard``.
+"""
+
+import uuid
+from collections import defaultdict
+from datetime import date, timezone
+
+from sqlalchemy import BigInteger, Date, ForeignKey, Integer, String, event, inspect
+from sqlalchemy.dialects.postgresql import UUID, insert
+from sqlalchemy.orm import Mapped, Session, mapped_column
+
+from app.database import Base
+from app.models.operacao import Operacao
+
+
+class DashboardRollup(Base):
+    __tablename__ = "dashboard_rollup"
+
+    dia: Mapped[date] = mapped_column(Date, primary_key=True)
+    fidc_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), ForeignKey("fidcs.id"), primary_key=True)
+    status: Mapped[str] = mapped_column(String(30), primary_key=True)
+    operacoes: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    total_boletos: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    total_aprovados: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    total_parcialmente_aprovados: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    total_rejeitados: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    valor_bruto_centavos: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    valor_liquido_centavos: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+
+
+# Colunas somadas: (coluna do rollup, atributo da operacao)
+_METRICAS = (
+    ("total_boletos", "total_boletos"),
+    ("total_aprovados", "total_aprovados"),
+    ("total_parcialmente_aprovados", "total_parcialmente_aprovados"),
+    ("total_rejeitados", "total_rejeitados"),
+    ("valor_bruto_centavos", "valor_bruto_centavos"),
+    ("valor_liquido_centavos", "valor_liquido_centavos"),
+)
+_CHAVE = ("created_at", "fidc_id", "status")
+
+
+def _valor_anterior(obj: Operacao, atributo: str):
+    # Colunas com active_history: o valor anterior esta sempre no historico quando alterado
+    hist = inspect(obj).attrs[atributo].history
+    if hist.deleted:
+        return hist.deleted[0]
+    if hist.unchanged:
+        return hist.unchanged[0]
+    return getattr(obj, atributo)  # nao carregado e nao alterado
+
+
+def _contribuicao(valores: dict) -> tuple[tuple, list[int]] | None:
+    if valores["created_at"] is None or valores["fidc_id"] is None:
+        return None
+    chave = (valores["created_at"].astimezone(timezone.utc).date(), valores["fidc_id"], valores["status"])
+    return chave, [1] + [valores[attr] or 0 for _, attr in _METRICAS]
+
+
+def _somar(deltas: dict, contribuicao, sinal: int) -> None:
+    if contribuicao is None:
+        return
+    chave, vetor = contribuicao
+    acumulado = deltas[chave]
+    for i, v in enumerate(vetor):
+        acumulado[i] += sinal * v
+
+
+@event.listens_for(Session, "after_flush")
+def _atualizar_rollup(session: Session, _flush_context) -> None:
+    deltas: dict[tuple, list[int]] = defaultdict(lambda: [0] * (len(_METRICAS) + 1))
+    atributos = _CHAVE + tuple(attr for _, attr in _METRICAS)
+
+    for obj in session.new:
+        if isinstance(obj, Operacao):
+            _somar(deltas, _contribuicao({a: getattr(obj, a) for a in atributos}), +1)
+
+    for obj in session.dirty:
+        if isinstance(obj, Operacao):
+            _somar(deltas, _contribuicao({a: _valor_anterior(obj, a) for a in atributos}), -1)
+            _somar(deltas, _contribuicao({a: getattr(obj, a) for a in atributos}), +1)
+
+    for obj in session.deleted:
+        if isinstance(obj, Operacao):
+            _somar(deltas, _contribuicao({a: _valor_anterior(obj, a) for a in atributos}), -1)
+
+    linhas = [
+        {
+            "dia": dia, "fidc_id": fidc_id, "status": status, "operacoes": vetor[0],
+            **{col: vetor[i + 1] for i, (col, _) in enumerate(_METRICAS)},
+        }
+        for (dia, fidc_id, status), vetor in deltas.items()
+        if any(vetor)
+    ]
+    if not linhas:
+        return
+
+    tabela = DashboardRollup.__table__
+    stmt = insert(tabela)
+    colunas = ["operacoes"] + [col for col, _ in _METRICAS]
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[tabela.c.dia, tabela.c.fidc_id, tabela.c.status],
+        set_={col: tabela.c[col] + stmt.excluded[col] for col in colunas},
+    )
+    # Ordem fixa de chaves: transacoes concorrentes travam as linhas na mesma ordem
+    linhas.sort(key=lambda l: (l["dia"], str(l["fidc_id"]), l["status"]))
+    session.connection().execute(stmt, linhas)
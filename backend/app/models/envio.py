@@ -10,6 +10,8 @@ from app.database import Base
 
 class Envio(Base):
     __tablename__ = "envios"
+    # Particoes mensais (app/services/particoes.py): a PK inclui created_at
+    __table_args__ = {"postgresql_partition_by": "RANGE (created_at)"}
 
     id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     operacao_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), ForeignKey("operacoes.id"), nullable=False)
@@ -24,4 +26,9 @@ class Envio(Base):
     boletos_ids: Mapped[list[uuid.UUID]] = mapped_column(ARRAY(UUID(as_uuid=True)), default=list)
     xmls_anexados: Mapped[list[str]] = mapped_column(ARRAY(String), default=list)
     timestamp_envio: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
-    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), primary_key=True, default=lambda: datetime.now(timezone.utc)
+    )
+
+    # Identidade no ORM continua so pelo id
+    __mapper_args__ = {"primary_key": [id]}
@@ -1,7 +1,7 @@
 import uuid
 from datetime import datetime, timezone
 
-from sqlalchemy import DateTime, Float, ForeignKey, Integer, String
+from sqlalchemy import BigInteger, DateTime, Float, ForeignKey, Index, Integer, String
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import Mapped, mapped_column
 
@@ -10,26 +10,43 @@ from app.database import Base
 
 class Operacao(Base):
     __tablename__ = "operacoes"
+    # Listagem paginada por keyset (created_at, id)
+    __table_args__ = (Index("ix_operacoes_created_at_id", "created_at", "id"),)
+
+    # active_history: colunas que entram no rollup do dashboard (models/dashboard_rollup.py)
+    # guardam o valor anterior mesmo quando alteradas sem terem sido carregadas
 
     id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     numero: Mapped[str] = mapped_column(String(50), nullable=False)
-    fidc_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), ForeignKey("fidcs.id"), nullable=False)
+    fidc_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), ForeignKey("fidcs.id"), nullable=False, active_history=True)
     usuario_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), ForeignKey("usuarios.id"), nullable=False)
     status: Mapped[str] = mapped_column(
-        String(30), nullable=False, default="em_processamento"
+        String(30), nullable=False, default="em_processamento", active_history=True
     )  # em_processamento | aguardando_envio | enviada | concluida | cancelada
     modo_envio: Mapped[str] = mapped_column(String(20), nullable=False, default="preview")  # preview | automatico
-    total_boletos: Mapped[int] = mapped_column(Integer, default=0)
-    total_aprovados: Mapped[int] = mapped_column(Integer, default=0)
-    total_parcialmente_aprovados: Mapped[int] = mapped_column(Integer, default=0)
-    total_rejeitados: Mapped[int] = mapped_column(Integer, default=0)
+    total_boletos: Mapped[int] = mapped_column(Integer, default=0, active_history=True)
+    total_aprovados: Mapped[int] = mapped_column(Integer, default=0, active_history=True)
+    total_parcialmente_aprovados: Mapped[int] = mapped_column(Integer, default=0, active_history=True)
+    total_rejeitados: Mapped[int] = mapped_column(Integer, default=0, active_history=True)
     taxa_sucesso: Mapped[float] = mapped_column(Float, default=0.0)
-    valor_bruto: Mapped[float | None] = mapped_column(Float, nullable=True)
-    valor_liquido: Mapped[float | None] = mapped_column(Float, nullable=True)
+    valor_bruto_centavos: Mapped[int | None] = mapped_column(BigInteger, nullable=True, active_history=True)
+    valor_liquido_centavos: Mapped[int | None] = mapped_column(BigInteger, nullable=True, active_history=True)
     versao_finalizacao: Mapped[str | None] = mapped_column(String(20), nullable=True)
-    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), active_history=True
+    )
     updated_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True),
         default=lambda: datetime.now(timezone.utc),
         onupdate=lambda: datetime.now(timezone.utc),
     )
+
+    @property
+    def valor_bruto(self) -> float | None:
+        """Valor bruto em reais (derivado de valor_bruto_centavos)."""
+        return self.valor_bruto_centavos / 100 if self.valor_bruto_centavos is not None else None
+
+    @property
+    def valor_liquido(self) -> float | None:
+        """Valor liquido em reais (derivado de valor_liquido_centavos)."""
+        return self.valor_liquido_centavos / 100 if self.valor_liquido_centavos is not None else None
@@ -1,11 +1,12 @@
 import uuid
 from datetime import datetime, timezone
 
-from sqlalchemy import Boolean, DateTime, Float, ForeignKey, String
+from sqlalchemy import BigInteger, Boolean, DateTime, ForeignKey, Integer, String
 from sqlalchemy.dialects.postgresql import ARRAY, JSONB, UUID
-from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy.orm import Mapped, mapped_column, validates
 
 from app.database import Base
+from app.extractors.similaridade import nome_busca
 
 
 class XmlNfe(Base):
@@ -17,10 +18,26 @@ class XmlNfe(Base):
     numero_nota: Mapped[str] = mapped_column(String(20), nullable=False)
     cnpj: Mapped[str] = mapped_column(String(20), nullable=True)
     nome_destinatario: Mapped[str] = mapped_column(String(300), nullable=True)
-    valor_total: Mapped[float] = mapped_column(Float, nullable=True)
+    busca_nome: Mapped[str | None] = mapped_column(String(300), nullable=True)  # destinatario normalizado
+    valor_total_centavos: Mapped[int | None] = mapped_column(BigInteger, nullable=True)
     emails: Mapped[list[str]] = mapped_column(ARRAY(String), default=list)
     emails_invalidos: Mapped[list[str]] = mapped_column(ARRAY(String), default=list)
     duplicatas: Mapped[dict] = mapped_column(JSONB, default=list)
     xml_valido: Mapped[bool] = mapped_column(Boolean, default=True)
-    dados_raw: Mapped[dict] = mapped_column(JSONB, default=dict)
+    # XML completo parseado: so gravado, nunca lido pelas rotas — nao carregado por padrao
+    dados_raw: Mapped[dict] = mapped_column(JSONB, default=dict, deferred=True, deferred_raiseload=True)
+    versao: Mapped[int] = mapped_column(Integer, nullable=False, default=1)
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+
+    # Incrementada a cada UPDATE pelo ORM; usada no fingerprint da validacao
+    __mapper_args__ = {"version_id_col": versao}
+
+    @validates("nome_destinatario")
+    def _sincronizar_busca(self, _key, nome: str | None) -> str | None:
+        self.busca_nome = nome_busca(nome)
+        return nome
+
+    @property
+    def valor_total(self) -> float | None:
+        """Valor total em reais (derivado de valor_total_centavos)."""
+        return self.valor_total_centavos / 100 if self.valor_total_centavos is not None else None
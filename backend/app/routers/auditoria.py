@@ -2,16 +2,18 @@
 Router de Auditoria — busca global de boletos por cliente, NF ou CNPJ.
 
 Endpoints:
-  GET /auditoria/buscar — Buscar boletos (paginado, com filtros)
+  GET /auditoria/buscar — Buscar boletos (paginado por page ou cursor, com filtros
+                          de data, FIDC, status e resultado da validacao)
 """
 
 from datetime import date, datetime
 
-from fastapi import APIRouter, Depends, Query
-from sqlalchemy import func, or_, select
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import Float, and_, case, cast, func, literal, literal_column, not_, or_, select, union
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.database import get_db
+from app.database import get_db_leitura
+from app.extractors.similaridade import cnpj_busca, nome_busca
 from app.models.boleto import Boleto
 from app.models.fidc import Fidc
 from app.models.operacao import Operacao
@@ -19,10 +21,85 @@ from app.models.usuario import Usuario
 from app.models.xml_nfe import XmlNfe
 from app.schemas.auditoria import AuditoriaBuscarResponse, AuditoriaItem
 from app.security import get_current_user
+from app.services import paginacao, projecoes
+from app.services.validacao_compacta import MASCARA_BLOQUEIA, bit_aprovado, mascara_codigo
 
 router = APIRouter(prefix="/auditoria", tags=["auditoria"])
 
 
+def _busca_textual(termo: str):
+    """Condicao ``Boleto.id IN (...)`` e expressao de rank para o termo buscado.
+
+    Cada ramo do UNION usa um indice trigram (GIN) proprio: nome do pagador,
+    nome do destinatario do XML vinculado, CNPJ (so digitos) e numero da NF.
+    O nome casa por substring ou por similaridade de palavra (``<%``), o que
+    tolera erros de digitacao. Devolve ``(None, None)`` se o termo nao tem
+    nada buscavel (ex.: so pontuacao).
+    """
+    nome = nome_busca(termo)
+    digitos = cnpj_busca(termo)
+
+    ramos = []
+    if nome:
+        termo_nome = literal(nome)
+        ramos.append(
+            select(Boleto.id).where(or_(
+                Boleto.busca_nome.contains(nome, autoescape=True),
+                termo_nome.op("<%")(Boleto.busca_nome),
+            ))
+        )
+        ramos.append(
+            select(Boleto.id)
+            .join(XmlNfe, Boleto.xml_nfe_id == XmlNfe.id)
+            .where(or_(
+                XmlNfe.busca_nome.contains(nome, autoescape=True),
+                termo_nome.op("<%")(XmlNfe.busca_nome),
+            ))
+        )
+    if digitos:
+        ramos.append(
+            select(Boleto.id).where(or_(
+                Boleto.busca_cnpj.contains(digitos),
+                Boleto.numero_nota.contains(digitos),
+            ))
+        )
+    if not ramos:
+        return None, None
+
+    scores = []
+    if nome:
+        scores += [
+            func.word_similarity(nome, Boleto.busca_nome),
+            func.word_similarity(nome, XmlNfe.busca_nome),
+        ]
+    if digitos:
+        # CNPJ ou NF exatos vem antes de qualquer nome parecido
+        scores.append(case(
+            (or_(Boleto.busca_cnpj == digitos, Boleto.numero_nota == digitos), 1.0),
+            else_=0.0,
+        ))
+    return Boleto.id.in_(union(*ramos)), cast(func.coalesce(func.greatest(*scores), 0), Float)
+
+
+def _bits(coluna, mascara: int):
+    # Constante no SQL (nao parametro): o planner so usa os indices parciais
+    # da migration 016 se o predicado for literalmente o mesmo do indice
+    return coluna.op("&")(literal_column(str(mascara)))
+
+
+def _reprovada_na_camada(camada: int):
+    """Camada avaliada e nao aprovada (ignora "nao validado" por falha anterior)."""
+    mascara = mascara_codigo(camada)
+    return and_(
+        _bits(Boleto.validacao_mascara, bit_aprovado(camada)) == literal_column("0"),
+        _bits(Boleto.validacao_codigos, mascara).not_in([literal_column("0"), literal_column(str(mascara))]),
+    )
+
+
+def _camadas(boleto: Boleto) -> dict:
+    return {f"validacao_camada{n}": getattr(boleto, f"validacao_camada{n}") for n in range(1, 6)}
+
+
 @router.get("/buscar", response_model=AuditoriaBuscarResponse)
 async def buscar_auditoria(
     q: str = Query("", description="Termo de busca (NF, cliente, CNPJ)"),
@@ -32,7 +109,14 @@ async def buscar_auditoria(
     status: str | None = Query(None, description="Filtro por status do boleto"),
     page: int = Query(1, ge=1),
     per_page: int = Query(20, ge=1, le=100),
-    db: AsyncSession = Depends(get_db),
+    cursor: str | None = Query(None, description="Cursor da pagina seguinte (substitui page)"),
+    camada_reprovada: int | None = Query(None, ge=1, le=5, description="So boletos reprovados nesta camada (1-5)"),
+    bloqueante: bool | None = Query(None, description="Com (true) ou sem (false) camada bloqueante"),
+    juros: bool | None = Query(None, description="Filtro por juros/multa detectado"),
+    similaridade_min: float | None = Query(None, ge=0, le=100, description="Similaridade minima do nome (Camada 3, %)"),
+    similaridade_max: float | None = Query(None, ge=0, le=100, description="Similaridade maxima do nome (Camada 3, %)"),
+    incluir_validacao: bool = Query(True, description="Incluir o detalhe das 5 camadas de validacao (false omite, resposta mais leve)"),
+    db: AsyncSession = Depends(get_db_leitura),
     _current_user: Usuario = Depends(get_current_user),
 ):
     """Busca global de boletos por NF, nome do pagador ou CNPJ."""
@@ -50,67 +134,75 @@ async def buscar_auditoria(
         .join(Fidc, Operacao.fidc_id == Fidc.id)
         .where(Operacao.status == "concluida")
     )
+    if incluir_validacao:
+        query = query.options(projecoes.com_validacao())
 
-    count_query = (
-        select(func.count())
-        .select_from(Boleto)
-        .join(Operacao, Boleto.operacao_id == Operacao.id)
-        .join(Fidc, Operacao.fidc_id == Fidc.id)
-        .where(Operacao.status == "concluida")
-    )
-
-    # ── Text search (ILIKE com OR) ──
+    # ── Busca textual (colunas normalizadas com indices pg_trgm) ──
+    rank = None
     if q and q.strip():
-        term = f"%{q.strip()}%"
-        text_filter = or_(
-            Boleto.pagador.ilike(term),
-            Boleto.numero_nota.ilike(term),
-            Boleto.cnpj.ilike(term),
-        )
-
-        # Tambem buscar em xmls_nfe.nome_destinatario via subquery correlacionada
-        xml_subq = (
-            select(XmlNfe.id)
-            .where(XmlNfe.nome_destinatario.ilike(term))
-            .where(XmlNfe.id == Boleto.xml_nfe_id)
-            .correlate(Boleto)
-            .exists()
-        )
-
-        combined = or_(text_filter, xml_subq)
-        query = query.where(combined)
-        count_query = count_query.where(combined)
+        condicao_ids, rank = _busca_textual(q.strip())
+        if condicao_ids is None:
+            return AuditoriaBuscarResponse(items=[], total=0, page=page, per_page=per_page)
+        query = query.outerjoin(XmlNfe, Boleto.xml_nfe_id == XmlNfe.id).where(condicao_ids)
 
     # ── Date range ──
     if data_inicio:
         dt_inicio = datetime.combine(data_inicio, datetime.min.time())
         query = query.where(Boleto.created_at >= dt_inicio)
-        count_query = count_query.where(Boleto.created_at >= dt_inicio)
     if data_fim:
         dt_fim = datetime.combine(data_fim, datetime.max.time())
         query = query.where(Boleto.created_at <= dt_fim)
-        count_query = count_query.where(Boleto.created_at <= dt_fim)
 
     # ── FIDC filter ──
     if fidc_id:
         query = query.where(Operacao.fidc_id == fidc_id)
-        count_query = count_query.where(Operacao.fidc_id == fidc_id)
 
     # ── Status filter ──
     if status:
         query = query.where(Boleto.status == status)
-        count_query = count_query.where(Boleto.status == status)
-
-    # ── Count total ──
-    total_result = await db.execute(count_query)
-    total = total_result.scalar() or 0
 
-    # ── Paginated results ──
-    query = query.order_by(Boleto.created_at.desc())
-    query = query.offset((page - 1) * per_page).limit(per_page)
+    # ── Validacao (colunas compactas; indices parciais/expressao na migration 016) ──
+    if camada_reprovada:
+        query = query.where(_reprovada_na_camada(camada_reprovada))
+    if bloqueante is not None:
+        bloqueio = _bits(Boleto.validacao_mascara, MASCARA_BLOQUEIA)
+        query = query.where(bloqueio != literal_column("0") if bloqueante else bloqueio == literal_column("0"))
+    if juros is not None:
+        query = query.where(Boleto.juros_detectado if juros else not_(Boleto.juros_detectado))
+    if similaridade_min is not None:
+        query = query.where(Boleto.validacao_similaridade >= round(similaridade_min * 10))
+    if similaridade_max is not None:
+        query = query.where(Boleto.validacao_similaridade <= round(similaridade_max * 10))
+
+    # ── Count total (exato ate o limite, senao estimado) ──
+    total, total_exato = await paginacao.contar_total(db, query)
+
+    # ── Paginated results: keyset com cursor, OFFSET com page ──
+    if rank is not None:
+        query = query.add_columns(rank.label("rank"))
+        query = query.order_by(rank.desc(), Boleto.created_at.desc(), Boleto.id.desc())
+    else:
+        query = query.order_by(Boleto.created_at.desc(), Boleto.id.desc())
+    if cursor:
+        try:
+            query = query.where(paginacao.apos_cursor(
+                paginacao.decodificar_cursor(cursor), Boleto.created_at, Boleto.id, rank,
+            ))
+        except paginacao.CursorInvalido:
+            raise HTTPException(status_code=400, detail="Cursor invalido")
+    else:
+        query = query.offset((page - 1) * per_page)
+    query = query.limit(per_page + 1)
 
     result = await db.execute(query)
     rows = result.all()
+    proximo_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        ultimo = rows[-1]
+        proximo_cursor = paginacao.codificar_cursor(
+            ultimo[0].created_at, ultimo[0].id, ultimo.rank if rank is not None else None,
+        )
 
     # Resolver usuario_ids → nomes
     usuario_ids = list({row[4] for row in rows if row[4]})
@@ -145,11 +237,7 @@ async def buscar_auditoria(
             motivo_rejeicao=boleto.motivo_rejeicao,
             juros_detectado=boleto.juros_detectado,
             usuario_nome=usuarios_map.get(op_usuario_id),
-            validacao_camada1=boleto.validacao_camada1,
-            validacao_camada2=boleto.validacao_camada2,
-            validacao_camada3=boleto.validacao_camada3,
-            validacao_camada4=boleto.validacao_camada4,
-            validacao_camada5=boleto.validacao_camada5,
+            **(_camadas(boleto) if incluir_validacao else {}),
             created_at=boleto.created_at,
         ))
 
@@ -158,4 +246,6 @@ async def buscar_auditoria(
         total=total,
         page=page,
         per_page=per_page,
+        total_exato=total_exato,
+        proximo_cursor=proximo_cursor,
     )
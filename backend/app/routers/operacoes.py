@@ -33,17 +33,18 @@ import logging
 import shutil
 import uuid
 import zipfile
+from collections import defaultdict
 from datetime import date as date_type, datetime, timedelta, timezone
+from decimal import ROUND_HALF_UP, Decimal
 from pathlib import Path
 
-import pdfplumber
 from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, status
 from fastapi.responses import FileResponse, StreamingResponse
 from sqlalchemy import delete, func, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.config import settings
-from app.database import get_db
+from app.database import get_db, get_db_leitura
 from app.extractors import (
     DadosBoleto,
     gerar_nome_arquivo,
@@ -51,11 +52,12 @@ from app.extractors import (
     parse_xml_nfe,
     validar_5_camadas,
 )
-from app.extractors.xml_parser import DadosXmlNfe
 from app.models.boleto import Boleto
+from app.models.dashboard_rollup import DashboardRollup
 from app.models.fidc import Fidc
 from app.models.operacao import Operacao
 from app.models.usuario import Usuario
+from app.models.work_item import WorkItem
 from app.models.xml_nfe import XmlNfe
 from app.models.audit_log import AuditLog
 from app.models.envio import Envio
@@ -89,10 +91,26 @@ from app.schemas.operacao import (
 from app.schemas.fidc import FidcResponse
 from app.security import get_current_user
 from app.services.audit import registrar_audit
+from app.services.envios import criar_mailer, reconstruir_email_group, reconstruir_email_groups, todos_enviados
+from app.services.extracao import campos_extraidos, extrair_texto_pdf
+from app.services import fila, metrics, paginacao, particoes, projecoes, validacao_compacta
+from app.services.agendador import Prioridade, executar_agendado, prioridade_por_volume
+from app.services.locks import OperacaoOcupada, executar_exclusivo
+from app.services.memo_validacao import dados_boleto_do_registro, fingerprint_validacao
+from app.services.parcelas import BoletoParcela, conciliar_parcelas, vencimento_iso
+from app.services.persistencia import atualizar_boletos, inserir_boletos
 from app.services.pdf_splitter import split_pdf
+from app.services.validacao_incremental import (
+    campos_resultado,
+    campos_validacao_vazios,
+    carregar_indice_xmls,
+    revalidar_emails,
+    revalidar_por_notas,
+    validar_extraido,
+)
+from app.services.xml_matcher import IndiceXmls, chave_nf
 from app.models.email_layout import EmailLayout
-from app.services.email_grouper import EmailGroup, agrupar_boletos_para_envio
-from app.services.smtp_mailer import SMTPMailer
+from app.services.email_grouper import agrupar_boletos_para_envio
 from app.services.report_generator import (
     gerar_relatorio_aprovados_txt,
     gerar_relatorio_erros_txt,
@@ -149,20 +167,6 @@ async def _get_fidc(fidc_id: uuid.UUID, db: AsyncSession) -> Fidc:
     return fidc
 
 
-async def _todos_enviados(operacao_id: uuid.UUID, db: AsyncSession) -> bool:
-    """Retorna True se existe >=1 envio com status 'enviado'
-    e nenhum envio com status 'pendente' ou 'rascunho'."""
-    result = await db.execute(
-        select(Envio).where(Envio.operacao_id == operacao_id)
-    )
-    todos = result.scalars().all()
-    if not todos:
-        return False
-    has_enviado = any(e.status == "enviado" for e in todos)
-    no_pending = not any(e.status in ("pendente", "rascunho") for e in todos)
-    return has_enviado and no_pending
-
-
 # ── POST /operacoes ──────────────────────────────────────────
 
 
@@ -218,27 +222,38 @@ async def list_operacoes(
     status_filter: str | None = None,
     page: int = 1,
     per_page: int = 20,
-    db: AsyncSession = Depends(get_db),
+    cursor: str | None = Query(None, description="Cursor da pagina seguinte (substitui page)"),
+    db: AsyncSession = Depends(get_db_leitura),
     _current_user: Usuario = Depends(get_current_user),
 ):
     query = select(Operacao)
-    count_query = select(func.count()).select_from(Operacao)
 
     if fidc_id:
         query = query.where(Operacao.fidc_id == fidc_id)
-        count_query = count_query.where(Operacao.fidc_id == fidc_id)
     if status_filter:
         query = query.where(Operacao.status == status_filter)
-        count_query = count_query.where(Operacao.status == status_filter)
 
-    total_result = await db.execute(count_query)
-    total = total_result.scalar() or 0
+    total, total_exato = await paginacao.contar_total(db, query)
 
-    query = query.order_by(Operacao.created_at.desc())
-    query = query.offset((page - 1) * per_page).limit(per_page)
+    # Keyset por (created_at, id); page continua valendo (OFFSET) sem cursor
+    query = query.order_by(Operacao.created_at.desc(), Operacao.id.desc())
+    if cursor:
+        try:
+            query = query.where(paginacao.apos_cursor(
+                paginacao.decodificar_cursor(cursor), Operacao.created_at, Operacao.id,
+            ))
+        except paginacao.CursorInvalido:
+            raise HTTPException(status_code=400, detail="Cursor invalido")
+    else:
+        query = query.offset((page - 1) * per_page)
+    query = query.limit(per_page + 1)
 
     result = await db.execute(query)
     ops = result.scalars().all()
+    proximo_cursor = None
+    if len(ops) > per_page:
+        ops = ops[:per_page]
+        proximo_cursor = paginacao.codificar_cursor(ops[-1].created_at, ops[-1].id)
 
     # Resolver fidc_nome para cada operacao
     fidc_ids = list({o.fidc_id for o in ops})
@@ -265,6 +280,8 @@ async def list_operacoes(
         total=total,
         page=page,
         per_page=per_page,
+        total_exato=total_exato,
+        proximo_cursor=proximo_cursor,
     )
 
 
@@ -273,27 +290,26 @@ async def list_operacoes(
 
 @router.get("/dashboard/stats", response_model=DashboardStats)
 async def dashboard_stats(
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_db_leitura),
     _current_user: Usuario = Depends(get_current_user),
 ):
     """KPIs agregados de todas as operacoes."""
-    # Totais
-    count_result = await db.execute(select(func.count()).select_from(Operacao))
-    total_ops = count_result.scalar() or 0
-
+    # Totais (rollup dia x FIDC x status, mantido a cada flush de Operacao)
     sums_result = await db.execute(
         select(
-            func.coalesce(func.sum(Operacao.total_boletos), 0),
-            func.coalesce(func.sum(Operacao.total_aprovados), 0),
-            func.coalesce(func.sum(Operacao.total_parcialmente_aprovados), 0),
-            func.coalesce(func.sum(Operacao.total_rejeitados), 0),
+            func.coalesce(func.sum(DashboardRollup.operacoes), 0),
+            func.coalesce(func.sum(DashboardRollup.total_boletos), 0),
+            func.coalesce(func.sum(DashboardRollup.total_aprovados), 0),
+            func.coalesce(func.sum(DashboardRollup.total_parcialmente_aprovados), 0),
+            func.coalesce(func.sum(DashboardRollup.total_rejeitados), 0),
         )
     )
     row = sums_result.one()
-    total_boletos = int(row[0])
-    total_aprovados = int(row[1])
-    total_parciais = int(row[2])
-    total_rejeitados = int(row[3])
+    total_ops = int(row[0])
+    total_boletos = int(row[1])
+    total_aprovados = int(row[2])
+    total_parciais = int(row[3])
+    total_rejeitados = int(row[4])
 
     taxa = ((total_aprovados + total_parciais) / total_boletos * 100) if total_boletos > 0 else 0.0
 
@@ -345,7 +361,7 @@ async def dashboard_valores(
     agrupamento: str = Query("mes", description="dia | semana | mes"),
     fidc_id: str | None = Query(None, description="Filtro por FIDC"),
     status_filter: str | None = Query(None, description="Filtro por status"),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_db_leitura),
     _current_user: Usuario = Depends(get_current_user),
 ):
     """Valores bruto/liquido agregados por periodo (dia, semana, mes)."""
@@ -362,41 +378,43 @@ async def dashboard_valores(
             detail="agrupamento deve ser: dia, semana ou mes",
         )
 
-    dt_inicio = datetime.combine(data_inicio, datetime.min.time())
-    dt_fim = datetime.combine(data_fim, datetime.max.time())
-
-    periodo_col = func.date_trunc(pg_trunc, Operacao.created_at).label("periodo")
+    # Rollup diario: semana/mes agregam poucas linhas por FIDC x status
+    periodo_col = func.date_trunc(pg_trunc, DashboardRollup.dia).label("periodo")
 
     query = (
         select(
             periodo_col,
-            func.coalesce(func.sum(Operacao.valor_bruto), 0.0).label("valor_bruto"),
-            func.coalesce(func.sum(Operacao.valor_liquido), 0.0).label("valor_liquido"),
-            func.count(Operacao.id).label("count"),
+            func.coalesce(func.sum(DashboardRollup.valor_bruto_centavos), 0).label("valor_bruto"),
+            func.coalesce(func.sum(DashboardRollup.valor_liquido_centavos), 0).label("valor_liquido"),
+            func.coalesce(func.sum(DashboardRollup.operacoes), 0).label("count"),
         )
-        .where(Operacao.created_at >= dt_inicio)
-        .where(Operacao.created_at <= dt_fim)
+        .where(DashboardRollup.dia >= data_inicio)
+        .where(DashboardRollup.dia <= data_fim)
     )
 
     if fidc_id:
-        query = query.where(Operacao.fidc_id == fidc_id)
+        query = query.where(DashboardRollup.fidc_id == fidc_id)
     if status_filter:
-        query = query.where(Operacao.status == status_filter)
+        query = query.where(DashboardRollup.status == status_filter)
 
-    query = query.group_by(periodo_col).order_by(periodo_col)
+    query = (
+        query.group_by(periodo_col)
+        .having(func.sum(DashboardRollup.operacoes) > 0)  # periodos so com operacoes excluidas
+        .order_by(periodo_col)
+    )
 
     result = await db.execute(query)
     rows = result.all()
 
     items = []
-    total_bruto = 0.0
-    total_liquido = 0.0
+    total_bruto = 0
+    total_liquido = 0
     total_ops = 0
 
     for row in rows:
         periodo_dt = row.periodo
-        vb = float(row.valor_bruto)
-        vl = float(row.valor_liquido)
+        vb = int(row.valor_bruto)
+        vl = int(row.valor_liquido)
         cnt = int(row.count)
 
         if agrupamento == "mes":
@@ -413,8 +431,8 @@ async def dashboard_valores(
         items.append(ValoresAgregadoItem(
             periodo=periodo_str,
             periodo_label=periodo_label,
-            valor_bruto=round(vb, 2),
-            valor_liquido=round(vl, 2),
+            valor_bruto=vb / 100,
+            valor_liquido=vl / 100,
             count=cnt,
         ))
         total_bruto += vb
@@ -423,8 +441,8 @@ async def dashboard_valores(
 
     return ValoresAgregadoResponse(
         items=items,
-        total_bruto=round(total_bruto, 2),
-        total_liquido=round(total_liquido, 2),
+        total_bruto=total_bruto / 100,
+        total_liquido=total_liquido / 100,
         total_operacoes=total_ops,
     )
 
@@ -494,7 +512,9 @@ async def atualizar_valor_liquido(
     """Atualiza o valor liquido de uma operacao."""
     op = await _get_operacao(op_id, db)
 
-    op.valor_liquido = body.valor_liquido
+    op.valor_liquido_centavos = (
+        _reais_para_centavos(body.valor_liquido) if body.valor_liquido is not None else None
+    )
 
     await registrar_audit(
         db, acao="atualizar_valor_liquido", operacao_id=op.id,
@@ -523,7 +543,7 @@ async def download_boleto_arquivo(
     """Serve o arquivo PDF de um boleto."""
     op = await _get_operacao(op_id, db)
     result = await db.execute(
-        select(Boleto).where(Boleto.id == boleto_id, Boleto.operacao_id == op.id)
+        select(Boleto).where(Boleto.id == boleto_id, particoes.da_operacao(Boleto, op))
     )
     boleto = result.scalar_one_or_none()
     if not boleto or not boleto.arquivo_path:
@@ -582,7 +602,7 @@ async def download_xml_arquivo(
 @router.get("/{op_id}/preview-envio", response_model=PreviewEnvioResponse)
 async def preview_envio(
     op_id: str,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_db_leitura),
     _current_user: Usuario = Depends(get_current_user),
 ):
     """Retorna agrupamento de emails para preview, sem enviar."""
@@ -592,8 +612,9 @@ async def preview_envio(
     # Buscar boletos aprovados
     boletos_result = await db.execute(
         select(Boleto)
-        .where(Boleto.operacao_id == op.id)
+        .where(particoes.da_operacao(Boleto, op))
         .where(Boleto.status.in_(["aprovado", "parcialmente_aprovado"]))
+        .options(projecoes.com_validacao())
     )
     boletos_aprovados = boletos_result.scalars().all()
 
@@ -715,10 +736,7 @@ async def download_arquivos(
 
     # Para boletos, usar registros do DB com nomes renomeados
     if tipo == "boletos":
-        boletos_result = await db.execute(
-            select(Boleto).where(Boleto.operacao_id == op.id)
-        )
-        boletos_all = boletos_result.scalars().all()
+        boletos_all = await projecoes.arquivos_boletos(db, particoes.da_operacao(Boleto, op))
         arquivos_boleto: list[tuple[Path, str]] = []
         for b in boletos_all:
             if not b.arquivo_path:
@@ -767,15 +785,15 @@ async def download_arquivos(
 @router.get("/{op_id}/atividade", response_model=AtividadeResponse)
 async def listar_atividade(
     op_id: str,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_db_leitura),
     _current_user: Usuario = Depends(get_current_user),
 ):
     """Lista historico de acoes (audit trail) de uma operacao."""
-    await _get_operacao(op_id, db)
+    op = await _get_operacao(op_id, db)
 
     result = await db.execute(
         select(AuditLog)
-        .where(AuditLog.operacao_id == op_id)
+        .where(particoes.da_operacao(AuditLog, op))
         .order_by(AuditLog.created_at.desc())
     )
     logs = result.scalars().all()
@@ -817,7 +835,10 @@ async def get_operacao_detail(
     fidc = await _get_fidc(op.fidc_id, db)
 
     boletos_result = await db.execute(
-        select(Boleto).where(Boleto.operacao_id == op.id).order_by(Boleto.created_at)
+        select(Boleto)
+        .where(particoes.da_operacao(Boleto, op))
+        .order_by(Boleto.created_at)
+        .options(projecoes.com_validacao())
     )
     boletos = boletos_result.scalars().all()
 
@@ -867,8 +888,12 @@ async def upload_boletos(
     # Obter extrator pelo FIDC para extracao antecipada
     extrator = get_extractor_by_name(fidc.nome)
 
+    # XMLs ja enviados: cada pagina e validada assim que extraida
+    indice_xmls = await carregar_indice_xmls(db, op)
+
     total_paginas = 0
-    boletos_criados: list[BoletoCompleto] = []
+    linhas: list[dict] = []
+    paginas: list = []
 
     for file in files:
         # Validacao: apenas PDF
@@ -889,40 +914,64 @@ async def upload_boletos(
         # Salva arquivo original
         content = await file.read()
         orig_path.write_bytes(content)
+        metrics.BYTES_GRAVADOS.labels(fidc.nome, "boleto").inc(len(content))
 
         # Auto-split
-        split_files = split_pdf(orig_path, split_dir)
+        with metrics.medir("split_pdf", fidc.nome):
+            split_files = split_pdf(orig_path, split_dir)
         total_paginas += len(split_files)
+        metrics.PAGINAS.labels(fidc.nome).inc(len(split_files))
 
-        # Cria registro no banco para cada pagina + extracao antecipada
+        # Monta uma linha por pagina + extracao antecipada (insert em lote abaixo)
         for sf in split_files:
-            boleto = Boleto(
-                operacao_id=op.id,
-                arquivo_original=sf.name,
-                arquivo_path=str(sf),
+            linha = {
+                "operacao_id": op.id,
+                "arquivo_original": sf.name,
+                "arquivo_path": str(sf),
+                **campos_extraidos(None, None),
+                **campos_validacao_vazios(),
+            }
+
+            linhas.append(linha)
+            paginas.append(sf)
+
+    # Extracao antecipada + validacao contra os XMLs ja enviados
+    # (com a fila ativa, a extracao fica para os workers: um item por pagina)
+    if not settings.FILA_TRABALHO_ATIVA:
+        prioridade = prioridade_por_volume(len(paginas))
+        textos = await asyncio.gather(*(
+            executar_agendado(
+                metrics.cronometrado(extrair_texto_pdf, "extrair_texto_pdf", fidc.nome), str(sf),
+                prioridade=prioridade, usuario_id=_current_user.id, operacao_id=op.id, etapa="extracao",
             )
+            for sf in paginas
+        ), return_exceptions=True)
 
-            # Extracao antecipada: extrair dados do PDF
+        extraidos = []
+        for linha, sf, texto in zip(linhas, paginas, textos):
             try:
-                texto = _extrair_texto_pdf(str(sf))
-                dados_boleto = extrator.extrair(texto, sf.name)
-                nome_renomeado = gerar_nome_arquivo(dados_boleto)
-
-                boleto.pagador = dados_boleto.pagador
-                boleto.cnpj = dados_boleto.cnpj
-                boleto.numero_nota = dados_boleto.numero_nota
-                boleto.vencimento = dados_boleto.vencimento
-                boleto.vencimento_date = _parse_vencimento_date(dados_boleto.vencimento_completo)
-                boleto.valor = dados_boleto.valor
-                boleto.valor_formatado = dados_boleto.valor_formatado
-                boleto.fidc_detectada = dados_boleto.fidc_detectada
-                boleto.arquivo_renomeado = nome_renomeado
+                if isinstance(texto, Exception):
+                    raise texto
+                with metrics.medir("extrator_extrair", fidc.nome):
+                    dados_boleto = extrator.extrair(texto, sf.name)
+                linha.update(campos_extraidos(dados_boleto, gerar_nome_arquivo(dados_boleto)))
+                extraidos.append((linha, dados_boleto))
             except Exception as exc:
                 logger.warning("Extracao antecipada falhou para %s: %s", sf.name, exc)
 
-            db.add(boleto)
-            await db.flush()
-            boletos_criados.append(BoletoCompleto.model_validate(boleto))
+        # NFs de todas as paginas antes de validar: vinculo automatico nunca toma o XML de outra
+        indice_xmls.reservar_nfs(d.numero_nota for _, d in extraidos)
+        for linha, dados_boleto in extraidos:
+            linha.update(validar_extraido(dados_boleto, fidc.nome, indice_xmls))
+
+    with metrics.medir("db_inserir_boletos", fidc.nome):
+        criados = await inserir_boletos(db, linhas)
+    boletos_criados = [BoletoCompleto.model_validate(b) for b in criados]
+    if settings.FILA_TRABALHO_ATIVA:
+        await fila.enfileirar(
+            db, fila.TIPO_EXTRAIR_PAGINA, op.id, [{"boleto_id": str(b.id)} for b in criados],
+            usuario_id=_current_user.id, prioridade=prioridade_por_volume(len(criados)),
+        )
 
     # Atualiza total na operacao
     op.total_boletos = len(boletos_criados)
@@ -947,19 +996,30 @@ async def upload_xmls(
 ):
     op = await _get_operacao(op_id, db)
 
-    # Buscar numero_nota existentes (normalizados) para dedup XML vs PDF
-    existing_notas = await db.execute(
-        select(XmlNfe.numero_nota).where(XmlNfe.operacao_id == op.id)
+    # XMLs existentes: numero_nota (normalizado) para dedup XML vs PDF e os
+    # dados de cada XML para enriquecer PDFs de NF sem consultar por arquivo
+    existentes = await db.execute(
+        select(
+            XmlNfe.numero_nota, XmlNfe.nome_arquivo, XmlNfe.cnpj, XmlNfe.nome_destinatario,
+            XmlNfe.valor_total_centavos, XmlNfe.emails, XmlNfe.emails_invalidos,
+        ).where(XmlNfe.operacao_id == op.id)
     )
-    existing_notas_set = {(row[0] or "").lstrip("0") or "0" for row in existing_notas.all()}
+    existing_notas_set: set[str] = set()
+    xmls_por_nota: dict[str, object] = {}
+    for row in existentes.all():
+        existing_notas_set.add((row.numero_nota or "").lstrip("0") or "0")
+        if row.nome_arquivo.lower().endswith(".xml"):
+            xmls_por_nota.setdefault(row.numero_nota, row)
 
     op_dir = _operacao_dir(op.id)
     xmls_dir = op_dir / "xmls"
     xmls_dir.mkdir(parents=True, exist_ok=True)
 
-    xmls_result: list[XmlResumo] = []
+    novos: list[XmlNfe] = []
     validos = 0
     invalidos = 0
+    chaves_novas: set[str] = set()
+    bytes_gravados = 0
 
     # Ordenar: XMLs primeiro, PDFs depois (XMLs tem dados completos, PDFs sao skip se duplicado)
     files_sorted = sorted(files, key=lambda f: 1 if (f.filename or "").lower().endswith(".pdf") else 0)
@@ -982,6 +1042,7 @@ async def upload_xmls(
             )
         content = await file.read()
         nf_path.write_bytes(content)
+        bytes_gravados += len(content)
 
         is_pdf = file.filename.lower().endswith(".pdf")
 
@@ -995,19 +1056,12 @@ async def upload_xmls(
             # Se ja existe XML com mesmo numero_nota, copiar dados para enriquecer o PDF
             enriched: dict = {}
             if numero_nota in existing_notas_set:
-                existing_xml = await db.execute(
-                    select(XmlNfe).where(
-                        XmlNfe.operacao_id == op.id,
-                        XmlNfe.numero_nota == numero_nota,
-                        XmlNfe.nome_arquivo.ilike("%.xml"),
-                    )
-                )
-                xml_src = existing_xml.scalars().first()
+                xml_src = xmls_por_nota.get(numero_nota)
                 if xml_src:
                     enriched = {
                         "cnpj": xml_src.cnpj,
                         "nome_destinatario": xml_src.nome_destinatario,
-                        "valor_total": xml_src.valor_total,
+                        "valor_total_centavos": xml_src.valor_total_centavos,
                         "emails": xml_src.emails or [],
                         "emails_invalidos": xml_src.emails_invalidos or [],
                     }
@@ -1018,7 +1072,7 @@ async def upload_xmls(
                 numero_nota=numero_nota,
                 cnpj=enriched.get("cnpj"),
                 nome_destinatario=enriched.get("nome_destinatario"),
-                valor_total=enriched.get("valor_total"),
+                valor_total_centavos=enriched.get("valor_total_centavos"),
                 emails=enriched.get("emails", []),
                 emails_invalidos=enriched.get("emails_invalidos", []),
                 duplicatas=[],
@@ -1026,8 +1080,8 @@ async def upload_xmls(
                 dados_raw={},
             )
             db.add(xml_record)
-            await db.flush()
             existing_notas_set.add(numero_nota)
+            chaves_novas.add(chave_nf(numero_nota))
             validos += 1
         else:
             # Parse XML NFe
@@ -1044,7 +1098,7 @@ async def upload_xmls(
                 numero_nota=dados.numero_nota,
                 cnpj=dados.cnpj,
                 nome_destinatario=dados.nome_destinatario,
-                valor_total=dados.valor_total,
+                valor_total_centavos=dados.valor_total_centavos,
                 emails=dados.emails,
                 emails_invalidos=dados.emails_invalidos,
                 duplicatas=dados.duplicatas,
@@ -1052,15 +1106,25 @@ async def upload_xmls(
                 dados_raw=dados.dados_raw,
             )
             db.add(xml_record)
-            await db.flush()
             existing_notas_set.add(nf_normalizado)
+            xmls_por_nota.setdefault(xml_record.numero_nota, xml_record)
+            chaves_novas.add(chave_nf(dados.numero_nota))
 
             if dados.xml_valido:
                 validos += 1
             else:
                 invalidos += 1
 
-        xmls_result.append(XmlResumo.model_validate(xml_record))
+        novos.append(xml_record)
+
+    # Um INSERT para todos os arquivos (em vez de um flush por arquivo)
+    await db.flush()
+    xmls_result = [XmlResumo.model_validate(x) for x in novos]
+
+    # Revalidar apenas os boletos pendentes com NF correspondente aos XMLs novos
+    fidc = await _get_fidc(op.fidc_id, db)
+    metrics.BYTES_GRAVADOS.labels(fidc.nome, "xml").inc(bytes_gravados)
+    revalidados = await revalidar_por_notas(db, op, fidc.nome, chaves_novas)
 
     await db.commit()
 
@@ -1069,6 +1133,7 @@ async def upload_xmls(
         validos=validos,
         invalidos=invalidos,
         xmls=xmls_result,
+        boletos_revalidados=revalidados,
     )
 
 
@@ -1081,6 +1146,15 @@ async def processar_operacao(
     db: AsyncSession = Depends(get_db),
     _current_user: Usuario = Depends(get_current_user),
 ):
+    return await _exclusivo(
+        db, op_id, "processar", lambda: _processar_operacao(op_id, db, _current_user),
+        settings.LOCK_OPERACAO_ESPERA_SEGUNDOS,
+    )
+
+
+async def _processar_operacao(
+    op_id: str, db: AsyncSession, current_user: Usuario
+) -> ResultadoProcessamento:
     op = await _get_operacao(op_id, db)
 
     if op.status not in ("em_processamento", "aguardando_envio"):
@@ -1091,27 +1165,8 @@ async def processar_operacao(
 
     fidc = await _get_fidc(op.fidc_id, db)
 
-    # Carregar XMLs da operação → mapa por número da nota
-    xmls_result = await db.execute(select(XmlNfe).where(XmlNfe.operacao_id == op.id))
-    xmls = xmls_result.scalars().all()
-
-    mapa_xmls: dict[str, tuple[XmlNfe, DadosXmlNfe]] = {}
-    for xml_record in xmls:
-        nf = xml_record.numero_nota.lstrip("0")
-        # Priorizar XMLs sobre PDFs (PDFs de NF sao apenas para exibicao)
-        if nf in mapa_xmls and xml_record.nome_arquivo.lower().endswith(".pdf"):
-            continue
-        dados_xml = DadosXmlNfe(
-            xml_valido=xml_record.xml_valido,
-            numero_nota=xml_record.numero_nota,
-            cnpj=xml_record.cnpj or "",
-            nome_destinatario=xml_record.nome_destinatario or "",
-            valor_total=xml_record.valor_total or 0.0,
-            emails=xml_record.emails or [],
-            emails_invalidos=xml_record.emails_invalidos or [],
-            duplicatas=xml_record.duplicatas or [],
-        )
-        mapa_xmls[nf] = (xml_record, dados_xml)
+    # Carregar XMLs da operação → índices por NF, CNPJ, duplicata e nome
+    indice_xmls = await carregar_indice_xmls(db, op)
 
     # Obter extrator pelo FIDC
     extrator = get_extractor_by_name(fidc.nome)
@@ -1119,23 +1174,50 @@ async def processar_operacao(
     # Carregar boletos pendentes
     boletos_result = await db.execute(
         select(Boleto)
-        .where(Boleto.operacao_id == op.id)
+        .where(particoes.da_operacao(Boleto, op))
         .where(Boleto.status == "pendente")
+        .options(projecoes.com_validacao())
     )
     boletos = boletos_result.scalars().all()
 
     aprovados = 0
     parcialmente_aprovados = 0
     rejeitados = 0
-    boletos_processados: list[BoletoCompleto] = []
+    atualizacoes: list[tuple[Boleto, dict]] = []
 
     # Debug: pasta para salvar texto bruto extraido
     debug_dir = _operacao_dir(op.id) / "_debug_texto"
     debug_dir.mkdir(exist_ok=True)
 
+    # Ja validado no upload e entradas inalteradas -> reaproveitar campos extraidos
+    reaproveitados: dict = {}
     for boleto in boletos:
-        # 1. Extrair texto do PDF
-        texto = _extrair_texto_pdf(boleto.arquivo_path)
+        if boleto.validacao_fingerprint:
+            dados_gravados = dados_boleto_do_registro(boleto)
+            # Sem reservar: todos os boletos passam pelo localizar abaixo
+            xml_atual, _, vinculo_atual = indice_xmls.localizar(dados_gravados, reservar=False)
+            if fingerprint_validacao(
+                dados_gravados, fidc.nome, xml_atual, vinculo_atual
+            ) == boleto.validacao_fingerprint:
+                reaproveitados[boleto.id] = dados_gravados
+
+    # 1. Extrair texto dos PDFs restantes (em paralelo, pelo agendador)
+    a_extrair = [b for b in boletos if b.id not in reaproveitados]
+    prioridade = prioridade_por_volume(len(a_extrair))
+    textos = dict(zip(
+        (b.id for b in a_extrair),
+        await asyncio.gather(*(
+            executar_agendado(
+                metrics.cronometrado(extrair_texto_pdf, "extrair_texto_pdf", fidc.nome), b.arquivo_path,
+                prioridade=prioridade, usuario_id=current_user.id, operacao_id=op.id, etapa="extracao",
+            )
+            for b in a_extrair
+        )),
+    ))
+
+    extraidos = dict(reaproveitados)
+    for boleto in a_extrair:
+        texto = textos[boleto.id]
 
         # DEBUG: salvar texto bruto para analise
         try:
@@ -1145,7 +1227,14 @@ async def processar_operacao(
             pass  # nao falhar por causa do debug
 
         # 2. Extrair dados com o extrator do FIDC
-        dados_boleto = extrator.extrair(texto, boleto.arquivo_original)
+        with metrics.medir("extrator_extrair", fidc.nome):
+            extraidos[boleto.id] = extrator.extrair(texto, boleto.arquivo_original)
+
+    # NFs lidas agora tambem ficam reservadas antes de procurar candidatos
+    indice_xmls.reservar_nfs(d.numero_nota for d in extraidos.values())
+
+    for boleto in boletos:
+        dados_boleto = extraidos[boleto.id]
 
         # DEBUG: log dos dados extraidos
         logger.info(
@@ -1158,60 +1247,58 @@ async def processar_operacao(
             dados_boleto.cnpj,
         )
 
-        # 3. Encontrar XML correspondente
-        nf_key = (dados_boleto.numero_nota or "").lstrip("0")
-        xml_pair = mapa_xmls.get(nf_key)
-        xml_record = xml_pair[0] if xml_pair else None
-        dados_xml = xml_pair[1] if xml_pair else None
+        # 3. Encontrar XML correspondente (NF ou candidato por CNPJ/duplicata/nome)
+        xml_record, dados_xml, vinculo = indice_xmls.localizar(dados_boleto)
 
         # 4. Validação 5 camadas
-        resultado = validar_5_camadas(dados_boleto, dados_xml)
+        with metrics.medir("validar_5_camadas", fidc.nome):
+            resultado = validar_5_camadas(dados_boleto, dados_xml, vinculo)
 
         # 5. Gerar nome renomeado
         nome_renomeado = gerar_nome_arquivo(dados_boleto)
 
-        # 6. Atualizar registro do boleto
-        boleto.pagador = dados_boleto.pagador
-        boleto.cnpj = dados_boleto.cnpj
-        boleto.numero_nota = dados_boleto.numero_nota
-        boleto.vencimento = dados_boleto.vencimento
-        boleto.vencimento_date = _parse_vencimento_date(dados_boleto.vencimento_completo)
-        boleto.valor = dados_boleto.valor
-        boleto.valor_formatado = dados_boleto.valor_formatado
-        boleto.fidc_detectada = dados_boleto.fidc_detectada
-        boleto.arquivo_renomeado = nome_renomeado
-        boleto.juros_detectado = resultado.juros_detectado
-
-        # Validações por camada
-        camadas = {c.camada: c for c in resultado.camadas}
-        boleto.validacao_camada1 = _camada_to_dict(camadas.get(1))
-        boleto.validacao_camada2 = _camada_to_dict(camadas.get(2))
-        boleto.validacao_camada3 = _camada_to_dict(camadas.get(3))
-        boleto.validacao_camada4 = _camada_to_dict(camadas.get(4))
-        boleto.validacao_camada5 = _camada_to_dict(camadas.get(5))
+        # 6. Atualizar registro do boleto (gravado em lote apos o loop)
+        valores = {
+            **campos_extraidos(dados_boleto, nome_renomeado),
+            **campos_resultado(resultado, dados_boleto),
+            "validacao_fingerprint": fingerprint_validacao(
+                dados_boleto, fidc.nome, xml_record, vinculo
+            ),
+        }
 
         if resultado.aprovado and not resultado.parcialmente_aprovado:
-            boleto.status = "aprovado"
+            valores["status"] = "aprovado"
             aprovados += 1
         elif resultado.parcialmente_aprovado:
-            boleto.status = "parcialmente_aprovado"
-            boleto.motivo_rejeicao = resultado.motivo_parcial
+            valores["status"] = "parcialmente_aprovado"
+            valores["motivo_rejeicao"] = resultado.motivo_parcial
             parcialmente_aprovados += 1
         else:
-            boleto.status = "rejeitado"
-            boleto.motivo_rejeicao = resultado.motivo_rejeicao
+            valores["status"] = "rejeitado"
+            valores["motivo_rejeicao"] = resultado.motivo_rejeicao
             rejeitados += 1
 
         # Vincular ao XML
         if xml_record:
-            boleto.xml_nfe_id = xml_record.id
+            valores["xml_nfe_id"] = xml_record.id
 
         # Renomear arquivo fisicamente e atualizar path no banco
         if boleto.arquivo_path and resultado.aprovado:
-            _renomear_arquivo(Path(boleto.arquivo_path), nome_renomeado)
-            boleto.arquivo_path = str(Path(boleto.arquivo_path).parent / nome_renomeado)
+            with metrics.medir("renomear_arquivo", fidc.nome):
+                _renomear_arquivo(Path(boleto.arquivo_path), nome_renomeado)
+            valores["arquivo_path"] = str(Path(boleto.arquivo_path).parent / nome_renomeado)
 
-        boletos_processados.append(BoletoCompleto.model_validate(boleto))
+        metrics.BOLETOS_VALIDADOS.labels(fidc.nome, valores["status"]).inc()
+        atualizacoes.append((boleto, valores))
+
+    with metrics.medir("db_atualizar_boletos", fidc.nome):
+        await atualizar_boletos(db, atualizacoes)
+
+    # Conciliar parcelas de todos os boletos aprovados da operacao (inclui anteriores)
+    alertas_parcelas = _conciliar_parcelas(
+        await projecoes.boletos_para_conciliacao(db, op), indice_xmls,
+    )
+    boletos_processados = [BoletoCompleto.model_validate(b) for b in boletos]
 
     # Atualizar totais da operacao
     total = aprovados + parcialmente_aprovados + rejeitados
@@ -1222,11 +1309,7 @@ async def processar_operacao(
     op.taxa_sucesso = ((aprovados + parcialmente_aprovados) / total * 100) if total > 0 else 0.0
 
     # Computar valor bruto (soma dos boletos aprovados + parcialmente aprovados)
-    valor_bruto_total = sum(
-        b.valor for b in boletos
-        if b.status in ("aprovado", "parcialmente_aprovado") and b.valor is not None
-    )
-    op.valor_bruto = valor_bruto_total if valor_bruto_total > 0 else None
+    op.valor_bruto_centavos = await _somar_valor_bruto(db, op, [b.id for b in boletos])
 
     # Auto-transicao de status baseada nos resultados
     if (aprovados + parcialmente_aprovados) > 0:
@@ -1236,8 +1319,14 @@ async def processar_operacao(
 
     await registrar_audit(
         db, acao="processar_operacao", operacao_id=op.id,
-        usuario_id=_current_user.id, entidade="operacao",
-        detalhes={"total": total, "aprovados": aprovados, "parcialmente_aprovados": parcialmente_aprovados, "rejeitados": rejeitados},
+        usuario_id=current_user.id, entidade="operacao",
+        detalhes={
+            "total": total,
+            "aprovados": aprovados,
+            "parcialmente_aprovados": parcialmente_aprovados,
+            "rejeitados": rejeitados,
+            "alertas_parcelas": len(alertas_parcelas),
+        },
     )
     await db.commit()
 
@@ -1249,6 +1338,7 @@ async def processar_operacao(
         taxa_sucesso=op.taxa_sucesso,
         valor_bruto=op.valor_bruto,
         boletos=boletos_processados,
+        alertas_parcelas=alertas_parcelas,
     )
 
 
@@ -1262,6 +1352,15 @@ async def reprocessar_operacao(
     current_user: Usuario = Depends(get_current_user),
 ):
     """Reprocessa apenas boletos com status 'rejeitado'."""
+    return await _exclusivo(
+        db, op_id, "reprocessar", lambda: _reprocessar_operacao(op_id, db, current_user),
+        settings.LOCK_OPERACAO_ESPERA_SEGUNDOS,
+    )
+
+
+async def _reprocessar_operacao(
+    op_id: str, db: AsyncSession, current_user: Usuario
+) -> ResultadoProcessamento:
     op = await _get_operacao(op_id, db)
 
     if op.status not in ("em_processamento", "aguardando_envio", "enviada"):
@@ -1272,35 +1371,17 @@ async def reprocessar_operacao(
 
     fidc = await _get_fidc(op.fidc_id, db)
 
-    # Recarregar mapa de XMLs
-    xmls_result = await db.execute(select(XmlNfe).where(XmlNfe.operacao_id == op.id))
-    xmls = xmls_result.scalars().all()
-
-    mapa_xmls: dict[str, tuple[XmlNfe, DadosXmlNfe]] = {}
-    for xml_record in xmls:
-        nf = xml_record.numero_nota.lstrip("0")
-        # Priorizar XMLs sobre PDFs (PDFs de NF sao apenas para exibicao)
-        if nf in mapa_xmls and xml_record.nome_arquivo.lower().endswith(".pdf"):
-            continue
-        dados_xml = DadosXmlNfe(
-            xml_valido=xml_record.xml_valido,
-            numero_nota=xml_record.numero_nota,
-            cnpj=xml_record.cnpj or "",
-            nome_destinatario=xml_record.nome_destinatario or "",
-            valor_total=xml_record.valor_total or 0.0,
-            emails=xml_record.emails or [],
-            emails_invalidos=xml_record.emails_invalidos or [],
-            duplicatas=xml_record.duplicatas or [],
-        )
-        mapa_xmls[nf] = (xml_record, dados_xml)
+    # Recarregar indices de XMLs
+    indice_xmls = await carregar_indice_xmls(db, op)
 
     extrator = get_extractor_by_name(fidc.nome)
 
     # Buscar APENAS boletos rejeitados
     boletos_result = await db.execute(
         select(Boleto)
-        .where(Boleto.operacao_id == op.id)
+        .where(particoes.da_operacao(Boleto, op))
         .where(Boleto.status == "rejeitado")
+        .options(projecoes.com_validacao())
     )
     boletos_rejeitados = boletos_result.scalars().all()
 
@@ -1313,15 +1394,41 @@ async def reprocessar_operacao(
     novos_aprovados = 0
     novos_parciais = 0
     ainda_rejeitados = 0
-    boletos_processados: list[BoletoCompleto] = []
+    pulados = 0
+    atualizacoes: list[tuple[Boleto, dict]] = []
 
     # Debug: pasta para salvar texto bruto extraido
     debug_dir = _operacao_dir(op.id) / "_debug_texto"
     debug_dir.mkdir(exist_ok=True)
 
+    # Entradas inalteradas desde a ultima validacao -> resultado gravado continua valido
+    a_reprocessar = []
     for boleto in boletos_rejeitados:
-        texto = _extrair_texto_pdf(boleto.arquivo_path)
+        if boleto.validacao_fingerprint:
+            dados_gravados = dados_boleto_do_registro(boleto)
+            xml_atual, _, vinculo_atual = indice_xmls.localizar(dados_gravados, reservar=False)
+            fingerprint = fingerprint_validacao(dados_gravados, fidc.nome, xml_atual, vinculo_atual)
+            if fingerprint == boleto.validacao_fingerprint:
+                # Pulado mantem o XML resolvido: reservado para os demais
+                if xml_atual is not None:
+                    indice_xmls.reservar_nfs([xml_atual.numero_nota])
+                pulados += 1
+                ainda_rejeitados += 1
+                continue
+        a_reprocessar.append(boleto)
+
+    # Poucos rejeitados: classe interativa, passa na frente de lotes em andamento
+    prioridade = prioridade_por_volume(len(a_reprocessar), interativa=True)
+    textos = await asyncio.gather(*(
+        executar_agendado(
+            metrics.cronometrado(extrair_texto_pdf, "extrair_texto_pdf", fidc.nome), b.arquivo_path,
+            prioridade=prioridade, usuario_id=current_user.id, operacao_id=op.id, etapa="extracao",
+        )
+        for b in a_reprocessar
+    ))
 
+    extraidos = []
+    for boleto, texto in zip(a_reprocessar, textos):
         # DEBUG: salvar texto bruto para analise
         try:
             stem = Path(boleto.arquivo_original).stem if boleto.arquivo_original else "unknown"
@@ -1329,68 +1436,68 @@ async def reprocessar_operacao(
         except Exception:
             pass
 
-        dados_boleto = extrator.extrair(texto, boleto.arquivo_original)
+        with metrics.medir("extrator_extrair", fidc.nome):
+            extraidos.append((boleto, extrator.extrair(texto, boleto.arquivo_original)))
+
+    # NFs lidas agora tambem ficam reservadas antes de procurar candidatos
+    indice_xmls.reservar_nfs(d.numero_nota for _, d in extraidos)
 
-        nf_key = (dados_boleto.numero_nota or "").lstrip("0")
-        xml_pair = mapa_xmls.get(nf_key)
-        xml_record = xml_pair[0] if xml_pair else None
-        dados_xml = xml_pair[1] if xml_pair else None
+    for boleto, dados_boleto in extraidos:
+        xml_record, dados_xml, vinculo = indice_xmls.localizar(dados_boleto)
 
-        resultado = validar_5_camadas(dados_boleto, dados_xml)
+        with metrics.medir("validar_5_camadas", fidc.nome):
+            resultado = validar_5_camadas(dados_boleto, dados_xml, vinculo)
         nome_renomeado = gerar_nome_arquivo(dados_boleto)
 
-        # Atualizar dados extraidos
-        boleto.pagador = dados_boleto.pagador
-        boleto.cnpj = dados_boleto.cnpj
-        boleto.numero_nota = dados_boleto.numero_nota
-        boleto.vencimento = dados_boleto.vencimento
-        boleto.vencimento_date = _parse_vencimento_date(dados_boleto.vencimento_completo)
-        boleto.valor = dados_boleto.valor
-        boleto.valor_formatado = dados_boleto.valor_formatado
-        boleto.fidc_detectada = dados_boleto.fidc_detectada
-        boleto.arquivo_renomeado = nome_renomeado
-        boleto.juros_detectado = resultado.juros_detectado
-
-        camadas = {c.camada: c for c in resultado.camadas}
-        boleto.validacao_camada1 = _camada_to_dict(camadas.get(1))
-        boleto.validacao_camada2 = _camada_to_dict(camadas.get(2))
-        boleto.validacao_camada3 = _camada_to_dict(camadas.get(3))
-        boleto.validacao_camada4 = _camada_to_dict(camadas.get(4))
-        boleto.validacao_camada5 = _camada_to_dict(camadas.get(5))
+        # Atualizar dados extraidos (gravado em lote apos o loop)
+        valores = {
+            **campos_extraidos(dados_boleto, nome_renomeado),
+            **campos_resultado(resultado, dados_boleto),
+            "validacao_fingerprint": fingerprint_validacao(
+                dados_boleto, fidc.nome, xml_record, vinculo
+            ),
+        }
 
         if resultado.aprovado and not resultado.parcialmente_aprovado:
-            boleto.status = "aprovado"
-            boleto.motivo_rejeicao = None
+            valores["status"] = "aprovado"
+            valores["motivo_rejeicao"] = None
             novos_aprovados += 1
             if boleto.arquivo_path:
-                _renomear_arquivo(Path(boleto.arquivo_path), nome_renomeado)
-                boleto.arquivo_path = str(Path(boleto.arquivo_path).parent / nome_renomeado)
+                with metrics.medir("renomear_arquivo", fidc.nome):
+                    _renomear_arquivo(Path(boleto.arquivo_path), nome_renomeado)
+                valores["arquivo_path"] = str(Path(boleto.arquivo_path).parent / nome_renomeado)
         elif resultado.parcialmente_aprovado:
-            boleto.status = "parcialmente_aprovado"
-            boleto.motivo_rejeicao = resultado.motivo_parcial
+            valores["status"] = "parcialmente_aprovado"
+            valores["motivo_rejeicao"] = resultado.motivo_parcial
             novos_parciais += 1
             if boleto.arquivo_path:
-                _renomear_arquivo(Path(boleto.arquivo_path), nome_renomeado)
-                boleto.arquivo_path = str(Path(boleto.arquivo_path).parent / nome_renomeado)
+                with metrics.medir("renomear_arquivo", fidc.nome):
+                    _renomear_arquivo(Path(boleto.arquivo_path), nome_renomeado)
+                valores["arquivo_path"] = str(Path(boleto.arquivo_path).parent / nome_renomeado)
         else:
-            boleto.status = "rejeitado"
-            boleto.motivo_rejeicao = resultado.motivo_rejeicao
+            valores["status"] = "rejeitado"
+            valores["motivo_rejeicao"] = resultado.motivo_rejeicao
             ainda_rejeitados += 1
 
         if xml_record:
-            boleto.xml_nfe_id = xml_record.id
+            valores["xml_nfe_id"] = xml_record.id
+
+        metrics.BOLETOS_VALIDADOS.labels(fidc.nome, valores["status"]).inc()
+        atualizacoes.append((boleto, valores))
 
-        boletos_processados.append(BoletoCompleto.model_validate(boleto))
+    with metrics.medir("db_atualizar_boletos", fidc.nome):
+        await atualizar_boletos(db, atualizacoes)
 
     # Recalcular totais da operacao (incluindo aprovados anteriores)
-    all_boletos_result = await db.execute(
-        select(Boleto).where(Boleto.operacao_id == op.id)
+    alertas_parcelas = _conciliar_parcelas(
+        await projecoes.boletos_para_conciliacao(db, op), indice_xmls,
     )
-    all_boletos = all_boletos_result.scalars().all()
-    total_aprovados = sum(1 for b in all_boletos if b.status == "aprovado")
-    total_parciais = sum(1 for b in all_boletos if b.status == "parcialmente_aprovado")
-    total_rejeitados = sum(1 for b in all_boletos if b.status == "rejeitado")
-    total = len(all_boletos)
+    boletos_processados = [BoletoCompleto.model_validate(b) for b in boletos_rejeitados]
+    por_status = await projecoes.contar_por_status(db, op)
+    total_aprovados = por_status.get("aprovado", 0)
+    total_parciais = por_status.get("parcialmente_aprovado", 0)
+    total_rejeitados = por_status.get("rejeitado", 0)
+    total = sum(por_status.values())
 
     op.total_boletos = total
     op.total_aprovados = total_aprovados
@@ -1399,11 +1506,7 @@ async def reprocessar_operacao(
     op.taxa_sucesso = ((total_aprovados + total_parciais) / total * 100) if total > 0 else 0.0
 
     # Recalcular valor bruto (soma dos boletos aprovados + parcialmente aprovados)
-    valor_bruto_total = sum(
-        b.valor for b in all_boletos
-        if b.status in ("aprovado", "parcialmente_aprovado") and b.valor is not None
-    )
-    op.valor_bruto = valor_bruto_total if valor_bruto_total > 0 else None
+    op.valor_bruto_centavos = await _somar_valor_bruto(db, op)
 
     # Recalcular status da operacao
     if (total_aprovados + total_parciais) > 0:
@@ -1419,6 +1522,8 @@ async def reprocessar_operacao(
             "novos_aprovados": novos_aprovados,
             "novos_parciais": novos_parciais,
             "ainda_rejeitados": ainda_rejeitados,
+            "pulados": pulados,
+            "alertas_parcelas": len(alertas_parcelas),
         },
     )
     await db.commit()
@@ -1431,6 +1536,8 @@ async def reprocessar_operacao(
         taxa_sucesso=op.taxa_sucesso,
         valor_bruto=op.valor_bruto,
         boletos=boletos_processados,
+        alertas_parcelas=alertas_parcelas,
+        pulados=pulados,
     )
 
 
@@ -1455,7 +1562,10 @@ async def finalizar_operacao(
 
     # Buscar boletos e XMLs
     boletos_result = await db.execute(
-        select(Boleto).where(Boleto.operacao_id == op.id).order_by(Boleto.created_at)
+        select(Boleto)
+        .where(particoes.da_operacao(Boleto, op))
+        .order_by(Boleto.created_at)
+        .options(projecoes.com_validacao())
     )
     todos_boletos = boletos_result.scalars().all()
 
@@ -1500,6 +1610,7 @@ async def finalizar_operacao(
             "taxa_sucesso": op.taxa_sucesso,
             "relatorio_gerado": relatorio_gerado,
         },
+        sincrono=True,
     )
     await db.commit()
 
@@ -1541,7 +1652,7 @@ async def cancelar_operacao(
     await registrar_audit(
         db, acao="cancelar_operacao", operacao_id=op.id,
         usuario_id=current_user.id, entidade="operacao",
-        detalhes={"numero": op.numero},
+        detalhes={"numero": op.numero}, sincrono=True,
     )
     await db.commit()
     await db.refresh(op)
@@ -1568,6 +1679,7 @@ async def excluir_operacao(
 
     # Deletar registros filhos (sem CASCADE no banco)
     await db.execute(delete(AuditLog).where(AuditLog.operacao_id == op.id))
+    await db.execute(delete(WorkItem).where(WorkItem.operacao_id == op.id))
     await db.execute(delete(Envio).where(Envio.operacao_id == op.id))
     await db.execute(delete(Boleto).where(Boleto.operacao_id == op.id))
     await db.execute(delete(XmlNfe).where(XmlNfe.operacao_id == op.id))
@@ -1594,6 +1706,16 @@ async def enviar_operacao(
     current_user: Usuario = Depends(get_current_user),
 ):
     """Envia boletos aprovados via SMTP (preview = rascunho no banco, automatico = envio direto)."""
+    # Sem espera: um segundo envio concorrente geraria Envios/emails duplicados
+    return await _exclusivo(
+        db, op_id, f"enviar:{body.modo}", lambda: _enviar_operacao(op_id, body, db, current_user),
+        0,
+    )
+
+
+async def _enviar_operacao(
+    op_id: str, body: EnvioRequest, db: AsyncSession, current_user: Usuario
+) -> EnvioResultado:
     op = await _get_operacao(op_id, db)
 
     if op.status not in ("aguardando_envio", "em_processamento", "enviada"):
@@ -1613,7 +1735,7 @@ async def enviar_operacao(
     # Buscar boletos aprovados
     boletos_result = await db.execute(
         select(Boleto)
-        .where(Boleto.operacao_id == op.id)
+        .where(particoes.da_operacao(Boleto, op))
         .where(Boleto.status.in_(["aprovado", "parcialmente_aprovado"]))
     )
     boletos_aprovados = boletos_result.scalars().all()
@@ -1662,19 +1784,16 @@ async def enviar_operacao(
             detail="Nenhum email destino encontrado nos XMLs vinculados",
         )
 
-    # Instanciar mailer SMTP
-    mailer = SMTPMailer(
-        host=settings.SMTP_HOST,
-        port=settings.SMTP_PORT,
-        user=settings.SMTP_USER,
-        password=settings.SMTP_PASSWORD,
-        use_tls=settings.SMTP_USE_TLS,
-        from_email=settings.SMTP_FROM_EMAIL,
-        from_name=settings.SMTP_FROM_NAME,
+    # Instanciar mailer SMTP (com a fila ativa, os workers enviam)
+    mailer = None if settings.FILA_TRABALHO_ATIVA else criar_mailer()
+    agendamento = dict(
+        prioridade=prioridade_por_volume(len(grupos)),
+        usuario_id=current_user.id, operacao_id=op.id, etapa="smtp",
     )
 
     detalhes: list[EnvioDetalhe] = []
     emails_enviados = 0
+    envios_enfileirados: list[dict] = []
 
     for group in grupos:
         # Criar registro Envio no banco
@@ -1694,19 +1813,26 @@ async def enviar_operacao(
         await db.flush()
 
         # Enviar ou criar rascunho
-        try:
-            if body.modo == "preview":
-                await asyncio.to_thread(mailer.create_draft, group)
-                envio.status = "rascunho"
-            else:
-                await asyncio.to_thread(mailer.send_email, group)
-                envio.status = "enviado"
-                envio.timestamp_envio = datetime.now(timezone.utc)
-                emails_enviados += 1
-        except RuntimeError as e:
-            envio.status = "erro"
-            envio.erro_detalhes = str(e)
-
+        if mailer is None:
+            envios_enfileirados.append({"envio_id": str(envio.id)})
+        else:
+            try:
+                if body.modo == "preview":
+                    await executar_agendado(mailer.create_draft, group, **agendamento)
+                    envio.status = "rascunho"
+                else:
+                    await executar_agendado(
+                        metrics.cronometrado(mailer.send_email, "smtp_envio", fidc.nome), group, **agendamento,
+                    )
+                    envio.status = "enviado"
+                    envio.timestamp_envio = datetime.now(timezone.utc)
+                    emails_enviados += 1
+            except RuntimeError as e:
+                envio.status = "erro"
+                envio.erro_detalhes = str(e)
+
+        if mailer is not None:
+            metrics.EMAILS.labels(fidc.nome, envio.status).inc()
         detalhes.append(EnvioDetalhe(
             email_para=group.email_para,
             email_cc=group.email_cc,
@@ -1716,6 +1842,11 @@ async def enviar_operacao(
             status=envio.status,
         ))
 
+    await fila.enfileirar(
+        db, fila.TIPO_ENVIAR_EMAIL, op.id, envios_enfileirados,
+        usuario_id=current_user.id, prioridade=agendamento["prioridade"],
+    )
+
     # Atualizar modo_envio na operacao
     op.modo_envio = body.modo
 
@@ -1726,12 +1857,13 @@ async def enviar_operacao(
             "modo": body.modo,
             "emails_criados": len(grupos),
             "emails_enviados": emails_enviados,
+            "emails_enfileirados": len(envios_enfileirados),
         },
     )
     await db.commit()
 
     # Auto-transicao: se todos os envios estao enviados, marcar operacao como enviada
-    if await _todos_enviados(op.id, db):
+    if await todos_enviados(op, db):
         op.status = "enviada"
         await db.commit()
 
@@ -1753,11 +1885,11 @@ async def listar_envios(
     _current_user: Usuario = Depends(get_current_user),
 ):
     """Lista todos os envios de uma operacao."""
-    await _get_operacao(op_id, db)  # Valida que existe
+    op = await _get_operacao(op_id, db)
 
     result = await db.execute(
         select(Envio)
-        .where(Envio.operacao_id == op_id)
+        .where(particoes.da_operacao(Envio, op))
         .order_by(Envio.created_at.desc())
     )
     envios = result.scalars().all()
@@ -1779,7 +1911,7 @@ async def confirmar_envio(
     op = await _get_operacao(op_id, db)
 
     result = await db.execute(
-        select(Envio).where(Envio.id == envio_id, Envio.operacao_id == op_id)
+        select(Envio).where(Envio.id == envio_id, particoes.da_operacao(Envio, op))
     )
     envio = result.scalar_one_or_none()
     if not envio:
@@ -1791,25 +1923,22 @@ async def confirmar_envio(
             detail="Apenas envios com status 'rascunho' podem ser confirmados",
         )
 
-    group = await _reconstruir_email_group(envio, op, db)
+    group = await reconstruir_email_group(envio, op, db)
+    fidc = await _get_fidc(op.fidc_id, db)
 
-    mailer = SMTPMailer(
-        host=settings.SMTP_HOST,
-        port=settings.SMTP_PORT,
-        user=settings.SMTP_USER,
-        password=settings.SMTP_PASSWORD,
-        use_tls=settings.SMTP_USE_TLS,
-        from_email=settings.SMTP_FROM_EMAIL,
-        from_name=settings.SMTP_FROM_NAME,
-    )
+    mailer = criar_mailer()
 
     try:
-        await asyncio.to_thread(mailer.send_email, group)
+        await executar_agendado(
+            metrics.cronometrado(mailer.send_email, "smtp_envio", fidc.nome), group,
+            prioridade=Prioridade.INTERATIVA, usuario_id=current_user.id, operacao_id=op.id, etapa="smtp",
+        )
         envio.status = "enviado"
         envio.timestamp_envio = datetime.now(timezone.utc)
     except RuntimeError as e:
         envio.status = "erro"
         envio.erro_detalhes = str(e)
+    metrics.EMAILS.labels(fidc.nome, envio.status).inc()
 
     await registrar_audit(
         db,
@@ -1823,7 +1952,7 @@ async def confirmar_envio(
     await db.commit()
 
     # Auto-transicao: se todos os envios da operacao foram enviados
-    if await _todos_enviados(op.id, db):
+    if await todos_enviados(op, db):
         op.status = "enviada"
         await db.commit()
 
@@ -1846,37 +1975,36 @@ async def confirmar_todos_envios(
 
     result = await db.execute(
         select(Envio)
-        .where(Envio.operacao_id == op_id, Envio.status == "rascunho")
+        .where(particoes.da_operacao(Envio, op), Envio.status == "rascunho")
     )
     rascunhos = result.scalars().all()
 
     if not rascunhos:
         raise HTTPException(status_code=400, detail="Nenhum rascunho pendente")
 
-    mailer = SMTPMailer(
-        host=settings.SMTP_HOST,
-        port=settings.SMTP_PORT,
-        user=settings.SMTP_USER,
-        password=settings.SMTP_PASSWORD,
-        use_tls=settings.SMTP_USE_TLS,
-        from_email=settings.SMTP_FROM_EMAIL,
-        from_name=settings.SMTP_FROM_NAME,
-    )
+    fidc = await _get_fidc(op.fidc_id, db)
+    mailer = criar_mailer()
+    prioridade = prioridade_por_volume(len(rascunhos))
 
     detalhes: list[EnvioDetalhe] = []
     emails_enviados = 0
 
-    for envio in rascunhos:
-        group = await _reconstruir_email_group(envio, op, db)
+    # Anexos de todos os rascunhos de uma vez (nao 3 consultas por envio)
+    groups = await reconstruir_email_groups(rascunhos, op, db)
 
+    for envio, group in zip(rascunhos, groups):
         try:
-            await asyncio.to_thread(mailer.send_email, group)
+            await executar_agendado(
+                metrics.cronometrado(mailer.send_email, "smtp_envio", fidc.nome), group,
+                prioridade=prioridade, usuario_id=current_user.id, operacao_id=op.id, etapa="smtp",
+            )
             envio.status = "enviado"
             envio.timestamp_envio = datetime.now(timezone.utc)
             emails_enviados += 1
         except RuntimeError as e:
             envio.status = "erro"
             envio.erro_detalhes = str(e)
+        metrics.EMAILS.labels(fidc.nome, envio.status).inc()
 
         detalhes.append(EnvioDetalhe(
             email_para=envio.email_para,
@@ -1901,7 +2029,7 @@ async def confirmar_todos_envios(
     await db.commit()
 
     # Auto-transicao: se todos os envios da operacao foram enviados
-    if await _todos_enviados(op.id, db):
+    if await todos_enviados(op, db):
         op.status = "enviada"
         await db.commit()
 
@@ -1927,7 +2055,7 @@ async def atualizar_emails_xml(
     """Edita os emails de destino de um XML."""
     import re
 
-    await _get_operacao(op_id, db)
+    op = await _get_operacao(op_id, db)
 
     result = await db.execute(
         select(XmlNfe).where(XmlNfe.id == xml_id, XmlNfe.operacao_id == op_id)
@@ -1950,6 +2078,11 @@ async def atualizar_emails_xml(
 
     xml.emails = valid_emails
     xml.emails_invalidos = invalid_emails
+    await db.flush()
+
+    # Emails so afetam a Camada 5: reexecutar apenas ela nos boletos pendentes vinculados
+    fidc = await _get_fidc(op.fidc_id, db)
+    await revalidar_emails(db, op, xml, fidc.nome)
 
     await db.commit()
     await db.refresh(xml)
@@ -1969,10 +2102,10 @@ async def atualizar_status_envio(
     current_user: Usuario = Depends(get_current_user),
 ):
     """Marca manualmente um envio como enviado."""
-    await _get_operacao(op_id, db)
+    op = await _get_operacao(op_id, db)
 
     result = await db.execute(
-        select(Envio).where(Envio.id == envio_id, Envio.operacao_id == op_id)
+        select(Envio).where(Envio.id == envio_id, particoes.da_operacao(Envio, op))
     )
     envio = result.scalar_one_or_none()
     if not envio:
@@ -1989,18 +2122,18 @@ async def atualizar_status_envio(
     await registrar_audit(
         db,
         acao="envio_status_manual",
-        operacao_id=uuid.UUID(op_id),
+        operacao_id=op.id,
         usuario_id=current_user.id,
         entidade="envio",
         entidade_id=str(envio.id),
         detalhes={"de": status_anterior, "para": body.status, "via": "manual"},
+        sincrono=True,
     )
 
     await db.commit()
 
     # Auto-transicao: se marcou como enviado e todos os envios estao concluidos
-    if body.status == "enviado" and await _todos_enviados(uuid.UUID(op_id), db):
-        op = await _get_operacao(op_id, db)
+    if body.status == "enviado" and await todos_enviados(op, db):
         op.status = "enviada"
         await db.commit()
 
@@ -2070,46 +2203,80 @@ async def download_relatorio(
 # ── Funcoes auxiliares internas ──────────────────────────────
 
 
-def _extrair_texto_pdf(file_path: str | None) -> str:
-    """Extrai texto completo de um PDF via pdfplumber."""  # noqa: D401
-    if not file_path:
-        return ""
-    try:
-        with pdfplumber.open(file_path) as pdf:
-            texts = []
-            for page in pdf.pages:
-                text = page.extract_text()
-                if text:
-                    texts.append(text)
-            return "\n".join(texts)
-    except Exception:
-        return ""
+async def _somar_valor_bruto(db: AsyncSession, op: Operacao, boleto_ids: list | None = None) -> int | None:
+    """Soma (no banco) os centavos dos boletos aprovados + parcialmente aprovados.
+
+    Com ``boleto_ids``, restringe a soma a esses boletos.
+    """
+    query = select(func.sum(Boleto.valor_centavos)).where(
+        particoes.da_operacao(Boleto, op),
+        Boleto.status.in_(("aprovado", "parcialmente_aprovado")),
+    )
+    if boleto_ids is not None:
+        query = query.where(Boleto.id.in_(boleto_ids))
+    total = (await db.execute(query)).scalar()
+    return int(total) if total else None
 
 
-def _parse_vencimento_date(vencimento_completo: str | None):
-    """Converte DD/MM/YYYY para date ou None."""
-    if not vencimento_completo:
-        return None
+async def _exclusivo(db: AsyncSession, op_id: str, acao: str, funcao, espera_max: float):
+    """Roda ``funcao`` com o lock da operacao; 409 se outra acao estiver em andamento."""
     try:
-        from datetime import datetime as dt
+        return await executar_exclusivo(db, op_id, acao, funcao, espera_max)
+    except OperacaoOcupada:
+        raise HTTPException(
+            status_code=409,
+            detail="Operacao ocupada: outro processamento ou envio esta em andamento. Tente novamente.",
+        )
 
-        return dt.strptime(vencimento_completo, "%d/%m/%Y").date()
-    except (ValueError, TypeError):
-        return None
 
+def _reais_para_centavos(valor: float) -> int:
+    """Converte reais (float da API) para centavos, arredondando pelo decimal exibido."""
+    return int((Decimal(str(valor)) * 100).to_integral_value(rounding=ROUND_HALF_UP))
 
-def _camada_to_dict(camada) -> dict | None:
-    """Converte ResultadoCamada para dict serializável."""
-    if camada is None:
-        return None
-    return {
-        "camada": camada.camada,
-        "nome": camada.nome,
-        "aprovado": camada.aprovado,
-        "mensagem": camada.mensagem,
-        "bloqueia": camada.bloqueia,
-        "detalhes": camada.detalhes,
-    }
+
+def _conciliar_parcelas(boletos, indice_xmls: IndiceXmls) -> list[dict]:
+    """Concilia boletos aprovados com as duplicatas dos XMLs vinculados.
+
+    Anota a parcela atribuida (ou o alerta) na Camada 4 (``validacao_extra``) e
+    retorna os alertas de parcelas faltantes, duplicadas e desiguais.
+    """
+    dados_por_xml_id = {xml_record.id: dados for xml_record, dados in indice_xmls.por_nf.values()}
+
+    por_xml: dict[uuid.UUID, list[Boleto]] = defaultdict(list)
+    for b in boletos:
+        if b.status in ("aprovado", "parcialmente_aprovado") and b.xml_nfe_id in dados_por_xml_id:
+            por_xml[b.xml_nfe_id].append(b)
+
+    alertas: list[dict] = []
+    for xml_id, grupo in por_xml.items():
+        dados_xml = dados_por_xml_id[xml_id]
+        if not dados_xml.duplicatas:
+            continue
+        conciliacao = conciliar_parcelas(
+            dados_xml.numero_nota,
+            dados_xml.duplicatas,
+            [
+                BoletoParcela(
+                    boleto_id=str(b.id),
+                    vencimento=vencimento_iso(b.vencimento_date),
+                    valor_centavos=b.valor_centavos,
+                )
+                for b in grupo
+            ],
+        )
+        alertas.extend(conciliacao.alertas())
+
+        tipos_alerta = {bid: "duplicada" for bid in conciliacao.duplicados}
+        tipos_alerta.update({bid: "sem_parcela" for bid in conciliacao.sem_parcela})
+        for b in grupo:
+            if not validacao_compacta.codigo(b.validacao_codigos, 4):
+                continue
+            tipo_alerta = tipos_alerta.get(str(b.id))
+            validacao_compacta.anotar_parcela(
+                b, parcela=conciliacao.atribuicoes.get(str(b.id)), alerta=tipo_alerta,
+            )
+
+    return alertas
 
 
 def _renomear_arquivo(original: Path, novo_nome: str) -> None:
@@ -2119,67 +2286,3 @@ def _renomear_arquivo(original: Path, novo_nome: str) -> None:
     novo_path = original.parent / novo_nome
     if novo_path != original:
         shutil.move(str(original), str(novo_path))
-
-
-async def _reconstruir_email_group(envio: Envio, op: Operacao, db: AsyncSession) -> EmailGroup:
-    """Reconstroi EmailGroup a partir de um registro Envio para reenvio via SMTP."""
-    storage_base = _storage_path() / "uploads" / str(op.id)
-
-    # Buscar boletos para paths dos anexos PDF
-    anexos_pdf: list[Path] = []
-    if envio.boletos_ids:
-        boletos_result = await db.execute(
-            select(Boleto).where(Boleto.id.in_(envio.boletos_ids))
-        )
-        for b in boletos_result.scalars().all():
-            if b.arquivo_path:
-                pdf_path = Path(b.arquivo_path)
-                if b.arquivo_renomeado:
-                    renamed = pdf_path.parent / b.arquivo_renomeado
-                    if renamed.exists():
-                        pdf_path = renamed
-                if pdf_path.exists():
-                    anexos_pdf.append(pdf_path)
-
-    # Buscar NF PDFs — encontrar PDF correspondente pelo numero_nota
-    anexos_xml: list[Path] = []
-    if envio.xmls_anexados:
-        xmls_result = await db.execute(
-            select(XmlNfe).where(
-                XmlNfe.operacao_id == op.id,
-                XmlNfe.nome_arquivo.in_(envio.xmls_anexados),
-            )
-        )
-        xml_records = xmls_result.scalars().all()
-
-        # Buscar todos os PDFs de NF da operacao
-        all_xmls_result = await db.execute(
-            select(XmlNfe).where(XmlNfe.operacao_id == op.id)
-        )
-        all_xmls = all_xmls_result.scalars().all()
-        nf_pdfs_by_nota: dict[str, XmlNfe] = {}
-        for x in all_xmls:
-            if x.nome_arquivo.lower().endswith(".pdf"):
-                nf_key = (x.numero_nota or "").lstrip("0") or "0"
-                nf_pdfs_by_nota[nf_key] = x
-
-        nf_dir = storage_base / "xmls"
-        for xml_rec in xml_records:
-            nf_key = (xml_rec.numero_nota or "").lstrip("0") or "0"
-            nf_pdf = nf_pdfs_by_nota.get(nf_key)
-            if nf_pdf:
-                nf_pdf_path = nf_dir / nf_pdf.nome_arquivo
-                if nf_pdf_path.exists():
-                    anexos_xml.append(nf_pdf_path)
-
-    return EmailGroup(
-        email_para=envio.email_para,
-        email_cc=envio.email_cc,
-        assunto=envio.assunto,
-        corpo_html=envio.corpo_html or "",
-        boletos_ids=[str(bid) for bid in envio.boletos_ids],
-        xmls_ids=[],
-        xmls_nomes=envio.xmls_anexados,
-        anexos_pdf=anexos_pdf,
-        anexos_xml=anexos_xml,
-    )
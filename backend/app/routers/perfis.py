@@ -0,0 +1,45 @@
+"""
+Router de Perfis — perfis de requisicoes gravados pelo middleware de profiling.
+
+Endpoints:
+  GET /perfis       — Lista os perfis mais recentes
+  GET /perfis/{id}  — Baixa o perfil no formato folded (flamegraph/speedscope)
+
+Exige usuario autenticado e o header X-Profile com PROFILING_TOKEN.
+"""
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import FileResponse
+
+from app.models.usuario import Usuario
+from app.schemas.perfil import PerfilResumo
+from app.security import get_current_user
+from app.services.profiler import diretorio_perfis, listar_perfis, token_valido
+
+router = APIRouter(prefix="/perfis", tags=["perfis"])
+
+
+def _exigir_token(x_profile: str | None = Header(None)) -> None:
+    if not token_valido(x_profile):
+        raise HTTPException(status_code=403, detail="Profiling desabilitado ou token invalido")
+
+
+@router.get("", response_model=list[PerfilResumo], dependencies=[Depends(_exigir_token)])
+async def listar(
+    limite: int = Query(50, ge=1, le=500),
+    _current_user: Usuario = Depends(get_current_user),
+):
+    """Lista os perfis mais recentes primeiro."""
+    return [PerfilResumo(**p) for p in listar_perfis(limite)]
+
+
+@router.get("/{perfil_id}", dependencies=[Depends(_exigir_token)])
+async def baixar(
+    perfil_id: str,
+    _current_user: Usuario = Depends(get_current_user),
+):
+    """Baixa as pilhas amostradas (uma linha ``pilha contagem`` por pilha)."""
+    arquivo = diretorio_perfis() / f"{perfil_id}.folded"
+    if "/" in perfil_id or "\\" in perfil_id or not arquivo.is_file():
+        raise HTTPException(status_code=404, detail="Perfil nao encontrado")
+    return FileResponse(arquivo, media_type="text/plain", filename=arquivo.name)
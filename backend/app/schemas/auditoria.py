@@ -37,3 +37,5 @@ class AuditoriaBuscarResponse(BaseModel):
     total: int
     page: int
     per_page: int
+    total_exato: bool = True  # False: estimativa do planner
+    proximo_cursor: str | None = None  # None: ultima pagina
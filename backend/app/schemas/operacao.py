@@ -127,6 +127,7 @@ class UploadXmlsResponse(BaseModel):
     validos: int
     invalidos: int
     xmls: list[XmlResumo]
+    boletos_revalidados: int = 0
 
 
 class ResultadoProcessamento(BaseModel):
@@ -137,6 +138,8 @@ class ResultadoProcessamento(BaseModel):
     taxa_sucesso: float
     valor_bruto: float | None = None
     boletos: list[BoletoCompleto]
+    alertas_parcelas: list[dict] = []
+    pulados: int = 0  # reprocessamento: boletos com entradas inalteradas
 
 
 class OperacoesPaginadas(BaseModel):
@@ -144,6 +147,8 @@ class OperacoesPaginadas(BaseModel):
     total: int
     page: int
     per_page: int
+    total_exato: bool = True  # False: estimativa do planner
+    proximo_cursor: str | None = None  # None: ultima pagina
 
 
 class DashboardStats(BaseModel):
@@ -0,0 +1,15 @@
+from pydantic import BaseModel
+
+
+class PerfilResumo(BaseModel):
+    """Metadados de um perfil de requisicao gravado em storage/profiles/."""
+
+    id: str
+    request_id: str
+    metodo: str
+    caminho: str
+    status_code: int | None
+    duracao_ms: float
+    amostras: int
+    intervalo_ms: float
+    criado_em: str
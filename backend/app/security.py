@@ -1,3 +1,4 @@
+import uuid
 from datetime import datetime, timedelta, timezone
 
 from fastapi import Depends, HTTPException, status
@@ -38,6 +39,7 @@ async def get_current_user(
     db: AsyncSession = Depends(get_db),
 ):
     from app.models.usuario import Usuario
+    from app.services.cache_usuarios import cache_usuarios
 
     token = credentials.credentials
     credentials_exception = HTTPException(
@@ -47,14 +49,19 @@ async def get_current_user(
     )
     try:
         payload = decode_token(token)
-        user_id: str = payload.get("sub")
-        if user_id is None:
-            raise credentials_exception
-    except JWTError:
+        user_id = uuid.UUID(payload.get("sub") or "")
+    except (JWTError, ValueError):
         raise credentials_exception
 
-    result = await db.execute(select(Usuario).where(Usuario.id == user_id))
-    user = result.scalar_one_or_none()
-    if user is None or not user.ativo:
+    # Cache quente: nenhuma consulta; miss: uma consulta e o usuario entra no cache
+    user = cache_usuarios.obter(user_id)
+    if user is None:
+        result = await db.execute(select(Usuario).where(Usuario.id == user_id))
+        user = result.scalar_one_or_none()
+        if user is None:
+            raise credentials_exception
+        cache_usuarios.guardar(user)
+
+    if not user.ativo:
         raise credentials_exception
     return user
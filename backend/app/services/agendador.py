@@ -0,0 +1,151 @@
+"""
+Agendador justo para o trabalho pesado (extracao de PDF e SMTP).
+
+Cada unidade de trabalho (uma pagina, um email) pede uma vaga antes de rodar
+em thread. As vagas sao limitadas (``AGENDADOR_VAGAS``) e concedidas:
+
+  1. por classe de prioridade — INTERATIVA antes de NORMAL antes de LOTE;
+     como a vaga e pedida por pagina, um reprocessamento pequeno passa na
+     frente de um lote grande ja na proxima pagina liberada
+  2. dentro da classe, em rodizio entre usuarios e, para cada usuario, em
+     rodizio entre suas operacoes — um lote de 2.000 paginas nao segura
+     a fila de uma operacao de 10
+
+``AGENDADOR_VAGAS_RESERVADAS`` vagas ficam so para a classe INTERATIVA, para
+que um lote nunca ocupe todas. O estado e por processo (cada worker e cada
+instancia da API tem o seu); entre workers, a justica vem da ordem em que
+``fila.reivindicar`` entrega os itens.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from enum import IntEnum
+from typing import Any, Callable
+
+from app.config import settings
+from app.services.metrics import AGENDADOR_EM_EXECUCAO, AGENDADOR_ESPERA, AGENDADOR_FILA
+
+
+class Prioridade(IntEnum):
+    INTERATIVA = 0  # operador esperando na tela (ex.: reprocessar poucos rejeitados)
+    NORMAL = 1
+    LOTE = 2  # upload/processamento de lotes grandes
+
+
+def prioridade_por_volume(quantidade: int, interativa: bool = False) -> Prioridade:
+    """Classe de prioridade de uma acao pelo numero de unidades que ela gera."""
+    if quantidade > settings.AGENDADOR_LIMITE_INTERATIVO:
+        return Prioridade.LOTE
+    return Prioridade.INTERATIVA if interativa else Prioridade.NORMAL
+
+
+@dataclass
+class _Pedido:
+    futuro: asyncio.Future
+    prioridade: Prioridade
+    etapa: str
+    enfileirado_em: float = field(default_factory=time.monotonic)
+
+
+class Agendador:
+    def __init__(self, vagas: int, reservadas: int) -> None:
+        self.vagas = max(vagas, 1)
+        self.reservadas = min(max(reservadas, 0), self.vagas - 1)
+        self.ocupadas = 0
+        # prioridade -> usuario -> operacao -> pedidos (OrderedDict = rodizio)
+        self._filas: dict[Prioridade, OrderedDict[Any, OrderedDict[Any, deque[_Pedido]]]] = {
+            p: OrderedDict() for p in Prioridade
+        }
+
+    def _pode_iniciar(self, prioridade: Prioridade) -> bool:
+        limite = self.vagas if prioridade == Prioridade.INTERATIVA else self.vagas - self.reservadas
+        return self.ocupadas < limite
+
+    def _proximo(self) -> _Pedido | None:
+        for prioridade in Prioridade:
+            usuarios = self._filas[prioridade]
+            if not usuarios or not self._pode_iniciar(prioridade):
+                continue
+            usuario, operacoes = next(iter(usuarios.items()))
+            operacao, pedidos = next(iter(operacoes.items()))
+            pedido = pedidos.popleft()
+
+            # Rodizio: a operacao e o usuario atendidos vao para o fim da fila
+            if pedidos:
+                operacoes.move_to_end(operacao)
+            else:
+                del operacoes[operacao]
+            if operacoes:
+                usuarios.move_to_end(usuario)
+            else:
+                del usuarios[usuario]
+
+            AGENDADOR_FILA.labels(prioridade.name.lower()).dec()
+            return pedido
+        return None
+
+    def _despachar(self) -> None:
+        while (pedido := self._proximo()) is not None:
+            if pedido.futuro.done():
+                continue  # cancelado enquanto esperava
+            self.ocupadas += 1
+            AGENDADOR_EM_EXECUCAO.inc()
+            AGENDADOR_ESPERA.labels(pedido.prioridade.name.lower(), pedido.etapa).observe(
+                time.monotonic() - pedido.enfileirado_em
+            )
+            pedido.futuro.set_result(None)
+
+    def _liberar(self) -> None:
+        self.ocupadas -= 1
+        AGENDADOR_EM_EXECUCAO.dec()
+        self._despachar()
+
+    async def executar(
+        self,
+        funcao: Callable[..., Any],
+        *args: Any,
+        prioridade: Prioridade,
+        usuario_id: Any,
+        operacao_id: Any,
+        etapa: str,
+    ) -> Any:
+        """Espera uma vaga e roda ``funcao(*args)`` em thread."""
+        pedido = _Pedido(asyncio.get_running_loop().create_future(), prioridade, etapa)
+        operacoes = self._filas[prioridade].setdefault(usuario_id, OrderedDict())
+        operacoes.setdefault(operacao_id, deque()).append(pedido)
+        AGENDADOR_FILA.labels(prioridade.name.lower()).inc()
+        self._despachar()
+
+        try:
+            await pedido.futuro
+        except asyncio.CancelledError:
+            if pedido.futuro.done() and not pedido.futuro.cancelled():
+                self._liberar()  # vaga concedida a quem nao vai mais usar
+            raise
+
+        try:
+            return await asyncio.to_thread(funcao, *args)
+        finally:
+            self._liberar()
+
+
+_agendador = Agendador(settings.AGENDADOR_VAGAS, settings.AGENDADOR_VAGAS_RESERVADAS)
+
+
+async def executar_agendado(
+    funcao: Callable[..., Any],
+    *args: Any,
+    prioridade: Prioridade,
+    usuario_id: Any,
+    operacao_id: Any,
+    etapa: str,
+) -> Any:
+    """Roda ``funcao(*args)`` em thread quando o agendador do processo liberar uma vaga."""
+    return await _agendador.executar(
+        funcao, *args,
+        prioridade=prioridade, usuario_id=usuario_id, operacao_id=operacao_id, etapa=etapa,
+    )
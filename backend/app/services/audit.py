@@ -1,12 +1,188 @@
 """
 Servico de Audit Logging — registra acoes no banco para rastreabilidade.
+
+Por padrao a entrada nao e gravada na transacao da requisicao: fica em
+``session.info`` ate o commit e so entao vai para o ``buffer_audit`` (um
+rollback a descarta, como antes). O buffer grava em lotes (INSERT com varias
+linhas) ao juntar ``AUDIT_LOTE`` entradas ou a cada ``AUDIT_INTERVALO_SEGUNDOS``;
+se o banco recusa o lote, grava uma a uma e descarta so as recusadas
+(IntegrityError/DataError). Com o banco indisponivel (conexao, timeout) o lote
+volta para o inicio da fila e a gravacao e retentada com backoff. Acima de
+``AUDIT_BUFFER_MAXIMO`` entradas pendentes as novas sao descartadas e vao so
+para o log (``boletos_audit_descartadas_total``).
+
+``sincrono=True`` grava na propria transacao, para acoes que precisam do
+registro duravel antes de responder. ``AUDIT_SINCRONO`` liga isso para tudo;
+sem o buffer iniciado (worker, seed, scripts) tambem e sincrono.
 """
 
+import asyncio
+import logging
 import uuid
+from collections import deque
+from datetime import datetime, timezone
 
+from sqlalchemy import event, insert
+from sqlalchemy.exc import DataError, IntegrityError, SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
 
+from app.config import settings
+from app.database import async_session
 from app.models.audit_log import AuditLog
+from app.services import metrics
+
+logger = logging.getLogger("app.audit")
+
+_PENDENTES = "audit_pendentes"
+
+# Erros em que o banco recusa a entrada em si: regravar nao adianta
+_RECUSADAS = (IntegrityError, DataError)
+
+# Teto do backoff entre tentativas com o banco indisponivel
+ESPERA_MAXIMA_SEGUNDOS = 60.0
+
+
+class BufferAudit:
+    """Fila em memoria de entradas ja commitadas, gravada em lotes por uma task."""
+
+    def __init__(self, maximo: int, lote: int, intervalo_segundos: float) -> None:
+        self.maximo = maximo
+        self.lote = lote
+        self.intervalo = intervalo_segundos
+        self._fila: deque[dict] = deque()
+        self._lote_cheio = asyncio.Event()
+        self._parada = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    @property
+    def ativo(self) -> bool:
+        return self._task is not None
+
+    def iniciar(self) -> None:
+        """Inicia a task de gravacao; deve ser chamado de dentro do loop da API."""
+        self._parada.clear()
+        self._task = asyncio.get_running_loop().create_task(self._gravador())
+
+    async def parar(self) -> None:
+        """Grava o que estiver pendente e encerra a task (shutdown)."""
+        if self._task is None:
+            return
+        task, self._task = self._task, None
+        # Sem cancel: um lote ja retirado da fila nao pode ficar pela metade
+        self._parada.set()
+        self._lote_cheio.set()
+        await task
+        if not await self.descarregar():
+            # Banco fora no shutdown: o que resta fica ao menos no log
+            while self._fila:
+                _descartar(self._fila.popleft(), "encerramento")
+            metrics.AUDIT_BUFFER.set(0)
+
+    def enfileirar(self, entradas: list[dict]) -> None:
+        for entrada in entradas:
+            if len(self._fila) >= self.maximo:
+                _descartar(entrada, "buffer_cheio")
+                continue
+            self._fila.append(entrada)
+        metrics.AUDIT_BUFFER.set(len(self._fila))
+        if len(self._fila) >= self.lote:
+            self._lote_cheio.set()
+
+    async def descarregar(self) -> bool:
+        """Grava toda a fila em lotes de ``lote`` entradas.
+
+        Com o banco indisponivel, o que nao foi gravado volta para o inicio da
+        fila (na ordem) e devolve False.
+        """
+        while self._fila:
+            lote = [self._fila.popleft() for _ in range(min(self.lote, len(self._fila)))]
+            pendentes = await _gravar_lote(lote)
+            if pendentes:
+                self._fila.extendleft(reversed(pendentes))
+                metrics.AUDIT_BUFFER.set(len(self._fila))
+                return False
+            metrics.AUDIT_BUFFER.set(len(self._fila))
+        return True
+
+    async def _gravador(self) -> None:
+        falhas = 0
+        while not self._parada.is_set():
+            if falhas:
+                # Backoff: nem lote cheio acorda antes (so o shutdown)
+                espera = min(self.intervalo * 2 ** falhas, ESPERA_MAXIMA_SEGUNDOS)
+                logger.warning(
+                    "Banco indisponivel para o audit log; %d entrada(s) no buffer, nova tentativa em %.1fs",
+                    len(self._fila), espera,
+                )
+                evento = self._parada
+            else:
+                espera, evento = self.intervalo, self._lote_cheio
+            try:
+                await asyncio.wait_for(evento.wait(), timeout=espera)
+            except asyncio.TimeoutError:
+                pass
+            self._lote_cheio.clear()
+            falhas = 0 if await self.descarregar() else falhas + 1
+
+
+buffer_audit = BufferAudit(settings.AUDIT_BUFFER_MAXIMO, settings.AUDIT_LOTE, settings.AUDIT_INTERVALO_SEGUNDOS)
+
+
+def _descartar(entrada: dict, motivo: str) -> None:
+    metrics.AUDIT_DESCARTADAS.labels(motivo).inc()
+    logger.error(
+        "audit_descartado motivo=%s acao=%s operacao_id=%s usuario_id=%s entidade=%s entidade_id=%s detalhes=%s",
+        motivo, entrada["acao"], entrada["operacao_id"], entrada["usuario_id"],
+        entrada["entidade"], entrada["entidade_id"], entrada["detalhes"],
+    )
+
+
+async def _inserir(entradas: list[dict]) -> None:
+    async with async_session() as db:
+        await db.execute(insert(AuditLog).values(entradas))
+        await db.commit()
+
+
+async def _gravar_lote(lote: list[dict]) -> list[dict]:
+    """Grava o lote; devolve as entradas que ficaram para depois (banco indisponivel).
+
+    So entradas que o banco recusa (IntegrityError/DataError) sao descartadas;
+    qualquer outra falha (conexao, timeout) e tratada como transitoria.
+    """
+    try:
+        await _inserir(lote)
+        metrics.AUDIT_LOTE.observe(len(lote))
+        return []
+    except _RECUSADAS as e:
+        logger.warning("Lote de %d entrada(s) de audit recusado, gravando uma a uma: %s", len(lote), e)
+    except (OSError, SQLAlchemyError) as e:
+        logger.warning("Lote de %d entrada(s) de audit nao gravado: %s", len(lote), e)
+        return lote
+
+    # Uma entrada ruim (ex.: FK de operacao ja removida) nao derruba as outras
+    for k, entrada in enumerate(lote):
+        try:
+            await _inserir([entrada])
+        except _RECUSADAS as e:
+            logger.warning("Entrada de audit recusada: %s", e)
+            _descartar(entrada, "erro")
+        except (OSError, SQLAlchemyError) as e:
+            logger.warning("Entrada de audit nao gravada: %s", e)
+            return lote[k:]
+    return []
+
+
+@event.listens_for(Session, "after_commit")
+def _apos_commit(session: Session) -> None:
+    entradas = session.info.pop(_PENDENTES, None)
+    if entradas:
+        buffer_audit.enfileirar(entradas)
+
+
+@event.listens_for(Session, "after_rollback")
+def _apos_rollback(session: Session) -> None:
+    session.info.pop(_PENDENTES, None)
 
 
 async def registrar_audit(
@@ -17,14 +193,20 @@ async def registrar_audit(
     entidade: str | None = None,
     entidade_id: str | None = None,
     detalhes: dict | None = None,
+    sincrono: bool = False,
 ) -> None:
-    """Registra uma entrada no audit_log."""
-    log = AuditLog(
-        operacao_id=operacao_id,
-        usuario_id=usuario_id,
-        acao=acao,
-        entidade=entidade,
-        entidade_id=entidade_id,
-        detalhes=detalhes,
-    )
-    db.add(log)
+    """Registra uma entrada no audit_log (no commit de ``db``; ``sincrono`` = na mesma transacao)."""
+    entrada = {
+        "operacao_id": operacao_id,
+        "usuario_id": usuario_id,
+        "acao": acao,
+        "entidade": entidade,
+        "entidade_id": entidade_id,
+        "detalhes": detalhes,
+        # Hora da acao, nao da gravacao do lote
+        "created_at": datetime.now(timezone.utc),
+    }
+    if sincrono or settings.AUDIT_SINCRONO or not buffer_audit.ativo:
+        db.add(AuditLog(**entrada))
+        return
+    db.info.setdefault(_PENDENTES, []).append(entrada)
@@ -0,0 +1,67 @@
+"""
+Cache em processo dos usuarios autenticados, usado por ``get_current_user``.
+
+Cada requisicao autenticada buscava o usuario no banco. Agora o usuario fica
+em cache por ``AUTH_CACHE_TTL_SEGUNDOS`` (LRU limitado a ``AUTH_CACHE_TAMANHO``
+entradas): dentro do TTL, autenticar nao faz nenhuma consulta.
+
+Invalidacao: qualquer UPDATE/DELETE de ``Usuario`` pelo ORM remove a entrada
+neste processo (eventos ``after_update``/``after_delete``). Em outros
+processos, a mudanca (ex.: desativacao) vale no maximo apos o TTL.
+
+As entradas sao copias destacadas da sessao (sem ``senha_hash``), somente
+leitura — os handlers so usam ``current_user.id``.
+"""
+
+from __future__ import annotations
+
+import time
+import uuid
+from collections import OrderedDict
+
+from sqlalchemy import event
+
+from app.config import settings
+from app.models.usuario import Usuario
+from app.services.metrics import AUTH_CACHE
+
+_COLUNAS = [c.key for c in Usuario.__table__.columns if c.key != "senha_hash"]
+
+
+class CacheUsuarios:
+    def __init__(self, ttl_segundos: float, tamanho: int) -> None:
+        self.ttl = ttl_segundos
+        self.tamanho = tamanho
+        self._itens: OrderedDict[uuid.UUID, tuple[float, Usuario]] = OrderedDict()
+
+    def obter(self, usuario_id: uuid.UUID) -> Usuario | None:
+        item = self._itens.get(usuario_id)
+        if item is None or time.monotonic() >= item[0]:
+            self._itens.pop(usuario_id, None)
+            AUTH_CACHE.labels("miss").inc()
+            return None
+        self._itens.move_to_end(usuario_id)
+        AUTH_CACHE.labels("hit").inc()
+        return item[1]
+
+    def guardar(self, usuario: Usuario) -> None:
+        copia = Usuario(**{col: getattr(usuario, col) for col in _COLUNAS})
+        self._itens[usuario.id] = (time.monotonic() + self.ttl, copia)
+        self._itens.move_to_end(usuario.id)
+        while len(self._itens) > self.tamanho:
+            self._itens.popitem(last=False)
+
+    def invalidar(self, usuario_id: uuid.UUID) -> None:
+        self._itens.pop(usuario_id, None)
+
+    def limpar(self) -> None:
+        self._itens.clear()
+
+
+cache_usuarios = CacheUsuarios(settings.AUTH_CACHE_TTL_SEGUNDOS, settings.AUTH_CACHE_TAMANHO)
+
+
+@event.listens_for(Usuario, "after_update")
+@event.listens_for(Usuario, "after_delete")
+def _invalidar_usuario(_mapper, _connection, target: Usuario) -> None:
+    cache_usuarios.invalidar(target.id)
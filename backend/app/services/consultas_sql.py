@@ -0,0 +1,151 @@
+"""
+Instrumentacao de SQL por requisicao e detector de N+1.
+
+Hooks ``before/after_cursor_execute`` no engine contam cada consulta no
+``ContadorConsultas`` do contexto atual (ContextVar), aberto pelo middleware
+do ``main.py`` para cada requisicao:
+
+  - total de consultas e tempo total no banco por requisicao (metricas por rota)
+  - formas repetidas: o SQL com parametros normalizados (``IN ($1, $2, ...)``
+    vira ``IN (?...)``); a mesma forma executada ``SQL_N_MAIS_1_LIMIAR`` vezes
+    numa requisicao gera um aviso de N+1 (``SQL_DETECTAR_N_MAIS_1``, dev)
+  - consultas acima de ``SQL_LENTA_MS`` sao logadas sempre
+
+Para testes, ``orcamento_consultas(n)`` falha se o bloco passar de n consultas.
+Contadores aninhados (o do teste em volta do da requisicao) tambem somam no
+de fora.
+"""
+
+from __future__ import annotations
+
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.config import settings
+
+logger = logging.getLogger("app.sql")
+
+# Casts do asyncpg: "$1::UUID", "$2::VARCHAR[]", "$3::NUMERIC(12, 2)",
+# "$4::TIMESTAMP WITH TIME ZONE" (so os tipos com espaco; nada do SQL seguinte)
+_PARAMETRO = re.compile(
+    r"\$\d+(?:::\w+(?: WITH(?:OUT)? TIME ZONE| PRECISION| VARYING)?(?:\(\d+(?:,\s*\d+)?\))?(?:\[\])?)?"
+    r"|%\(\w+\)s|\?"
+)
+_LISTA_PARAMETROS = re.compile(r"\?(?:\s*,\s*\?)+")
+
+
+def forma_consulta(statement: str) -> str:
+    """SQL com parametros trocados por ``?`` e listas colapsadas (mesma forma, mesma chave)."""
+    forma = _PARAMETRO.sub("?", statement)
+    forma = _LISTA_PARAMETROS.sub("?...", forma)
+    return " ".join(forma.split())
+
+
+@dataclass
+class ContadorConsultas:
+    consultas: int = 0
+    tempo_total: float = 0.0
+    formas: Counter[str] = field(default_factory=Counter)
+    pai: ContadorConsultas | None = None
+
+    def registrar(self, statement: str, duracao: float) -> None:
+        contador = self
+        forma = forma_consulta(statement)
+        while contador is not None:
+            contador.consultas += 1
+            contador.tempo_total += duracao
+            contador.formas[forma] += 1
+            contador = contador.pai
+
+    def repetidas(self, limiar: int) -> list[tuple[str, int]]:
+        """Formas executadas ``limiar`` vezes ou mais (candidatas a N+1)."""
+        return [(f, n) for f, n in self.formas.most_common() if n >= limiar]
+
+
+_contador: ContextVar[ContadorConsultas | None] = ContextVar("contador_consultas", default=None)
+
+
+@contextmanager
+def contar_consultas():
+    """Abre um contador para o contexto atual (uma requisicao, um teste)."""
+    contador = ContadorConsultas(pai=_contador.get())
+    token = _contador.set(contador)
+    try:
+        yield contador
+    finally:
+        _contador.reset(token)
+
+
+class OrcamentoConsultasExcedido(AssertionError):
+    pass
+
+
+@contextmanager
+def orcamento_consultas(maximo: int):
+    """Helper de teste: falha se o bloco executar mais de ``maximo`` consultas.
+
+    Exemplo::
+
+        with orcamento_consultas(6):
+            await client.post(f"/api/v1/operacoes/{op_id}/envios/confirmar-todos")
+    """
+    with contar_consultas() as contador:
+        yield contador
+    if contador.consultas > maximo:
+        formas = "\n".join(f"  {n}x {f}" for f, n in contador.formas.most_common(5))
+        raise OrcamentoConsultasExcedido(
+            f"{contador.consultas} consultas (orcamento: {maximo}). Mais frequentes:\n{formas}"
+        )
+
+
+def _antes(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("inicio_consulta", []).append(time.perf_counter())
+
+
+def _depois(conn, cursor, statement, parameters, context, executemany):
+    inicio = conn.info["inicio_consulta"].pop()
+    duracao = time.perf_counter() - inicio
+
+    contador = _contador.get()
+    if contador is not None:
+        contador.registrar(statement, duracao)
+
+    if duracao * 1000 >= settings.SQL_LENTA_MS:
+        logger.warning(
+            "sql_lenta duracao_ms=%.0f sql=%s",
+            duracao * 1000, " ".join(statement.split())[:1000],
+            extra={"sql": {"duracao_ms": round(duracao * 1000), "forma": forma_consulta(statement)}},
+        )
+
+
+def _erro(contexto) -> None:
+    # Consulta que falhou nao passa por after_cursor_execute: descartar o inicio
+    if contexto.connection is not None:
+        pilha = contexto.connection.info.get("inicio_consulta")
+        if pilha:
+            pilha.pop()
+
+
+def instrumentar(engine: Engine) -> None:
+    """Registra os hooks no engine (sync; para AsyncEngine use ``engine.sync_engine``)."""
+    event.listen(engine, "before_cursor_execute", _antes)
+    event.listen(engine, "after_cursor_execute", _depois)
+    event.listen(engine, "handle_error", _erro)
+
+
+def avisar_n_mais_1(rota: str, contador: ContadorConsultas) -> None:
+    """Loga as formas repetidas de uma requisicao (so com SQL_DETECTAR_N_MAIS_1)."""
+    for forma, vezes in contador.repetidas(settings.SQL_N_MAIS_1_LIMIAR):
+        logger.warning(
+            "sql_n_mais_1 rota=%s vezes=%d sql=%s",
+            rota, vezes, forma[:500],
+            extra={"sql": {"rota": rota, "vezes": vezes, "forma": forma}},
+        )
@@ -0,0 +1,121 @@
+"""
+Envios — helpers compartilhados entre as rotas de envio e o worker da fila:
+mailer SMTP configurado, reconstrucao do EmailGroup de um Envio gravado e
+deteccao de operacao totalmente enviada.
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.models.boleto import Boleto
+from app.models.envio import Envio
+from app.models.xml_nfe import XmlNfe
+from app.services.email_grouper import EmailGroup
+from app.services.particoes import da_operacao
+from app.services.projecoes import arquivos_boletos
+from app.services.smtp_mailer import SMTPMailer
+
+
+def criar_mailer() -> SMTPMailer:
+    """SMTPMailer com a configuracao do .env."""
+    return SMTPMailer(
+        host=settings.SMTP_HOST,
+        port=settings.SMTP_PORT,
+        user=settings.SMTP_USER,
+        password=settings.SMTP_PASSWORD,
+        use_tls=settings.SMTP_USE_TLS,
+        from_email=settings.SMTP_FROM_EMAIL,
+        from_name=settings.SMTP_FROM_NAME,
+    )
+
+
+async def todos_enviados(op, db: AsyncSession) -> bool:
+    """Retorna True se existe >=1 envio com status 'enviado'
+    e nenhum envio com status 'pendente' ou 'rascunho'."""
+    result = await db.execute(
+        select(
+            func.count().filter(Envio.status == "enviado"),
+            func.count().filter(Envio.status.in_(("pendente", "rascunho"))),
+        ).where(da_operacao(Envio, op))
+    )
+    enviados, pendentes = result.one()
+    return enviados > 0 and pendentes == 0
+
+
+async def reconstruir_email_groups(envios: list[Envio], op, db: AsyncSession) -> list[EmailGroup]:
+    """Reconstroi o EmailGroup de cada Envio (mesma ordem) para reenvio via SMTP.
+
+    Duas consultas no total, qualquer que seja o numero de envios: os boletos
+    de todos os envios e os XMLs/PDFs de NF da operacao.
+    """
+    storage_base = Path(settings.STORAGE_DIR) / "uploads" / str(op.id)
+    nf_dir = storage_base / "xmls"
+
+    # Boletos de todos os envios, para os paths dos anexos PDF
+    ids_boletos = {bid for envio in envios for bid in envio.boletos_ids or ()}
+    boletos = {}
+    if ids_boletos:
+        boletos = {b.id: b for b in await arquivos_boletos(db, Boleto.id.in_(ids_boletos))}
+
+    # XMLs da operacao: numero da nota de cada anexo e o PDF de NF correspondente
+    nota_por_arquivo: dict[str, str | None] = {}
+    nf_pdfs_by_nota: dict[str, str] = {}
+    if any(envio.xmls_anexados for envio in envios):
+        xmls_result = await db.execute(
+            select(XmlNfe.numero_nota, XmlNfe.nome_arquivo).where(XmlNfe.operacao_id == op.id)
+        )
+        for x in xmls_result.all():
+            nota_por_arquivo[x.nome_arquivo] = x.numero_nota
+            if x.nome_arquivo.lower().endswith(".pdf"):
+                nf_key = (x.numero_nota or "").lstrip("0") or "0"
+                nf_pdfs_by_nota[nf_key] = x.nome_arquivo
+
+    groups = []
+    for envio in envios:
+        anexos_pdf: list[Path] = []
+        for bid in envio.boletos_ids or ():
+            b = boletos.get(bid)
+            if b is None or not b.arquivo_path:
+                continue
+            pdf_path = Path(b.arquivo_path)
+            if b.arquivo_renomeado:
+                renamed = pdf_path.parent / b.arquivo_renomeado
+                if renamed.exists():
+                    pdf_path = renamed
+            if pdf_path.exists():
+                anexos_pdf.append(pdf_path)
+
+        # NF PDFs — encontrar PDF correspondente pelo numero_nota
+        anexos_xml: list[Path] = []
+        for nome_arquivo in envio.xmls_anexados or ():
+            if nome_arquivo not in nota_por_arquivo:
+                continue
+            nf_key = (nota_por_arquivo[nome_arquivo] or "").lstrip("0") or "0"
+            nf_pdf = nf_pdfs_by_nota.get(nf_key)
+            if nf_pdf:
+                nf_pdf_path = nf_dir / nf_pdf
+                if nf_pdf_path.exists():
+                    anexos_xml.append(nf_pdf_path)
+
+        groups.append(EmailGroup(
+            email_para=envio.email_para,
+            email_cc=envio.email_cc,
+            assunto=envio.assunto,
+            corpo_html=envio.corpo_html or "",
+            boletos_ids=[str(bid) for bid in envio.boletos_ids],
+            xmls_ids=[],
+            xmls_nomes=envio.xmls_anexados,
+            anexos_pdf=anexos_pdf,
+            anexos_xml=anexos_xml,
+        ))
+    return groups
+
+
+async def reconstruir_email_group(envio: Envio, op, db: AsyncSession) -> EmailGroup:
+    """Reconstroi EmailGroup a partir de um registro Envio para reenvio via SMTP."""
+    return (await reconstruir_email_groups([envio], op, db))[0]
@@ -0,0 +1,63 @@
+"""
+Extracao de boletos — texto do PDF e mapeamento para as colunas de Boleto.
+
+Compartilhado entre as rotas de operacoes e o worker da fila de trabalho.
+"""
+
+from __future__ import annotations
+
+from datetime import date, datetime
+
+import pdfplumber
+
+from app.extractors.base import DadosBoleto
+from app.extractors.similaridade import cnpj_busca, nome_busca
+
+
+def extrair_texto_pdf(file_path: str | None) -> str:
+    """Extrai texto completo de um PDF via pdfplumber."""
+    if not file_path:
+        return ""
+    try:
+        with pdfplumber.open(file_path) as pdf:
+            texts = []
+            for page in pdf.pages:
+                text = page.extract_text()
+                if text:
+                    texts.append(text)
+            return "\n".join(texts)
+    except Exception:
+        return ""
+
+
+def parse_vencimento_date(vencimento_completo: str | None) -> date | None:
+    """Converte DD/MM/YYYY para date ou None."""
+    if not vencimento_completo:
+        return None
+    try:
+        return datetime.strptime(vencimento_completo, "%d/%m/%Y").date()
+    except (ValueError, TypeError):
+        return None
+
+
+def campos_extraidos(dados_boleto: DadosBoleto | None, nome_renomeado: str | None) -> dict:
+    """Colunas do boleto preenchidas pela extracao (todas None sem dados)."""
+    if dados_boleto is None:
+        return dict.fromkeys((
+            "pagador", "cnpj", "numero_nota", "vencimento", "vencimento_date",
+            "valor_centavos", "valor_formatado", "fidc_detectada", "arquivo_renomeado",
+            "busca_nome", "busca_cnpj",
+        ))
+    return {
+        "pagador": dados_boleto.pagador,
+        "cnpj": dados_boleto.cnpj,
+        "numero_nota": dados_boleto.numero_nota,
+        "vencimento": dados_boleto.vencimento,
+        "vencimento_date": parse_vencimento_date(dados_boleto.vencimento_completo),
+        "valor_centavos": dados_boleto.valor_centavos,
+        "valor_formatado": dados_boleto.valor_formatado,
+        "fidc_detectada": dados_boleto.fidc_detectada,
+        "arquivo_renomeado": nome_renomeado,
+        "busca_nome": nome_busca(dados_boleto.pagador),
+        "busca_cnpj": cnpj_busca(dados_boleto.cnpj),
+    }
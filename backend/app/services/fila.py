@@ -0,0 +1,161 @@
+"""
+Fila de trabalho em Postgres (tabela work_items).
+
+Um item por pagina (``extrair_pagina``) ou por email (``enviar_email``).
+Qualquer numero de workers (``python -m app.worker``), na mesma maquina ou
+em varias, drena a fila em paralelo:
+
+  - reivindicar: UPDATE ... WHERE id IN (SELECT ... FOR UPDATE SKIP LOCKED)
+    — cada item vai para um unico worker, sem bloquear os demais; a ordem
+    e por prioridade e, dentro dela, em rodizio entre usuarios e operacoes
+    (mesma politica do agendador em processo)
+  - heartbeat: o worker renova ``heartbeat_at`` dos itens em execucao
+  - recuperar_travados: itens com heartbeat vencido (worker morto) voltam
+    para a fila, ou vao para ``erro`` ao esgotar as tentativas
+"""
+
+from __future__ import annotations
+
+import uuid
+from datetime import timedelta
+
+from sqlalchemy import case, func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.work_item import WorkItem
+from app.services.agendador import Prioridade
+
+TIPO_EXTRAIR_PAGINA = "extrair_pagina"
+TIPO_ENVIAR_EMAIL = "enviar_email"
+
+_tabela = WorkItem.__table__
+
+
+async def enfileirar(
+    db: AsyncSession,
+    tipo: str,
+    operacao_id: uuid.UUID,
+    payloads: list[dict],
+    usuario_id: uuid.UUID | None = None,
+    prioridade: int = Prioridade.NORMAL,
+) -> int:
+    """Enfileira um item por payload (um unico INSERT multi-row)."""
+    if not payloads:
+        return 0
+    await db.execute(
+        insert(_tabela),
+        [
+            {
+                "tipo": tipo, "operacao_id": operacao_id, "usuario_id": usuario_id,
+                "prioridade": int(prioridade), "payload": p,
+            }
+            for p in payloads
+        ],
+    )
+    return len(payloads)
+
+
+async def reivindicar(db: AsyncSession, worker_id: str, limite: int) -> list:
+    """Marca ate ``limite`` itens pendentes como em execucao por ``worker_id``.
+
+    Itens travados por outra transacao sao pulados (SKIP LOCKED). O chamador
+    deve fazer commit logo em seguida para liberar os row locks.
+
+    Ordem justa: ``rodada_op`` numera os itens de cada operacao e ``rodada``
+    intercala as operacoes de cada usuario; ordenar por (prioridade, rodada)
+    entrega um item de cada usuario por vez. As janelas percorrem os itens
+    pendentes a cada chamada — barato para filas de alguns milhares de itens.
+    """
+    pendentes = _tabela.c.status == "pendente"
+    por_operacao = (
+        select(
+            _tabela.c.id, _tabela.c.prioridade, _tabela.c.usuario_id, _tabela.c.created_at,
+            func.row_number().over(
+                partition_by=(_tabela.c.prioridade, _tabela.c.operacao_id),
+                order_by=_tabela.c.created_at,
+            ).label("rodada_op"),
+        )
+        .where(pendentes)
+        .subquery()
+    )
+    por_usuario = select(
+        por_operacao.c.id,
+        func.row_number().over(
+            partition_by=(por_operacao.c.prioridade, por_operacao.c.usuario_id),
+            order_by=(por_operacao.c.rodada_op, por_operacao.c.created_at),
+        ).label("rodada"),
+    ).subquery()
+
+    # FOR UPDATE nao pode conviver com janelas no mesmo nivel: trava so work_items
+    livres = (
+        select(_tabela.c.id)
+        .join(por_usuario, por_usuario.c.id == _tabela.c.id)
+        .where(pendentes)
+        .order_by(_tabela.c.prioridade, por_usuario.c.rodada, _tabela.c.created_at)
+        .limit(limite)
+        .with_for_update(of=_tabela, skip_locked=True)
+    )
+    result = await db.execute(
+        update(_tabela)
+        .where(_tabela.c.id.in_(livres.scalar_subquery()))
+        .values(
+            status="em_execucao",
+            worker_id=worker_id,
+            heartbeat_at=func.now(),
+            tentativas=_tabela.c.tentativas + 1,
+        )
+        .returning(
+            _tabela.c.id, _tabela.c.tipo, _tabela.c.operacao_id, _tabela.c.usuario_id,
+            _tabela.c.prioridade, _tabela.c.payload, _tabela.c.tentativas,
+        )
+    )
+    return result.all()
+
+
+async def heartbeat(db: AsyncSession, worker_id: str, ids: list[uuid.UUID]) -> None:
+    """Renova o heartbeat dos itens ainda em execucao por este worker."""
+    if not ids:
+        return
+    await db.execute(
+        update(_tabela)
+        .where(_tabela.c.id.in_(ids))
+        .where(_tabela.c.worker_id == worker_id)
+        .where(_tabela.c.status == "em_execucao")
+        .values(heartbeat_at=func.now())
+    )
+
+
+async def concluir(db: AsyncSession, item_id: uuid.UUID) -> None:
+    await db.execute(
+        update(_tabela)
+        .where(_tabela.c.id == item_id)
+        .values(status="concluido", concluido_at=func.now(), erro=None)
+    )
+
+
+async def falhar(db: AsyncSession, item_id: uuid.UUID, erro: str, max_tentativas: int) -> None:
+    """Devolve o item para a fila ou marca erro definitivo ao esgotar as tentativas."""
+    await db.execute(
+        update(_tabela)
+        .where(_tabela.c.id == item_id)
+        .values(
+            status=case((_tabela.c.tentativas >= max_tentativas, "erro"), else_="pendente"),
+            worker_id=None,
+            erro=erro[:2000],
+        )
+    )
+
+
+async def recuperar_travados(db: AsyncSession, timeout_segundos: float, max_tentativas: int) -> int:
+    """Devolve para a fila os itens cujo worker parou de mandar heartbeat."""
+    result = await db.execute(
+        update(_tabela)
+        .where(_tabela.c.status == "em_execucao")
+        .where(_tabela.c.heartbeat_at < func.now() - timedelta(seconds=timeout_segundos))
+        .values(
+            status=case((_tabela.c.tentativas >= max_tentativas, "erro"), else_="pendente"),
+            worker_id=None,
+            erro="Heartbeat expirado (worker interrompido)",
+        )
+    )
+    return result.rowcount
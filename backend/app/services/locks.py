@@ -0,0 +1,112 @@
+"""
+Lock exclusivo por operacao (processar, reprocessar, enviar).
+
+Duas camadas:
+  1. Dentro do processo: pedidos repetidos da mesma acao na mesma operacao
+     (duplo clique, dois operadores) aguardam a execucao em andamento e
+     recebem o mesmo resultado, em vez de repetir o trabalho.
+  2. Entre processos/workers: ``pg_try_advisory_xact_lock`` na propria sessao
+     da requisicao (sem conexao extra do pool), valido ate o commit que grava
+     o resultado da acao. A chave e (namespace, hashtext(operacao_id)), entao
+     acoes diferentes na mesma operacao tambem se excluem.
+
+Se a requisicao que esta executando e cancelada (cliente desconectou), as
+que aguardavam nao falham junto: a primeira delas assume a execucao.
+
+Quem nao obtem o lock dentro do prazo recebe OperacaoOcupada (HTTP 409).
+O tempo de espera vai para o histograma LOCK_OPERACAO_ESPERA.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from collections.abc import Awaitable, Callable
+from typing import TypeVar
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.services.metrics import LOCK_OPERACAO_ESPERA
+
+T = TypeVar("T")
+
+# Espaco de chaves dos advisory locks de operacao (primeiro int4 da chave)
+NAMESPACE_LOCK_OPERACAO = 7301
+
+# Intervalo entre tentativas enquanto outro processo segura o lock
+INTERVALO_TENTATIVA_SEGUNDOS = 0.25
+
+# Execucoes em andamento neste processo: (operacao_id, acao) -> resultado futuro
+_em_execucao: dict[tuple[str, str], asyncio.Future] = {}
+
+
+class OperacaoOcupada(Exception):
+    """Outra acao exclusiva esta em andamento na operacao."""
+
+
+async def _advisory_lock(db: AsyncSession, operacao_id: str, acao: str, espera_max: float, inicio: float) -> None:
+    """Obtem o lock na transacao corrente de ``db``; liberado no commit/rollback dela."""
+    while True:
+        adquirido = (await db.execute(
+            text("SELECT pg_try_advisory_xact_lock(:ns, hashtext(:op))"),
+            {"ns": NAMESPACE_LOCK_OPERACAO, "op": operacao_id},
+        )).scalar()
+        if adquirido:
+            break
+        if time.monotonic() - inicio >= espera_max:
+            LOCK_OPERACAO_ESPERA.labels(acao, "ocupado").observe(time.monotonic() - inicio)
+            raise OperacaoOcupada(operacao_id)
+        await asyncio.sleep(INTERVALO_TENTATIVA_SEGUNDOS)
+
+    LOCK_OPERACAO_ESPERA.labels(acao, "adquirido").observe(time.monotonic() - inicio)
+
+
+async def executar_exclusivo(
+    db: AsyncSession,
+    operacao_id,
+    acao: str,
+    funcao: Callable[[], Awaitable[T]],
+    espera_max: float,
+) -> T:
+    """Executa ``funcao`` com o lock da operacao, coalescendo pedidos repetidos.
+
+    Args:
+        db: sessao da requisicao, a mesma usada por ``funcao`` (o lock vale
+            ate o commit dela).
+        acao: identifica pedidos equivalentes (ex.: "processar", "enviar:preview").
+        espera_max: segundos aguardando o lock de outro processo/acao; 0 = nao espera.
+    """
+    operacao_id = str(operacao_id)
+    chave = (operacao_id, acao)
+    inicio = time.monotonic()
+
+    while (existente := _em_execucao.get(chave)) is not None:
+        # Mesma acao ja rodando neste processo: aguardar e reaproveitar o resultado
+        try:
+            resultado = await asyncio.shield(existente)
+        except asyncio.CancelledError:
+            # Quem executava foi cancelado (e nao esta requisicao): tentar de novo
+            if existente.cancelled() and not asyncio.current_task().cancelling():
+                continue
+            raise
+        LOCK_OPERACAO_ESPERA.labels(acao, "coalescido").observe(time.monotonic() - inicio)
+        return resultado
+
+    futuro: asyncio.Future = asyncio.get_running_loop().create_future()
+    _em_execucao[chave] = futuro
+    try:
+        await _advisory_lock(db, operacao_id, acao, espera_max, inicio)
+        resultado = await funcao()
+    except asyncio.CancelledError:
+        futuro.cancel()
+        raise
+    except BaseException as exc:
+        futuro.set_exception(exc)
+        futuro.exception()  # marca como consumida mesmo sem ninguem aguardando
+        raise
+    else:
+        futuro.set_result(resultado)
+        return resultado
+    finally:
+        _em_execucao.pop(chave, None)
@@ -0,0 +1,100 @@
+"""
+Memoizacao da validacao — fingerprint das entradas de cada boleto.
+
+O resultado das 5 camadas e deterministico dado:
+  - os campos extraidos do PDF (e o extrator usado, que depende do FIDC,
+    com a versao do seu codigo-fonte: ``versao_extrator``)
+  - o XML resolvido para o boleto (linha + versao) e o vinculo/sugestao
+  - a versao das regras do validador (VERSAO_REGRAS)
+
+O fingerprint desses tres componentes e gravado em
+``Boleto.validacao_fingerprint``. No reprocessamento, o fingerprint e
+recalculado a partir dos campos ja gravados no boleto (sem reler o PDF);
+se bater, extracao e validacao sao puladas.
+
+Boleto cuja extracao nao deu NF, valor ou vencimento nao recebe fingerprint:
+a falha pode ser do PDF ou do extrator, e os campos gravados (vazios) nao
+mudariam com a correcao; ele e sempre extraido de novo.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+
+from app.extractors.base import DadosBoleto
+from app.extractors.factory import versao_extrator
+from app.extractors.validator import VERSAO_REGRAS
+
+
+def _campos_extraidos(dados: DadosBoleto) -> list:
+    """Campos que alimentam o matcher, as 5 camadas e a renomeacao."""
+    return [
+        dados.pagador,
+        dados.cnpj,
+        dados.numero_nota,
+        dados.vencimento,
+        dados.vencimento_completo,
+        dados.valor_centavos,
+        dados.valor_formatado,
+        dados.fidc_detectada,
+    ]
+
+
+def _chave_xml(xml_record, vinculo: dict | None) -> list:
+    """Identidade do XML resolvido: linha + versao, mais o vinculo/sugestao."""
+    if xml_record is None:
+        chave = None
+    else:
+        chave = f"{xml_record.id}:{xml_record.versao}"
+    return [chave, vinculo]
+
+
+def extracao_utilizavel(dados: DadosBoleto) -> bool:
+    """NF, valor e vencimento extraidos (sem eles o boleto nunca e pulado)."""
+    return bool(dados.numero_nota) and dados.valor_centavos is not None and bool(dados.vencimento)
+
+
+def fingerprint_validacao(
+    dados: DadosBoleto,
+    extrator: str,
+    xml_record,
+    vinculo: dict | None,
+) -> str | None:
+    """SHA-256 (hex) das entradas da validacao de um boleto; None se a extracao falhou."""
+    if not extracao_utilizavel(dados):
+        return None
+    payload = json.dumps(
+        [
+            _campos_extraidos(dados),
+            [extrator, versao_extrator(extrator)],
+            _chave_xml(xml_record, vinculo),
+            VERSAO_REGRAS,
+        ],
+        sort_keys=True,
+        default=str,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def dados_boleto_do_registro(boleto) -> DadosBoleto:
+    """Reconstroi DadosBoleto a partir dos campos gravados em um Boleto.
+
+    ``vencimento_completo`` volta de ``vencimento_date``; quando a data nao
+    foi parseada, fica None e o fingerprint simplesmente nao bate (o boleto
+    e reprocessado).
+    """
+    vencimento_completo = (
+        boleto.vencimento_date.strftime("%d/%m/%Y") if boleto.vencimento_date else None
+    )
+    return DadosBoleto(
+        pagador=boleto.pagador,
+        cnpj=boleto.cnpj,
+        numero_nota=boleto.numero_nota,
+        vencimento=boleto.vencimento,
+        vencimento_completo=vencimento_completo,
+        valor_centavos=boleto.valor_centavos,
+        valor_formatado=boleto.valor_formatado,
+        fidc_detectada=boleto.fidc_detectada,
+    )
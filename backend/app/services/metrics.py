@@ -0,0 +1,236 @@
+"""
+Metricas Prometheus do backend, expostas em GET /api/metrics.
+
+O endpoint expoe nomes de FIDC, rotas e filas: so responde com
+``Authorization: Bearer <METRICS_TOKEN>`` (``bearer_token`` no scrape do
+Prometheus); sem token configurado fica desligado.
+
+Todas as metricas ficam no registry padrao do prometheus_client e sao
+declaradas aqui, para que os nomes e labels fiquem num lugar so.
+"""
+
+import hmac
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    start_http_server,
+)
+
+from app.config import settings
+
+# ── Locks por operacao ────────────────────────────────────────
+
+LOCK_OPERACAO_ESPERA = Histogram(
+    "boletos_lock_operacao_espera_segundos",
+    "Tempo de espera pelo lock exclusivo de uma operacao",
+    ["acao", "resultado"],  # resultado: adquirido | coalescido | ocupado
+    buckets=(0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120),
+)
+
+# ── Agendador de trabalho pesado ──────────────────────────────
+
+AGENDADOR_FILA = Gauge(
+    "boletos_agendador_fila",
+    "Unidades de trabalho esperando vaga no agendador",
+    ["prioridade"],  # interativa | normal | lote
+)
+
+AGENDADOR_ESPERA = Histogram(
+    "boletos_agendador_espera_segundos",
+    "Tempo de espera por uma vaga no agendador",
+    ["prioridade", "etapa"],  # etapa: extracao | smtp
+    buckets=(0.005, 0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 300),
+)
+
+AGENDADOR_EM_EXECUCAO = Gauge(
+    "boletos_agendador_em_execucao",
+    "Vagas do agendador ocupadas",
+)
+
+# ── Pipeline (por etapa e FIDC) ───────────────────────────────
+
+ETAPA_DURACAO = Histogram(
+    "boletos_etapa_duracao_segundos",
+    "Duracao de cada etapa do pipeline de boletos",
+    # etapa: split_pdf | extrair_texto_pdf | extrator_extrair | validar_5_camadas |
+    #        renomear_arquivo | db_inserir_boletos | db_atualizar_boletos | smtp_envio
+    ["etapa", "fidc"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+
+PAGINAS = Counter(
+    "boletos_paginas_total",
+    "Paginas de boleto recebidas no upload (apos o split)",
+    ["fidc"],
+)
+
+BOLETOS_VALIDADOS = Counter(
+    "boletos_validados_total",
+    "Boletos validados em processar/reprocessar, por status resultante",
+    ["fidc", "status"],  # aprovado | parcialmente_aprovado | rejeitado
+)
+
+EMAILS = Counter(
+    "boletos_emails_total",
+    "Emails de cobranca por status resultante",
+    ["fidc", "status"],  # rascunho | enviado | erro
+)
+
+BYTES_GRAVADOS = Counter(
+    "boletos_bytes_gravados_total",
+    "Bytes de upload gravados em disco",
+    ["fidc", "tipo"],  # tipo: boleto | xml
+)
+
+# ── Event loop ────────────────────────────────────────────────
+
+LOOP_ATRASO = Histogram(
+    "boletos_event_loop_atraso_segundos",
+    "Atraso do event loop em relacao ao batimento esperado",
+    ["processo"],  # api | worker
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+
+LOOP_TRAVAMENTOS = Counter(
+    "boletos_event_loop_travamentos_total",
+    "Travamentos do event loop acima do limiar (codigo bloqueante no loop)",
+    ["processo"],
+)
+
+# ── SQL por requisicao ────────────────────────────────────────
+
+SQL_CONSULTAS_REQUISICAO = Histogram(
+    "boletos_sql_consultas_por_requisicao",
+    "Consultas SQL executadas por requisicao",
+    ["rota"],
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100, 250, 500, 1000),
+)
+
+SQL_TEMPO_REQUISICAO = Histogram(
+    "boletos_sql_tempo_por_requisicao_segundos",
+    "Tempo total no banco por requisicao",
+    ["rota"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+
+# ── Pool de conexoes ──────────────────────────────────────────
+
+DB_POOL_EM_USO = Gauge(
+    "boletos_db_pool_em_uso",
+    "Conexoes do pool emprestadas (checked out)",
+    ["engine"],  # primario | replica
+)
+
+DB_POOL_OCIOSAS = Gauge(
+    "boletos_db_pool_ociosas",
+    "Conexoes abertas paradas no pool",
+    ["engine"],
+)
+
+DB_POOL_ESPERA = Histogram(
+    "boletos_db_pool_espera_segundos",
+    "Tempo ate o pool entregar uma conexao",
+    ["engine"],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+
+DB_POOL_TIMEOUTS = Counter(
+    "boletos_db_pool_timeouts_total",
+    "Esperas por conexao que estouraram DB_POOL_TIMEOUT_SEGUNDOS",
+    ["engine"],
+)
+
+# ── Replica de leitura ────────────────────────────────────────
+
+REPLICA_LEITURAS = Counter(
+    "boletos_replica_leituras_total",
+    "Sessoes de rotas so de leitura por destino",
+    ["destino"],  # replica | primario
+)
+
+REPLICA_ATRASO = Gauge(
+    "boletos_replica_atraso_segundos",
+    "Atraso de replicacao medido na ultima verificacao da replica",
+)
+
+REPLICA_DISPONIVEL = Gauge(
+    "boletos_replica_disponivel",
+    "1 se a ultima verificacao considerou a replica utilizavel",
+)
+
+# ── Autenticacao ──────────────────────────────────────────────
+
+AUTH_CACHE = Counter(
+    "boletos_auth_cache_total",
+    "Consultas ao cache de usuarios autenticados",
+    ["resultado"],  # hit | miss
+)
+
+# ── Audit log ─────────────────────────────────────────────────
+
+AUDIT_BUFFER = Gauge(
+    "boletos_audit_buffer",
+    "Entradas de audit commitadas esperando gravacao em lote",
+)
+
+AUDIT_LOTE = Histogram(
+    "boletos_audit_lote",
+    "Entradas de audit por INSERT em lote",
+    buckets=(1, 2, 5, 10, 25, 50, 100, 200, 500, 1000),
+)
+
+AUDIT_DESCARTADAS = Counter(
+    "boletos_audit_descartadas_total",
+    "Entradas de audit nao gravadas (ficam so no log)",
+    ["motivo"],  # buffer_cheio | erro (recusada pelo banco) | encerramento (banco fora no shutdown)
+)
+
+
+@lru_cache(maxsize=1024)
+def _duracao(etapa: str, fidc: str):
+    # labels() faz lookup com lock a cada chamada; o filho e estavel, entao cacheia
+    return ETAPA_DURACAO.labels(etapa, fidc)
+
+
+@contextmanager
+def medir(etapa: str, fidc: str):
+    """Mede a duracao do bloco em ETAPA_DURACAO (inclusive quando levanta)."""
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        _duracao(etapa, fidc).observe(time.perf_counter() - inicio)
+
+
+def cronometrado(funcao, etapa: str, fidc: str):
+    """Envolve ``funcao`` para medir a duracao onde ela roda (ex.: thread do agendador)."""
+    def executar(*args, **kwargs):
+        with medir(etapa, fidc):
+            return funcao(*args, **kwargs)
+    return executar
+
+
+def exportar() -> tuple[bytes, str]:
+    """Serializa o registry no formato texto do Prometheus."""
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+def token_valido(authorization: str | None) -> bool:
+    """Header ``Authorization`` confere com METRICS_TOKEN (comparacao em tempo constante)."""
+    token = settings.METRICS_TOKEN
+    esquema, _, valor = (authorization or "").partition(" ")
+    if not token or esquema.lower() != "bearer":
+        return False
+    return hmac.compare_digest(valor.strip().encode(), token.encode())
+
+
+def servir(porta: int) -> None:
+    """Expoe o registry em HTTP proprio (processos sem a API, como o worker)."""
+    start_http_server(porta)
@@ -0,0 +1,103 @@
+"""
+Detector de bloqueio do event loop.
+
+Duas pecas:
+
+  - batimento (task no loop): acorda a cada ``LOOP_MONITOR_INTERVALO_MS`` e
+    mede o atraso em relacao ao esperado (histograma ``boletos_event_loop_atraso_segundos``)
+  - vigia (thread): se o ultimo batimento ficou mais velho que
+    ``LOOP_MONITOR_LIMIAR_MS``, o loop esta parado em codigo sincrono —
+    captura a pilha da thread do loop naquele instante e registra um log
+    ``event_loop_travado`` com a pilha, uma vez por travamento
+
+Quando o loop volta, o batimento registra a duracao total do travamento
+(``event_loop_liberado``) e incrementa ``boletos_event_loop_travamentos_total``.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+
+from app.services.metrics import LOOP_ATRASO, LOOP_TRAVAMENTOS
+
+logger = logging.getLogger("app.monitor_loop")
+
+
+class MonitorLoop:
+    def __init__(self, intervalo_segundos: float, limiar_segundos: float, nome: str = "api") -> None:
+        self.intervalo = intervalo_segundos
+        self.limiar = limiar_segundos
+        self.nome = nome
+        self._ultimo_batimento = time.monotonic()
+        self._pilha_travada: str | None = None
+        self._loop_thread_id: int | None = None
+        self._parar = threading.Event()
+        self._task: asyncio.Task | None = None
+        self._vigia: threading.Thread | None = None
+
+    def iniciar(self) -> None:
+        """Inicia batimento e vigia; deve ser chamado de dentro do loop monitorado."""
+        self._loop_thread_id = threading.get_ident()
+        self._ultimo_batimento = time.monotonic()
+        self._task = asyncio.get_running_loop().create_task(self._batimento())
+        self._vigia = threading.Thread(target=self._vigiar, name="monitor-loop", daemon=True)
+        self._vigia.start()
+
+    async def parar(self) -> None:
+        self._parar.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self._vigia is not None:
+            self._vigia.join(timeout=self.intervalo * 2)
+
+    async def _batimento(self) -> None:
+        while True:
+            antes = time.monotonic()
+            await asyncio.sleep(self.intervalo)
+            agora = time.monotonic()
+            atraso = max(agora - antes - self.intervalo, 0.0)
+            LOOP_ATRASO.labels(self.nome).observe(atraso)
+
+            if atraso >= self.limiar:
+                LOOP_TRAVAMENTOS.labels(self.nome).inc()
+                logger.warning(
+                    "event_loop_liberado processo=%s duracao_ms=%.0f",
+                    self.nome, atraso * 1000,
+                    extra={"event_loop": {
+                        "processo": self.nome,
+                        "duracao_ms": round(atraso * 1000),
+                        "pilha": self._pilha_travada,
+                    }},
+                )
+            # Nessa ordem: o vigia nunca ve batimento antigo com a pilha ja limpa
+            self._ultimo_batimento = agora
+            self._pilha_travada = None
+
+    def _vigiar(self) -> None:
+        while not self._parar.wait(self.intervalo / 2):
+            parado = time.monotonic() - self._ultimo_batimento - self.intervalo
+            if parado < self.limiar or self._pilha_travada is not None:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            pilha = "".join(traceback.format_stack(frame))
+            self._pilha_travada = pilha
+            logger.warning(
+                "event_loop_travado processo=%s parado_ms=%.0f\n%s",
+                self.nome, parado * 1000, pilha,
+                extra={"event_loop": {
+                    "processo": self.nome,
+                    "parado_ms": round(parado * 1000),
+                    "pilha": pilha,
+                }},
+            )
@@ -0,0 +1,96 @@
+"""
+Paginacao por cursor (keyset) e totais estimados para listagens grandes.
+
+Listagens ordenadas por ``(created_at, id)`` decrescente avancam com
+``WHERE (created_at, id) < (:c, :i)`` em vez de ``OFFSET``: cada pagina
+custa o mesmo, com o indice composto, nao importa a profundidade.
+
+O cursor e opaco para o cliente (base64 de um JSON com os valores da ultima
+linha da pagina). Buscas ordenadas por relevancia levam o rank no cursor.
+
+Total: ``count(*)`` exato ate ``PAGINACAO_CONTAGEM_EXATA_ATE`` linhas (a
+contagem para no limite); acima disso, estimativa do planner via
+``EXPLAIN`` (``total_exato=False`` na resposta).
+"""
+
+from __future__ import annotations
+
+import base64
+import binascii
+import json
+import uuid
+from datetime import datetime
+from typing import NamedTuple
+
+from sqlalchemy import Select, func, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+
+
+class CursorInvalido(ValueError):
+    pass
+
+
+class Cursor(NamedTuple):
+    created_at: datetime
+    id: uuid.UUID
+    rank: float | None = None
+
+
+def codificar_cursor(created_at: datetime, id_: uuid.UUID, rank: float | None = None) -> str:
+    dados = {"c": created_at.isoformat(), "i": str(id_)}
+    if rank is not None:
+        dados["r"] = rank
+    bruto = json.dumps(dados, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(bruto).decode().rstrip("=")
+
+
+def decodificar_cursor(token: str) -> Cursor:
+    """Decodifica o cursor; ``CursorInvalido`` se adulterado ou malformado."""
+    try:
+        bruto = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        dados = json.loads(bruto)
+        rank = dados.get("r")
+        return Cursor(
+            created_at=datetime.fromisoformat(dados["c"]),
+            id=uuid.UUID(dados["i"]),
+            rank=float(rank) if rank is not None else None,
+        )
+    except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError, KeyError, TypeError, ValueError, AttributeError):
+        raise CursorInvalido(token) from None
+
+
+def apos_cursor(cursor: Cursor, coluna_data, coluna_id, rank=None):
+    """Condicao das linhas depois do cursor na ordem decrescente."""
+    if rank is not None:
+        if cursor.rank is None:
+            raise CursorInvalido("cursor sem rank para busca ordenada por relevancia")
+        return tuple_(rank, coluna_data, coluna_id) < tuple_(cursor.rank, cursor.created_at, cursor.id)
+    return tuple_(coluna_data, coluna_id) < tuple_(cursor.created_at, cursor.id)
+
+
+async def contar_total(db: AsyncSession, consulta: Select) -> tuple[int, bool]:
+    """(total, exato) das linhas de ``consulta`` (sem ordem/paginacao).
+
+    Conta no maximo ``PAGINACAO_CONTAGEM_EXATA_ATE + 1`` linhas; se passar
+    disso, devolve a estimativa do planner para a consulta inteira.
+    """
+    limite = settings.PAGINACAO_CONTAGEM_EXATA_ATE
+    limitada = consulta.order_by(None).limit(limite + 1).subquery()
+    contados = (await db.execute(select(func.count()).select_from(limitada))).scalar() or 0
+    if contados <= limite:
+        return contados, True
+    estimado = await estimar_linhas(db, consulta.order_by(None))
+    return max(estimado, contados), False
+
+
+async def estimar_linhas(db: AsyncSession, consulta: Select) -> int:
+    """Numero de linhas estimado pelo planner (``EXPLAIN``, sem executar)."""
+    conexao = await db.connection()
+    sql = consulta.compile(dialect=conexao.dialect, compile_kwargs={"literal_binds": True})
+    # SQL ja com literais: direto ao driver, sem reinterpretar ":nome" como parametro
+    plano = (await conexao.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {sql}")).scalar()
+    if isinstance(plano, str):
+        plano = json.loads(plano)
+    return int(plano[0]["Plan"]["Plan Rows"])
@@ -0,0 +1,148 @@
+"""
+Conciliacao de parcelas — atribui cada boleto a uma duplicata (<cobr>/<dup>)
+especifica do XML NFe, um-para-um.
+
+Criterios, em ordem (cada passo so usa duplicatas ainda livres):
+  1. vencimento + valor em centavos (exato)
+  2. valor em centavos (vencimento divergente no boleto)
+  3. vencimento (valor divergente — juros/multa ou erro de extracao)
+
+Todos os passos sao lookups em dicionarios indexados pela chave do criterio,
+entao o custo e linear no numero de boletos + duplicatas, mesmo em operacoes
+com milhares de parcelas.
+
+Alertas:
+  - faltante:     duplicata sem boleto correspondente
+  - duplicada:    boleto para uma duplicata que ja foi atribuida a outro boleto
+  - sem_parcela:  boleto que nao corresponde a nenhuma duplicata
+  - desigual:     XML com parcelas de valores diferentes (informativo)
+"""
+
+from __future__ import annotations
+
+from collections import defaultdict, deque
+from dataclasses import dataclass, field
+from datetime import date
+
+from app.extractors.xml_parser import valor_centavos_duplicata
+
+
+@dataclass
+class BoletoParcela:
+    """Dados minimos de um boleto para conciliacao."""
+
+    boleto_id: str
+    vencimento: str | None  # YYYY-MM-DD
+    valor_centavos: int | None
+
+
+@dataclass
+class ConciliacaoXml:
+    """Resultado da conciliacao das duplicatas de um XML."""
+
+    numero_nota: str
+    atribuicoes: dict[str, dict] = field(default_factory=dict)  # boleto_id -> parcela
+    faltantes: list[dict] = field(default_factory=list)
+    duplicados: list[str] = field(default_factory=list)
+    sem_parcela: list[str] = field(default_factory=list)
+    parcelas_desiguais: bool = False
+
+    def alertas(self) -> list[dict]:
+        alertas: list[dict] = []
+        for dup in self.faltantes:
+            alertas.append({"numero_nota": self.numero_nota, "tipo": "faltante", "parcela": dup})
+        for boleto_id in self.duplicados:
+            alertas.append({"numero_nota": self.numero_nota, "tipo": "duplicada", "boleto_id": boleto_id})
+        for boleto_id in self.sem_parcela:
+            alertas.append({"numero_nota": self.numero_nota, "tipo": "sem_parcela", "boleto_id": boleto_id})
+        if self.parcelas_desiguais:
+            alertas.append({"numero_nota": self.numero_nota, "tipo": "desigual"})
+        return alertas
+
+
+def vencimento_iso(vencimento: date | str | None) -> str | None:
+    """Normaliza vencimento para YYYY-MM-DD."""
+    if vencimento is None:
+        return None
+    if isinstance(vencimento, date):
+        return vencimento.isoformat()
+    return vencimento or None
+
+
+def _parcela_dict(dup: dict, criterio: str | None = None) -> dict:
+    parcela = {
+        "numero": dup.get("numero") or "",
+        "vencimento": dup.get("vencimento") or "",
+        "valor": valor_centavos_duplicata(dup) / 100,
+    }
+    if criterio:
+        parcela["criterio"] = criterio
+    return parcela
+
+
+def conciliar_parcelas(
+    numero_nota: str,
+    duplicatas: list[dict],
+    boletos: list[BoletoParcela],
+) -> ConciliacaoXml:
+    """Concilia os boletos de um XML com as duplicatas dele (um-para-um)."""
+    resultado = ConciliacaoXml(numero_nota=numero_nota)
+    if not duplicatas:
+        return resultado
+
+    resultado.parcelas_desiguais = len({valor_centavos_duplicata(d) for d in duplicatas}) > 1
+
+    livres: set[int] = set(range(len(duplicatas)))
+    por_chave: dict[tuple[str, int], deque[int]] = defaultdict(deque)
+    por_valor: dict[int, deque[int]] = defaultdict(deque)
+    por_vencimento: dict[str, deque[int]] = defaultdict(deque)
+    for i, dup in enumerate(duplicatas):
+        centavos = valor_centavos_duplicata(dup)
+        venc = dup.get("vencimento") or ""
+        por_chave[(venc, centavos)].append(i)
+        por_valor[centavos].append(i)
+        por_vencimento[venc].append(i)
+
+    def _tomar(indices: deque[int] | None) -> int | None:
+        # Filas sao consumidas da esquerda; entradas ja tomadas sao descartadas
+        while indices:
+            i = indices.popleft()
+            if i in livres:
+                livres.discard(i)
+                return i
+        return None
+
+    chaves_existentes = set(por_chave)
+
+    # Ordem estavel por vencimento para que parcelas repetidas sejam atribuidas na sequencia
+    ordenados = sorted(boletos, key=lambda b: (b.vencimento or "9999-99-99", b.boleto_id))
+    pendentes: list[BoletoParcela] = []
+    for b in ordenados:
+        chave = (b.vencimento, b.valor_centavos)
+        i = _tomar(por_chave.get(chave)) if b.vencimento and b.valor_centavos is not None else None
+        if i is not None:
+            resultado.atribuicoes[b.boleto_id] = _parcela_dict(duplicatas[i], "vencimento_valor")
+        elif chave in chaves_existentes:
+            # Mesma parcela (vencimento + valor) ja paga por outro boleto
+            resultado.duplicados.append(b.boleto_id)
+        else:
+            pendentes.append(b)
+
+    for criterio, indice, chave in (
+        ("valor", por_valor, lambda b: b.valor_centavos),
+        ("vencimento", por_vencimento, lambda b: b.vencimento),
+    ):
+        restantes: list[BoletoParcela] = []
+        for b in pendentes:
+            k = chave(b)
+            i = _tomar(indice.get(k)) if k is not None else None
+            if i is None:
+                restantes.append(b)
+            else:
+                resultado.atribuicoes[b.boleto_id] = _parcela_dict(duplicatas[i], criterio)
+        pendentes = restantes
+
+    resultado.sem_parcela = [b.boleto_id for b in pendentes]
+
+    resultado.faltantes = [_parcela_dict(duplicatas[i]) for i in sorted(livres)]
+    return resultado
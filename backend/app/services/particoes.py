@@ -0,0 +1,140 @@
+"""
+Particionamento mensal (RANGE em created_at) de boletos, envios e audit_log.
+
+Cada tabela tem uma particao por mes (``boletos_2026_10``, ...) e uma
+``<tabela>_default`` que so recebe linhas fora das particoes existentes
+(manutencao atrasada). ``python -m app.manutencao_particoes`` cria as
+particoes dos proximos meses e arquiva as que passaram da retencao.
+
+Consultas por operacao usam ``da_operacao``, que filtra so por
+``operacao_id`` (indice em cada particao). Nada garante que o ``created_at``
+dos filhos seja >= o da operacao (relogio de cada no da API/worker, linhas
+preenchidas pela migration), entao um limite inferior em ``created_at``
+poderia esconder linhas; a consulta varre o indice de todas as particoes.
+"""
+
+from __future__ import annotations
+
+import re
+from datetime import date, datetime, timezone
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+TABELAS = ("boletos", "envios", "audit_log")
+
+# audit_log fica pelo menos 2 anos nas tabelas quentes (requisito de auditoria)
+RETENCAO_MINIMA_MESES = {"audit_log": 24}
+
+_SUFIXO_MES = re.compile(r"_(\d{4})_(\d{2})$")
+
+
+def da_operacao(modelo, op):
+    """Filtro das linhas de ``modelo`` (boletos, envios, audit_log) da operacao."""
+    return modelo.operacao_id == op.id
+
+
+def inicio_mes(dia: date) -> date:
+    return dia.replace(day=1)
+
+
+def somar_meses(mes: date, n: int) -> date:
+    total = mes.year * 12 + mes.month - 1 + n
+    return date(total // 12, total % 12 + 1, 1)
+
+
+def nome_particao(tabela: str, mes: date) -> str:
+    return f"{tabela}_{mes:%Y_%m}"
+
+
+def _limite(mes: date) -> str:
+    # Limites sempre em UTC, independente do TimeZone da sessao
+    return f"'{mes.isoformat()} 00:00:00+00'"
+
+
+async def particoes_mensais(conn: AsyncConnection, tabela: str, esquema: str = "public") -> dict[date, str]:
+    """``{mes: nome}`` das particoes mensais anexadas a ``tabela``."""
+    result = await conn.execute(
+        text("""
+            SELECT c.relname
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            JOIN pg_class p ON p.oid = i.inhparent
+            JOIN pg_namespace n ON n.oid = p.relnamespace
+            WHERE p.relname = :tabela AND n.nspname = :esquema
+        """),
+        {"tabela": tabela, "esquema": esquema},
+    )
+    meses = {}
+    for (nome,) in result:
+        m = _SUFIXO_MES.search(nome)
+        if m and nome == f"{tabela}{m.group(0)}":
+            meses[date(int(m.group(1)), int(m.group(2)), 1)] = nome
+    return meses
+
+
+async def criar_particao(conn: AsyncConnection, tabela: str, mes: date) -> int:
+    """Cria e anexa a particao de ``mes``; devolve quantas linhas vieram da default.
+
+    O ATTACH trava a particao default em ACCESS EXCLUSIVE ate o commit (leituras
+    e escritas que passam por ela esperam) e a varre para validar o limite novo.
+    Para encurtar essa janela, a default e travada antes de mover as linhas do
+    mes, e CHECKs com o limite (na tabela nova e, negado, na default) deixam o
+    ATTACH pular a validacao; os CHECKs sao removidos em seguida. A trava dura o
+    tempo de varrer a default, que fica vazia enquanto a manutencao cria as
+    particoes com antecedencia (PARTICOES_MESES_FUTUROS).
+    """
+    q = conn.dialect.identifier_preparer.quote
+    nome, pai, default = q(nome_particao(tabela, mes)), q(tabela), q(f"{tabela}_default")
+    limite_nova = q(f"{nome_particao(tabela, mes)}_limite")
+    limite_default = q(f"{tabela}_default_fora_{mes:%Y_%m}")
+    de, ate = _limite(mes), _limite(somar_meses(mes, 1))
+
+    await conn.execute(text(f"CREATE TABLE {nome} (LIKE {pai} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+    # A mesma trava que o ATTACH pegaria: nenhuma linha do mes entra na default
+    # entre a copia e o ATTACH
+    await conn.execute(text(f"LOCK TABLE {default} IN ACCESS EXCLUSIVE MODE"))
+    movidas = await conn.execute(text(f"""
+        WITH movidas AS (
+            DELETE FROM {default} WHERE created_at >= {de} AND created_at < {ate} RETURNING *
+        )
+        INSERT INTO {nome} SELECT * FROM movidas
+    """))
+    await conn.execute(text(
+        f"ALTER TABLE {nome} ADD CONSTRAINT {limite_nova} "
+        f"CHECK (created_at IS NOT NULL AND created_at >= {de} AND created_at < {ate})"
+    ))
+    await conn.execute(text(
+        f"ALTER TABLE {default} ADD CONSTRAINT {limite_default} "
+        f"CHECK (created_at < {de} OR created_at >= {ate})"
+    ))
+    await conn.execute(text(f"ALTER TABLE {pai} ATTACH PARTITION {nome} FOR VALUES FROM ({de}) TO ({ate})"))
+    # Redundantes depois do ATTACH (o limite da particao ja garante o mesmo)
+    await conn.execute(text(f"ALTER TABLE {default} DROP CONSTRAINT {limite_default}"))
+    await conn.execute(text(f"ALTER TABLE {nome} DROP CONSTRAINT {limite_nova}"))
+    return movidas.rowcount
+
+
+async def arquivar_particao(conn: AsyncConnection, tabela: str, nome: str, esquema_arquivo: str) -> None:
+    """Desanexa a particao e move para o esquema de arquivo (dados preservados)."""
+    q = conn.dialect.identifier_preparer.quote
+    await conn.execute(text(f"CREATE SCHEMA IF NOT EXISTS {q(esquema_arquivo)}"))
+    await conn.execute(text(f"ALTER TABLE {q(tabela)} DETACH PARTITION {q(nome)}"))
+    await conn.execute(text(f"ALTER TABLE {q(nome)} SET SCHEMA {q(esquema_arquivo)}"))
+
+
+def meses_a_criar(existentes, hoje: date, meses_futuros: int) -> list[date]:
+    """Mes corrente e os ``meses_futuros`` seguintes que ainda nao tem particao."""
+    atual = inicio_mes(hoje)
+    return [m for m in (somar_meses(atual, i) for i in range(meses_futuros + 1)) if m not in existentes]
+
+
+def meses_a_arquivar(existentes, hoje: date, tabela: str, retencao_meses: int) -> list[date]:
+    """Meses inteiros mais antigos que a janela de retencao da tabela."""
+    retencao = max(retencao_meses, RETENCAO_MINIMA_MESES.get(tabela, 0))
+    corte = somar_meses(inicio_mes(hoje), -retencao)
+    return sorted(m for m in existentes if m < corte)
+
+
+def hoje_utc() -> date:
+    return datetime.now(timezone.utc).date()
@@ -0,0 +1,69 @@
+"""
+Persistencia em lote de boletos via SQLAlchemy Core (sem unit of work).
+
+- inserir_boletos: INSERT ... VALUES (...), (...) ... RETURNING, em lotes
+- atualizar_boletos: UPDATE ... WHERE id = :b_id AND created_at = :b_created_at
+  via executemany (created_at leva direto a particao do mes), um statement
+  por conjunto de colunas alteradas
+
+Um upload de 1.000 paginas vira poucas idas ao banco em vez de um flush por
+pagina; o processamento grava os ~15 campos (5 JSONB) de todos os boletos
+de uma vez.
+"""
+
+from __future__ import annotations
+
+from collections import defaultdict
+
+from sqlalchemy import bindparam, insert, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.attributes import set_committed_value
+
+from app.models.boleto import Boleto
+
+# Linhas por INSERT multi-row (asyncpg limita a 32767 parametros por statement)
+TAMANHO_LOTE_INSERT = 500
+
+_tabela = Boleto.__table__
+
+
+async def inserir_boletos(db: AsyncSession, linhas: list[dict]) -> list[Boleto]:
+    """Insere boletos em lote e devolve os registros gravados.
+
+    Os objetos retornados sao transientes (fora da sessao): servem para
+    montar respostas, nao para alteracoes posteriores.
+    """
+    criados: list[Boleto] = []
+    for inicio in range(0, len(linhas), TAMANHO_LOTE_INSERT):
+        lote = linhas[inicio:inicio + TAMANHO_LOTE_INSERT]
+        result = await db.execute(
+            insert(_tabela).values(lote).returning(*_tabela.c)
+        )
+        criados.extend(Boleto(**row._mapping) for row in result)
+    return criados
+
+
+async def atualizar_boletos(db: AsyncSession, atualizacoes: list[tuple[Boleto, dict]]) -> None:
+    """Grava ``{coluna: valor}`` em cada boleto com UPDATEs em lote.
+
+    Os objetos ORM ja carregados recebem os mesmos valores como estado
+    persistido (``set_committed_value``), sem ficarem sujos na sessao.
+    """
+    por_colunas: dict[tuple[str, ...], list[dict]] = defaultdict(list)
+    for boleto, valores in atualizacoes:
+        if not valores:
+            continue
+        colunas = tuple(sorted(valores))
+        por_colunas[colunas].append({"b_id": boleto.id, "b_created_at": boleto.created_at, **valores})
+
+    for colunas, params in por_colunas.items():
+        stmt = (
+            update(_tabela)
+            .where(_tabela.c.id == bindparam("b_id"), _tabela.c.created_at == bindparam("b_created_at"))
+            .values({c: bindparam(c) for c in colunas})
+        )
+        await db.execute(stmt, params)
+
+    for boleto, valores in atualizacoes:
+        for coluna, valor in valores.items():
+            set_committed_value(boleto, coluna, valor)
@@ -0,0 +1,69 @@
+"""
+Pool de conexoes dos engines (primario e replica) com metricas.
+
+``criar_engine`` monta o engine com o pool configurado em Settings
+(``DB_POOL_*``) e o cache de prepared statements do asyncpg
+(``DB_CACHE_STATEMENTS``; 0 desliga, necessario atras de pgbouncer em modo
+transaction). O pool e um ``AsyncAdaptedQueuePool`` que mede:
+
+  - espera por conexao (``boletos_db_pool_espera_segundos``): quanto a
+    requisicao ficou parada ate o pool entregar uma conexao
+  - timeouts (``boletos_db_pool_timeouts_total``): esperas que passaram de
+    ``DB_POOL_TIMEOUT_SEGUNDOS``; a requisicao falha com TimeoutError
+  - conexoes em uso e ociosas (gauges lidos na coleta)
+
+O nome do engine (``primario``/``replica``) vai como ``pool_logging_name``,
+que o SQLAlchemy preserva quando o pool e recriado (``dispose``).
+"""
+
+from __future__ import annotations
+
+import time
+
+from sqlalchemy import exc
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from app.config import settings
+from app.services import metrics
+
+
+class PoolMedido(AsyncAdaptedQueuePool):
+    """AsyncAdaptedQueuePool que mede a espera por conexao e conta timeouts."""
+
+    def _do_get(self):
+        nome = self._orig_logging_name or "primario"
+        inicio = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            metrics.DB_POOL_TIMEOUTS.labels(nome).inc()
+            raise
+        finally:
+            metrics.DB_POOL_ESPERA.labels(nome).observe(time.perf_counter() - inicio)
+
+
+def criar_engine(url: str, nome: str, **ajustes) -> AsyncEngine:
+    """Engine com o pool de Settings; ``ajustes`` sobrescreve (ex.: teste de carga)."""
+    opcoes = {
+        "pool_size": settings.DB_POOL_TAMANHO,
+        "max_overflow": settings.DB_POOL_EXTRA,
+        "pool_timeout": settings.DB_POOL_TIMEOUT_SEGUNDOS,
+        "pool_recycle": settings.DB_POOL_RECICLAR_SEGUNDOS,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        **ajustes,
+    }
+    cache = opcoes.pop("prepared_statement_cache_size", settings.DB_CACHE_STATEMENTS)
+    engine = create_async_engine(
+        url,
+        echo=False,
+        poolclass=PoolMedido,
+        pool_logging_name=nome,
+        # Lido pelo adaptador asyncpg do SQLAlchemy (cache por conexao)
+        connect_args={"prepared_statement_cache_size": cache},
+        **opcoes,
+    )
+    # Lidos na coleta; engine.pool (e nao o pool atual) porque dispose() troca o objeto
+    metrics.DB_POOL_EM_USO.labels(nome).set_function(lambda: engine.pool.checkedout())
+    metrics.DB_POOL_OCIOSAS.labels(nome).set_function(lambda: engine.pool.checkedin())
+    return engine
@@ -0,0 +1,118 @@
+"""
+Profiling sob demanda de uma requisicao (amostragem de pilhas).
+
+Ativado por requisicao com o header ``X-Profile`` igual a ``PROFILING_TOKEN``;
+sem token configurado, o middleware nao faz nada. As rotas de ``/perfis``
+nunca sao perfiladas (o mesmo header so autoriza a consulta).
+
+Uma thread amostra ``sys._current_frames()`` a cada ``PROFILING_INTERVALO_MS``
+enquanto a requisicao roda e acumula as pilhas no formato "folded"
+(``thread;func (arquivo:linha);... contagem``), lido por flamegraph.pl,
+speedscope e inferno. Todas as threads do processo sao amostradas: o event
+loop (o handler e as demais requisicoes concorrentes) e as threads do
+agendador, onde roda a extracao de PDF.
+
+Cada perfil vira ``storage/profiles/<id>.folded`` + ``<id>.json`` (metadados).
+"""
+
+from __future__ import annotations
+
+import hmac
+import json
+import sys
+import threading
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+from pathlib import Path
+
+from app.config import settings
+
+
+def token_valido(valor: str | None) -> bool:
+    """``valor`` confere com PROFILING_TOKEN (comparacao em tempo constante)."""
+    token = settings.PROFILING_TOKEN
+    # Em bytes: compare_digest rejeita str com caracteres nao ASCII (TypeError)
+    return bool(token and valor) and hmac.compare_digest(valor.encode(), token.encode())
+
+
+def diretorio_perfis() -> Path:
+    return Path(settings.STORAGE_DIR) / "profiles"
+
+
+class AmostradorPilhas:
+    """Amostra as pilhas de todas as threads em intervalo fixo, numa thread propria."""
+
+    def __init__(self, intervalo_segundos: float) -> None:
+        self.intervalo = intervalo_segundos
+        self.pilhas: Counter[str] = Counter()
+        self.amostras = 0
+        self._parar = threading.Event()
+        self._thread = threading.Thread(target=self._executar, name="profiler", daemon=True)
+
+    def iniciar(self) -> None:
+        self._thread.start()
+
+    def parar(self) -> Counter[str]:
+        self._parar.set()
+        self._thread.join()
+        return self.pilhas
+
+    def _executar(self) -> None:
+        proprio = threading.get_ident()
+        while not self._parar.wait(self.intervalo):
+            nomes = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == proprio:
+                    continue
+                quadros = []
+                while frame is not None:
+                    code = frame.f_code
+                    quadros.append(f"{code.co_name} ({Path(code.co_filename).name}:{frame.f_lineno})")
+                    frame = frame.f_back
+                quadros.append(nomes.get(ident, str(ident)))
+                self.pilhas[";".join(reversed(quadros))] += 1
+            self.amostras += 1
+
+
+def salvar_perfil(perfil_id: str, metadados: dict, pilhas: Counter[str]) -> Path:
+    """Grava o perfil (folded + json) e remove os mais antigos alem do limite."""
+    destino = diretorio_perfis()
+    destino.mkdir(parents=True, exist_ok=True)
+
+    arquivo = destino / f"{perfil_id}.folded"
+    arquivo.write_text(
+        "".join(f"{pilha} {contagem}\n" for pilha, contagem in pilhas.most_common()),
+        encoding="utf-8",
+    )
+    (destino / f"{perfil_id}.json").write_text(
+        json.dumps({"id": perfil_id, **metadados}, ensure_ascii=False), encoding="utf-8"
+    )
+
+    antigos = sorted(destino.glob("*.json"), key=lambda p: p.stat().st_mtime, reverse=True)
+    for meta in antigos[settings.PROFILING_MAX_PERFIS:]:
+        meta.unlink(missing_ok=True)
+        meta.with_suffix(".folded").unlink(missing_ok=True)
+    return arquivo
+
+
+def listar_perfis(limite: int) -> list[dict]:
+    """Metadados dos perfis mais recentes primeiro."""
+    destino = diretorio_perfis()
+    if not destino.exists():
+        return []
+    metas = sorted(destino.glob("*.json"), key=lambda p: p.stat().st_mtime, reverse=True)
+    perfis = []
+    for meta in metas[:limite]:
+        try:
+            perfis.append(json.loads(meta.read_text(encoding="utf-8")))
+        except (OSError, ValueError):
+            continue  # removido ou gravando neste instante
+    return perfis
+
+
+def novo_perfil_id(request_id: str | None) -> str:
+    """Id do perfil: timestamp + request id (sanitizado para nome de arquivo)."""
+    carimbo = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+    sufixo = "".join(c for c in (request_id or "") if c.isalnum() or c in "-_")[:64]
+    return f"{carimbo}_{sufixo or uuid.uuid4().hex[:12]}"
@@ -0,0 +1,62 @@
+"""
+Consultas de boletos/XMLs que trazem so as colunas necessarias.
+
+``Boleto.validacao_extra`` (JSONB, adiada no grupo ``validacao``) e
+``XmlNfe.dados_raw`` nao sao carregados por um ``select(Boleto)``/``select(XmlNfe)``
+comum; acessar sem carregar levanta erro (raiseload). Quem monta
+``BoletoCompleto`` ou le as camadas (``validacao_camada1..5``) pede ``com_validacao()``.
+
+Para o resto, projecoes: contagens por status, caminhos de arquivo e os
+campos da conciliacao de parcelas, sem materializar entidades inteiras.
+"""
+
+from __future__ import annotations
+
+from collections.abc import Sequence
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import undefer, undefer_group
+
+from app.models.boleto import Boleto
+from app.models.operacao import Operacao
+from app.services.particoes import da_operacao
+
+STATUS_APROVADOS = ("aprovado", "parcialmente_aprovado")
+
+
+def com_validacao():
+    """Opcao de carga das 5 camadas de validacao (grupo ``validacao``)."""
+    return undefer_group("validacao")
+
+
+async def contar_por_status(db: AsyncSession, op: Operacao) -> dict[str, int]:
+    """``{status: quantidade}`` dos boletos da operacao (um GROUP BY)."""
+    result = await db.execute(
+        select(Boleto.status, func.count())
+        .where(da_operacao(Boleto, op))
+        .group_by(Boleto.status)
+    )
+    return dict(result.all())
+
+
+async def boletos_para_conciliacao(db: AsyncSession, op: Operacao) -> Sequence[Boleto]:
+    """Boletos aprovados com XML vinculado, com o extra da validacao (parcela conciliada)."""
+    result = await db.execute(
+        select(Boleto)
+        .where(da_operacao(Boleto, op))
+        .where(Boleto.status.in_(STATUS_APROVADOS))
+        .where(Boleto.xml_nfe_id.is_not(None))
+        .options(undefer(Boleto.validacao_extra))
+    )
+    return result.scalars().all()
+
+
+async def arquivos_boletos(db: AsyncSession, *condicoes) -> list:
+    """Linhas ``(id, arquivo_path, arquivo_renomeado)`` dos boletos filtrados."""
+    result = await db.execute(
+        select(Boleto.id, Boleto.arquivo_path, Boleto.arquivo_renomeado)
+        .where(*condicoes)
+        .order_by(Boleto.created_at)
+    )
+    return result.all()
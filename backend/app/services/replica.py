@@ -0,0 +1,81 @@
+"""
+Roteamento de leituras para a replica (DATABASE_REPLICA_URL).
+
+Rotas so de leitura (dashboard, auditoria, listagem de operacoes, atividade,
+preview de envio) usam ``get_db_leitura`` (app/database.py): sessao na
+replica quando ela responde e o atraso de replicacao esta ate
+``REPLICA_ATRASO_MAXIMO_SEGUNDOS``; senao, sessao no primario.
+
+O atraso e medido no maximo uma vez a cada ``REPLICA_VERIFICACAO_SEGUNDOS``
+(uma consulta, compartilhada por todas as requisicoes do processo). Uma
+falha ao abrir conexao na replica a marca como indisponivel ate a proxima
+verificacao.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.services import metrics
+
+logger = logging.getLogger("app.replica")
+
+# Sem WAL pendente de aplicar, a replica esta em dia mesmo que a ultima
+# transacao reproduzida seja antiga (primario ocioso)
+SQL_ATRASO = """
+SELECT CASE
+    WHEN NOT pg_is_in_recovery() THEN 0
+    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE coalesce(extract(epoch FROM now() - pg_last_xact_replay_timestamp()), 0)
+END
+"""
+
+
+class EstadoReplica:
+    """Saude da replica com verificacao periodica (cache por ``intervalo`` segundos)."""
+
+    def __init__(self, engine: AsyncEngine, atraso_maximo: float, intervalo: float):
+        self.engine = engine
+        self.atraso_maximo = atraso_maximo
+        self.intervalo = intervalo
+        self._disponivel = False
+        self._proxima_verificacao = 0.0
+        self._lock = asyncio.Lock()
+
+    async def disponivel(self) -> bool:
+        if time.monotonic() < self._proxima_verificacao:
+            return self._disponivel
+        async with self._lock:
+            # Outra requisicao pode ter verificado enquanto esta esperava
+            if time.monotonic() >= self._proxima_verificacao:
+                self._definir(await self._verificar())
+        return self._disponivel
+
+    def marcar_falha(self) -> None:
+        """Replica falhou numa requisicao: primario ate a proxima verificacao."""
+        self._definir(False)
+
+    def _definir(self, disponivel: bool) -> None:
+        self._disponivel = disponivel
+        self._proxima_verificacao = time.monotonic() + self.intervalo
+        metrics.REPLICA_DISPONIVEL.set(1 if disponivel else 0)
+
+    async def _verificar(self) -> bool:
+        try:
+            async with asyncio.timeout(self.intervalo):
+                async with self.engine.connect() as conn:
+                    atraso = float((await conn.execute(text(SQL_ATRASO))).scalar() or 0)
+        except (OSError, SQLAlchemyError, TimeoutError) as e:
+            logger.warning("Replica indisponivel, leituras no primario: %s", e)
+            return False
+        metrics.REPLICA_ATRASO.set(atraso)
+        if atraso > self.atraso_maximo:
+            logger.warning("Replica atrasada %.1fs (maximo %.1fs), leituras no primario", atraso, self.atraso_maximo)
+            return False
+        return True
@@ -0,0 +1,284 @@
+"""
+Representacao compacta das 5 camadas de validacao de um boleto.
+
+Em vez de cinco documentos JSONB com chaves, nomes e mensagens repetidos em
+cada linha, o boleto guarda:
+
+  - ``validacao_mascara`` (smallint): bit n-1 = camada n aprovada,
+    bit n+4 = camada n bloqueia
+  - ``validacao_codigos`` (int): 4 bits por camada com o codigo do resultado
+    (constantes em ``app/extractors/validator.py``; 0 = camada ausente)
+  - ``validacao_similaridade`` (smallint): similaridade da Camada 3 em decimos de %
+  - ``validacao_diferenca_centavos`` (bigint): valor do boleto - valor do XML (Camada 4)
+  - ``validacao_extra`` (JSONB pequeno): so o que nao sai da propria linha do
+    boleto — NF/CNPJ/nome do XML quando diferem, erro do XML, vinculo ou
+    candidato, emails e a parcela conciliada
+
+Mensagens e detalhes sao remontados na leitura (``decodificar_camada``), no
+mesmo formato de antes: ``Boleto.validacao_camada1..5`` continuam existindo
+como propriedades, entao ``BoletoCompleto``, ``AuditoriaItem`` e os
+relatorios nao mudam.
+"""
+
+from __future__ import annotations
+
+import re
+
+from app.extractors import validator as v
+from app.extractors.similaridade import normalizar_nome
+
+NOMES = {1: "XML", 2: "CNPJ", 3: "Nome", 4: "Valor", 5: "Email"}
+
+# Chaves de validacao_extra de cada camada (trocadas juntas ao regravar a camada)
+_CHAVES_EXTRA = {
+    1: ("nf", "erro", "vinculo", "candidato"),
+    2: ("cnpj_xml",),
+    3: ("nome_xml",),
+    4: ("parcela", "alerta_parcela"),
+    5: ("emails", "emails_invalidos"),
+}
+
+_PREFIXO_XML_INVALIDO = "XML inválido: "
+
+
+def _nf(numero_nota: str | None) -> str:
+    return (numero_nota or "").lstrip("0")
+
+
+def _digitos(cnpj: str | None) -> str:
+    return re.sub(r"\D", "", cnpj or "")
+
+
+def bit_aprovado(camada: int) -> int:
+    return 1 << (camada - 1)
+
+
+def bit_bloqueia(camada: int) -> int:
+    return 1 << (camada + 4)
+
+
+def mascara_codigo(camada: int) -> int:
+    """Bits de ``camada`` em ``validacao_codigos``."""
+    return 0xF << (4 * (camada - 1))
+
+
+# Bits "bloqueia" de todas as camadas
+MASCARA_BLOQUEIA = sum(bit_bloqueia(n) for n in NOMES)
+
+
+def codigo(codigos: int | None, camada: int) -> int:
+    """Codigo gravado para ``camada`` (0 = ausente)."""
+    return ((codigos or 0) & mascara_codigo(camada)) >> (4 * (camada - 1))
+
+
+# ── Escrita ──────────────────────────────────────────────────
+
+
+def _extra_camada(c, numero_nota: str | None, cnpj: str | None) -> dict:
+    d = c.detalhes or {}
+    extra: dict = {}
+    if c.camada == 1:
+        nf_xml = d.get("nf_xml", d.get("numero_nota"))
+        if nf_xml is not None and nf_xml != _nf(numero_nota):
+            extra["nf"] = nf_xml
+        if c.codigo == v.XML_INVALIDO:
+            extra["erro"] = c.mensagem[len(_PREFIXO_XML_INVALIDO):]
+        for chave in ("vinculo", "candidato"):
+            if d.get(chave):
+                extra[chave] = d[chave]
+    elif c.camada == 2:
+        cnpj_xml = d.get("cnpj_xml")
+        if cnpj_xml and cnpj_xml != _digitos(cnpj):
+            extra["cnpj_xml"] = cnpj_xml
+    elif c.camada == 3:
+        if d.get("nome_xml"):
+            extra["nome_xml"] = d["nome_xml"]
+    elif c.camada == 5:
+        for chave in ("emails", "emails_invalidos"):
+            if d.get(chave):
+                extra[chave] = d[chave]
+    return extra
+
+
+def codificar(camadas, numero_nota: str | None, cnpj: str | None, valor_centavos: int | None) -> dict:
+    """Colunas compactas a partir dos ``ResultadoCamada`` de uma validacao.
+
+    ``numero_nota``/``cnpj``/``valor_centavos`` sao os do boleto validado
+    (os mesmos gravados na linha), usados como referencia do que nao precisa
+    ser repetido em ``validacao_extra``.
+    """
+    mascara = 0
+    codigos = 0
+    similaridade = None
+    diferenca = None
+    extra: dict = {}
+    for c in camadas:
+        n = c.camada
+        codigos |= (c.codigo & 0xF) << (4 * (n - 1))
+        if c.aprovado:
+            mascara |= bit_aprovado(n)
+        if c.bloqueia:
+            mascara |= bit_bloqueia(n)
+        extra.update(_extra_camada(c, numero_nota, cnpj))
+        d = c.detalhes or {}
+        if n == 3 and d.get("similaridade") is not None:
+            similaridade = round(d["similaridade"] * 10)
+        if n == 4 and d.get("valor_xml") is not None and valor_centavos is not None:
+            diferenca = valor_centavos - round(d["valor_xml"] * 100)
+    return {
+        "validacao_mascara": mascara,
+        "validacao_codigos": codigos,
+        "validacao_similaridade": similaridade,
+        "validacao_diferenca_centavos": diferenca,
+        "validacao_extra": extra or None,
+    }
+
+
+def vazio() -> dict:
+    """Colunas compactas de um boleto ainda nao validado."""
+    return {
+        "validacao_mascara": 0,
+        "validacao_codigos": 0,
+        "validacao_similaridade": None,
+        "validacao_diferenca_centavos": None,
+        "validacao_extra": None,
+    }
+
+
+def substituir_camada(boleto, camada) -> dict:
+    """Colunas do boleto com uma unica camada regravada (ex.: Camada 5 apos editar emails).
+
+    Requer ``validacao_extra`` carregado (``projecoes.com_validacao()``).
+    """
+    n = camada.camada
+    mascara = (boleto.validacao_mascara or 0) & ~(bit_aprovado(n) | bit_bloqueia(n))
+    if camada.aprovado:
+        mascara |= bit_aprovado(n)
+    if camada.bloqueia:
+        mascara |= bit_bloqueia(n)
+    codigos = (boleto.validacao_codigos or 0) & ~mascara_codigo(n)
+    codigos |= (camada.codigo & 0xF) << (4 * (n - 1))
+
+    extra = {k: val for k, val in (boleto.validacao_extra or {}).items() if k not in _CHAVES_EXTRA[n]}
+    extra.update(_extra_camada(camada, boleto.numero_nota, boleto.cnpj))
+    valores = {
+        "validacao_mascara": mascara,
+        "validacao_codigos": codigos,
+        "validacao_extra": extra or None,
+    }
+    if n in (3, 4):
+        novos = codificar([camada], boleto.numero_nota, boleto.cnpj, boleto.valor_centavos)
+        chave = "validacao_similaridade" if n == 3 else "validacao_diferenca_centavos"
+        valores[chave] = novos[chave]
+    return valores
+
+
+def anotar_parcela(boleto, parcela: dict | None = None, alerta: str | None = None) -> None:
+    """Grava (ou limpa) a parcela conciliada / alerta de parcela da Camada 4."""
+    extra = {k: val for k, val in (boleto.validacao_extra or {}).items() if k not in _CHAVES_EXTRA[4]}
+    if parcela:
+        extra["parcela"] = parcela
+    elif alerta:
+        extra["alerta_parcela"] = alerta
+    # Atribuir um dict novo para o SQLAlchemy detectar a mudanca no JSONB
+    boleto.validacao_extra = extra or None
+
+
+# ── Leitura ──────────────────────────────────────────────────
+
+
+def _mensagem_e_detalhes(boleto, n: int, cod: int, extra: dict) -> tuple[str, dict]:
+    if cod == v.NAO_VALIDADO:
+        return "Não validado (camada anterior falhou)", {}
+
+    if n == 1:
+        nf_boleto = _nf(boleto.numero_nota)
+        nf_xml = extra.get("nf", nf_boleto)
+        if cod == v.XML_NAO_ENCONTRADO:
+            detalhes = {"candidato": extra["candidato"]} if extra.get("candidato") else {}
+            return f"XML não encontrado para nota {boleto.numero_nota or '?'}", detalhes
+        if cod == v.XML_INVALIDO:
+            return f"{_PREFIXO_XML_INVALIDO}{extra.get('erro') or 'erro desconhecido'}", {}
+        if cod == v.XML_VINCULADO:
+            vinculo = extra.get("vinculo") or {}
+            return (
+                f"XML vinculado automaticamente (NF boleto={nf_boleto or '?'}, XML={nf_xml}, "
+                f"confiança {vinculo.get('confianca', 0) * 100:.0f}%)",
+                {"numero_nota": nf_xml, "nf_boleto": nf_boleto, "vinculo": vinculo},
+            )
+        if cod == v.XML_NF_DIVERGENTE:
+            return (
+                f"Número da nota divergente: boleto={nf_boleto}, XML={nf_xml}",
+                {"nf_boleto": nf_boleto, "nf_xml": nf_xml},
+            )
+        return "XML válido e número da nota confere", {"numero_nota": nf_xml}
+
+    if n == 2:
+        cnpj_boleto = _digitos(boleto.cnpj)
+        if cod == v.CNPJ_OK:
+            return "CNPJ confere", {"cnpj": cnpj_boleto}
+        cnpj_xml = extra.get("cnpj_xml", "")
+        detalhes = {"cnpj_boleto": cnpj_boleto, "cnpj_xml": cnpj_xml}
+        if cod == v.CNPJ_INDISPONIVEL:
+            return "CNPJ não disponível para comparação", detalhes
+        return f"CNPJ divergente! Boleto={cnpj_boleto}, XML={cnpj_xml}", detalhes
+
+    if n == 3:
+        nome_boleto = normalizar_nome(boleto.pagador or "")
+        nome_xml = extra.get("nome_xml", "")
+        if cod == v.NOME_INDISPONIVEL:
+            return "Nome não disponível para comparação", {"nome_boleto": nome_boleto, "nome_xml": nome_xml}
+        pct = (boleto.validacao_similaridade or 0) / 10
+        detalhes = {"similaridade": pct, "nome_boleto": nome_boleto, "nome_xml": nome_xml}
+        if cod == v.NOME_OK:
+            return f"Similaridade {pct}% (>={v.SIMILARIDADE_MINIMA * 100:.0f}%)", detalhes
+        return f"Similaridade baixa ({pct}%)", detalhes
+
+    if n == 4:
+        centavos = boleto.valor_centavos or 0
+        diferenca = boleto.validacao_diferenca_centavos or 0
+        detalhes: dict = {}
+        if cod == v.VALOR_BOLETO_INDISPONIVEL:
+            mensagem = "Valor do boleto não disponível para comparação"
+        elif cod == v.VALOR_XML_INDISPONIVEL:
+            mensagem = "Valor do XML não disponível para comparação"
+            detalhes = {"valor_boleto": centavos / 100}
+        elif cod == v.VALOR_OK:
+            mensagem = "Valor confere"
+            detalhes = {"valor_boleto": centavos / 100, "valor_xml": (centavos - diferenca) / 100}
+        else:
+            mensagem = f"Valor divergente! Diferença R$ {abs(diferenca) / 100:.2f}"
+            detalhes = {
+                "valor_boleto": centavos / 100,
+                "valor_xml": (centavos - diferenca) / 100,
+                "diferenca": abs(diferenca) / 100,
+            }
+        # Parcela conciliada (processar/reprocessar)
+        detalhes.update({k: extra[k] for k in _CHAVES_EXTRA[4] if k in extra})
+        return mensagem, detalhes
+
+    emails_invalidos = extra.get("emails_invalidos", [])
+    if cod == v.EMAIL_OK:
+        emails = extra.get("emails", [])
+        return f"{len(emails)} email(s) válido(s)", {"emails": emails, "emails_invalidos": emails_invalidos}
+    msg = "Nenhum email válido encontrado"
+    if emails_invalidos:
+        msg += f" (filtrados: {emails_invalidos})"
+    return msg, {"emails_invalidos": emails_invalidos}
+
+
+def decodificar_camada(boleto, n: int) -> dict | None:
+    """Dict da camada ``n`` no formato historico (camada, nome, aprovado, mensagem, bloqueia, detalhes)."""
+    cod = codigo(boleto.validacao_codigos, n)
+    if cod == 0:
+        return None
+    mascara = boleto.validacao_mascara or 0
+    mensagem, detalhes = _mensagem_e_detalhes(boleto, n, cod, boleto.validacao_extra or {})
+    return {
+        "camada": n,
+        "nome": NOMES[n],
+        "aprovado": bool(mascara & bit_aprovado(n)),
+        "mensagem": mensagem,
+        "bloqueia": bool(mascara & bit_bloqueia(n)),
+        "detalhes": detalhes,
+    }
@@ -0,0 +1,138 @@
+"""
+Validacao incremental — mantem a operacao validada conforme boletos e XMLs
+chegam, com trabalho proporcional a cada mudanca.
+
+- upload de boletos: cada pagina e validada logo apos a extracao, contra os
+  XMLs ja enviados (mesmo INSERT em lote)
+- upload de XMLs: so os boletos pendentes cuja NF normalizada bate com um
+  XML novo sao revalidados (a partir dos campos ja extraidos, sem reler o PDF)
+- edicao de emails de um XML: so a Camada 5 e reexecutada para os boletos
+  pendentes vinculados a ele
+
+O status continua ``pendente`` ate o operador processar: aprovacao,
+renomeacao de arquivos e totais da operacao seguem no processar. Como o
+fingerprint (memo_validacao) e gravado junto, o processar reaproveita os
+campos extraidos sem reler o PDF quando nada mudou.
+"""
+
+from __future__ import annotations
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import undefer
+
+from app.extractors.base import DadosBoleto
+from app.extractors.validator import revalidar_camada5, validar_5_camadas
+from app.models.boleto import Boleto
+from app.models.xml_nfe import XmlNfe
+from app.services import validacao_compacta
+from app.services.metrics import medir
+from app.services.memo_validacao import dados_boleto_do_registro, fingerprint_validacao
+from app.services.particoes import da_operacao
+from app.services.persistencia import atualizar_boletos
+from app.services.xml_matcher import IndiceXmls, dados_xml_do_registro
+
+
+def campos_resultado(resultado, dados_boleto: DadosBoleto) -> dict:
+    """Colunas do boleto preenchidas pela validacao em 5 camadas (forma compacta)."""
+    return {
+        "juros_detectado": resultado.juros_detectado,
+        **validacao_compacta.codificar(
+            resultado.camadas, dados_boleto.numero_nota, dados_boleto.cnpj, dados_boleto.valor_centavos,
+        ),
+    }
+
+
+def campos_validacao_vazios() -> dict:
+    """Colunas de validacao de um boleto ainda nao validado."""
+    return {
+        "juros_detectado": False,
+        **validacao_compacta.vazio(),
+        "validacao_fingerprint": None,
+        "xml_nfe_id": None,
+    }
+
+
+async def carregar_indice_xmls(db: AsyncSession, op) -> IndiceXmls:
+    """Indices dos XMLs da operacao; as NFs ja extraidas dos boletos ficam reservadas."""
+    xmls_result = await db.execute(select(XmlNfe).where(XmlNfe.operacao_id == op.id))
+    nfs_result = await db.execute(
+        select(Boleto.numero_nota)
+        .distinct()
+        .where(da_operacao(Boleto, op))
+        .where(Boleto.numero_nota.is_not(None))
+    )
+    return IndiceXmls.from_registros(xmls_result.scalars().all(), nfs_result.scalars().all())
+
+
+def validar_extraido(dados_boleto: DadosBoleto, extrator: str, indice_xmls: IndiceXmls) -> dict:
+    """Valida um boleto ja extraido e devolve as colunas de validacao."""
+    xml_record, dados_xml, vinculo = indice_xmls.localizar(dados_boleto)
+    with medir("validar_5_camadas", extrator):
+        resultado = validar_5_camadas(dados_boleto, dados_xml, vinculo)
+    return {
+        **campos_resultado(resultado, dados_boleto),
+        "validacao_fingerprint": fingerprint_validacao(dados_boleto, extrator, xml_record, vinculo),
+        "xml_nfe_id": xml_record.id if xml_record else None,
+    }
+
+
+async def revalidar_por_notas(
+    db: AsyncSession, op, extrator: str, chaves_nf: set[str]
+) -> int:
+    """Revalida os boletos pendentes cuja NF normalizada esta em ``chaves_nf``."""
+    chaves_nf = {c for c in chaves_nf if c}
+    if not chaves_nf:
+        return 0
+
+    result = await db.execute(
+        select(Boleto)
+        .where(da_operacao(Boleto, op))
+        .where(Boleto.status == "pendente")
+        .where(func.ltrim(Boleto.numero_nota, "0").in_(chaves_nf))
+    )
+    boletos = result.scalars().all()
+    if not boletos:
+        return 0
+
+    indice_xmls = await carregar_indice_xmls(db, op)
+
+    await atualizar_boletos(db, [
+        (b, validar_extraido(dados_boleto_do_registro(b), extrator, indice_xmls))
+        for b in boletos
+    ])
+    return len(boletos)
+
+
+async def revalidar_emails(db: AsyncSession, op, xml_record: XmlNfe, extrator: str) -> int:
+    """Reexecuta so a Camada 5 para os boletos pendentes vinculados a ``xml_record``.
+
+    Deve ser chamada apos o flush da edicao, para que ``xml_record.versao``
+    ja esteja incrementada. Boletos ja processados mantem o resultado (status,
+    motivo e camadas coerentes entre si); como o fingerprint deles nao bate
+    mais com a versao do XML, entram no proximo reprocessamento.
+    """
+    result = await db.execute(
+        select(Boleto)
+        .where(da_operacao(Boleto, op))
+        .where(Boleto.xml_nfe_id == xml_record.id)
+        .where(Boleto.status == "pendente")
+        .options(undefer(Boleto.validacao_extra))
+    )
+    boletos = result.scalars().all()
+    if not boletos:
+        return 0
+
+    camada5 = revalidar_camada5(dados_xml_do_registro(xml_record))
+    atualizacoes = []
+    for b in boletos:
+        valores = validacao_compacta.substituir_camada(b, camada5)
+        # Vinculo automatico (NF divergente) fica registrado na Camada 1
+        vinculo = (b.validacao_extra or {}).get("vinculo")
+        valores["validacao_fingerprint"] = fingerprint_validacao(
+            dados_boleto_do_registro(b), extrator, xml_record, vinculo
+        )
+        atualizacoes.append((b, valores))
+
+    await atualizar_boletos(db, atualizacoes)
+    return len(boletos)
@@ -0,0 +1,228 @@
+"""
+XML Matcher — localiza o XML NFe de um boleto, inclusive quando o número da
+nota extraído do PDF não bate com nenhum XML da operação.
+
+Indices em memoria (montados uma vez por operacao):
+- numero da nota normalizado (caminho principal)
+- CNPJ/CPF do destinatario (apenas digitos)
+- duplicata: (vencimento ISO, valor em centavos)
+- valor total em centavos
+- nome do destinatario normalizado
+
+Sem NF correspondente, os candidatos saem dos indices (lookup O(1) por chave),
+nunca de uma varredura boletos x XMLs. O melhor candidato so e vinculado
+automaticamente com confianca alta e unica e evidencia de duplicata
+(vencimento + valor); caso contrario fica apenas como sugestao em
+validacao_camada1.detalhes. XMLs ja reservados (NF de um boleto da operacao,
+casamento direto ou vinculo automatico anterior) nao sao candidatos: o mesmo
+XML nunca vai automaticamente para dois boletos.
+"""
+
+from __future__ import annotations
+
+import re
+from collections import defaultdict
+from dataclasses import dataclass, field
+
+from app.extractors.base import DadosBoleto
+from app.extractors.similaridade import normalizar_nome
+from app.extractors.xml_parser import DadosXmlNfe, valor_centavos_duplicata
+
+# Pesos de cada evidencia (somados e limitados a 1.0)
+PESO_CNPJ = 0.5
+PESO_DUPLICATA = 0.4
+PESO_VALOR_TOTAL = 0.3
+PESO_NOME = 0.2
+
+# Confianca minima para vincular sem intervencao do operador
+CONFIANCA_VINCULO_AUTOMATICO = 0.9
+# Confianca minima para registrar como sugestao
+CONFIANCA_SUGESTAO = 0.5
+
+
+def chave_nf(numero_nota: str | None) -> str:
+    """Chave de NF normalizada (sem zeros a esquerda)."""
+    return (numero_nota or "").lstrip("0")
+
+
+def _vencimento_iso(vencimento_completo: str | None) -> str | None:
+    """DD/MM/YYYY -> YYYY-MM-DD."""
+    if not vencimento_completo:
+        return None
+    match = re.match(r"(\d{2})/(\d{2})/(\d{4})", vencimento_completo)
+    if not match:
+        return None
+    return f"{match.group(3)}-{match.group(2)}-{match.group(1)}"
+
+
+def dados_xml_do_registro(xml_record) -> DadosXmlNfe:
+    """Monta DadosXmlNfe a partir de um registro XmlNfe gravado."""
+    return DadosXmlNfe(
+        xml_valido=xml_record.xml_valido,
+        numero_nota=xml_record.numero_nota,
+        cnpj=xml_record.cnpj or "",
+        nome_destinatario=xml_record.nome_destinatario or "",
+        valor_total_centavos=xml_record.valor_total_centavos or 0,
+        emails=xml_record.emails or [],
+        emails_invalidos=xml_record.emails_invalidos or [],
+        duplicatas=xml_record.duplicatas or [],
+    )
+
+
+@dataclass
+class CandidatoXml:
+    """XML candidato para um boleto sem NF correspondente."""
+
+    registro: object  # XmlNfe
+    dados: DadosXmlNfe
+    confianca: float
+    caminho: list[str] = field(default_factory=list)
+    automatico: bool = False
+
+    def to_dict(self) -> dict:
+        return {
+            "xml_id": str(getattr(self.registro, "id", "")),
+            "numero_nota": self.dados.numero_nota,
+            "confianca": round(self.confianca, 2),
+            "caminho": self.caminho,
+            "automatico": self.automatico,
+        }
+
+
+class IndiceXmls:
+    """Indices em memoria dos XMLs de uma operacao."""
+
+    def __init__(self) -> None:
+        self.por_nf: dict[str, tuple[object, DadosXmlNfe]] = {}
+        # NFs com XML ja reivindicado por um boleto (numero da nota ou vinculo automatico)
+        self._nfs_de_boletos: set[str] = set()
+        self._por_cnpj: dict[str, list[str]] = defaultdict(list)
+        self._por_duplicata: dict[tuple[str, int], list[str]] = defaultdict(list)
+        self._por_valor_total: dict[int, list[str]] = defaultdict(list)
+        self._por_nome: dict[str, list[str]] = defaultdict(list)
+
+    @classmethod
+    def from_registros(cls, xmls: list, nfs_boletos=()) -> IndiceXmls:
+        """Monta os indices a partir dos registros XmlNfe da operacao.
+
+        ``nfs_boletos``: numeros de nota ja extraidos dos boletos da operacao;
+        os XMLs dessas NFs nunca sao vinculados automaticamente a outro boleto.
+        """
+        indice = cls()
+        for xml_record in xmls:
+            nf = chave_nf(xml_record.numero_nota)
+            # Priorizar XMLs sobre PDFs (PDFs de NF sao apenas para exibicao)
+            if nf in indice.por_nf and xml_record.nome_arquivo.lower().endswith(".pdf"):
+                continue
+            indice.por_nf[nf] = (xml_record, dados_xml_do_registro(xml_record))
+
+        # Indices secundarios apenas sobre o XML escolhido para cada NF
+        for nf, (_, dados_xml) in indice.por_nf.items():
+            if not dados_xml.xml_valido:
+                continue
+            cnpj = re.sub(r"\D", "", dados_xml.cnpj)
+            if cnpj:
+                indice._por_cnpj[cnpj].append(nf)
+            for dup in dados_xml.duplicatas:
+                centavos = valor_centavos_duplicata(dup)
+                if dup.get("vencimento") and centavos:
+                    indice._por_duplicata[(dup["vencimento"], centavos)].append(nf)
+            total = dados_xml.valor_total_centavos
+            if total:
+                indice._por_valor_total[total].append(nf)
+            nome = normalizar_nome(dados_xml.nome_destinatario)
+            if nome:
+                indice._por_nome[nome].append(nf)
+
+        indice.reservar_nfs(nfs_boletos)
+        return indice
+
+    def reservar_nfs(self, numeros) -> None:
+        """Marca NFs de boletos da operacao: o XML delas nao vai para outro boleto."""
+        self._nfs_de_boletos.update(nf for nf in map(chave_nf, numeros) if nf in self.por_nf)
+
+    def buscar(self, numero_nota: str | None) -> tuple[object, DadosXmlNfe] | None:
+        """Lookup direto pelo numero da nota."""
+        return self.por_nf.get(chave_nf(numero_nota))
+
+    def sugerir(self, dados_boleto: DadosBoleto) -> CandidatoXml | None:
+        """Propoe o XML mais provavel para um boleto sem NF correspondente."""
+        evidencias: dict[str, dict[str, float]] = defaultdict(dict)
+
+        cnpj = re.sub(r"\D", "", dados_boleto.cnpj or "")
+        if cnpj:
+            for nf in self._por_cnpj.get(cnpj, ()):
+                evidencias[nf]["cnpj"] = PESO_CNPJ
+
+        centavos = dados_boleto.valor_centavos
+        if centavos:
+            venc = _vencimento_iso(dados_boleto.vencimento_completo)
+            if venc:
+                for nf in self._por_duplicata.get((venc, centavos), ()):
+                    evidencias[nf]["duplicata"] = PESO_DUPLICATA
+            for nf in self._por_valor_total.get(centavos, ()):
+                if "duplicata" not in evidencias[nf]:
+                    evidencias[nf]["valor_total"] = PESO_VALOR_TOTAL
+
+        nome = normalizar_nome(dados_boleto.pagador or "")
+        if nome:
+            for nf in self._por_nome.get(nome, ()):
+                evidencias[nf]["nome"] = PESO_NOME
+
+        # Ordena pela soma sem limite: CNPJ + duplicata + nome (1.1) passa na frente
+        # de CNPJ + valor total + nome (1.0) em vez de empatar em 1.0
+        pontuados = sorted(
+            (
+                (sum(pesos.values()), nf, sorted(pesos, key=pesos.get, reverse=True))
+                for nf, pesos in evidencias.items()
+                if pesos and nf not in self._nfs_de_boletos
+            ),
+            key=lambda item: item[0],
+            reverse=True,
+        )
+        if not pontuados or pontuados[0][0] < CONFIANCA_SUGESTAO:
+            return None
+
+        pontos, nf, caminho = pontuados[0]
+        empate = len(pontuados) > 1 and pontuados[1][0] == pontos
+        confianca = min(pontos, 1.0)
+        xml_record, dados_xml = self.por_nf[nf]
+        return CandidatoXml(
+            registro=xml_record,
+            dados=dados_xml,
+            confianca=confianca,
+            caminho=caminho,
+            automatico=(
+                confianca >= CONFIANCA_VINCULO_AUTOMATICO
+                and "duplicata" in caminho
+                and not empate
+            ),
+        )
+
+    def localizar(
+        self, dados_boleto: DadosBoleto, reservar: bool = True
+    ) -> tuple[object | None, DadosXmlNfe | None, dict | None]:
+        """Resolve o XML de um boleto: NF direta, vinculo automatico ou sugestao.
+
+        ``reservar``: a NF do XML resolvido (direto ou automatico) fica reservada
+        para este boleto; False so para consultas que nao decidem o vinculo
+        (ex.: conferir o fingerprint antes do reprocessamento).
+
+        Returns:
+            (xml_record, dados_xml, vinculo) — ``vinculo`` e None quando o XML
+            foi encontrado pela NF; para sugestoes, xml_record/dados_xml sao None.
+        """
+        par = self.buscar(dados_boleto.numero_nota)
+        if par:
+            if reservar:
+                self._nfs_de_boletos.add(chave_nf(dados_boleto.numero_nota))
+            return par[0], par[1], None
+
+        candidato = self.sugerir(dados_boleto)
+        if candidato is None:
+            return None, None, None
+        if candidato.automatico:
+            if reservar:
+                self._nfs_de_boletos.add(chave_nf(candidato.dados.numero_nota))
+            return candidato.registro, candidato.dados, candidato.to_dict()
+        return None, None, candidato.to_dict()
@@ -0,0 +1,237 @@
+"""Worker da fila de trabalho — drena work_items em paralelo com outros workers.
+
+Run: python -m app.worker  (from backend/ directory)
+
+Quantos processos forem necessarios, em uma ou varias maquinas apontando
+para o mesmo banco. Cada um reivindica lotes com FOR UPDATE SKIP LOCKED,
+renova heartbeats dos itens em execucao e devolve para a fila os itens de
+workers que pararam de responder.
+
+So recebe trabalho com FILA_TRABALHO_ATIVA=true no backend.
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import socket
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+
+# Ensure backend/ is in path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy import select, update
+
+from app.config import settings
+from app.database import async_session
+from app.extractors import gerar_nome_arquivo, get_extractor_by_name
+from app.models.boleto import Boleto
+from app.models.envio import Envio
+from app.models.fidc import Fidc
+from app.models.operacao import Operacao
+from app.services import fila, metrics
+from app.services.agendador import Prioridade, executar_agendado
+from app.services.envios import criar_mailer, reconstruir_email_group, todos_enviados
+from app.services.extracao import campos_extraidos, extrair_texto_pdf
+from app.services.monitor_loop import MonitorLoop
+from app.services.validacao_incremental import carregar_indice_xmls, validar_extraido
+
+logger = logging.getLogger("app.worker")
+
+
+# ── Handlers por tipo de item ─────────────────────────────────
+
+
+def _agendamento(item, etapa: str) -> dict:
+    """Parametros do agendador: o lote reivindicado tambem divide as vagas com justica."""
+    return dict(
+        prioridade=Prioridade(item.prioridade), usuario_id=item.usuario_id,
+        operacao_id=item.operacao_id, etapa=etapa,
+    )
+
+
+async def _extrair_pagina(db, item, indices: dict) -> None:
+    """Extrai e valida uma pagina de boleto (mesmo trabalho do upload sincrono)."""
+    boleto = await db.get(Boleto, uuid.UUID(item.payload["boleto_id"]))
+    if boleto is None or boleto.status != "pendente":
+        return  # operacao excluida ou ja processada
+
+    op = await db.get(Operacao, boleto.operacao_id)
+    fidc = await db.get(Fidc, op.fidc_id)
+    extrator = get_extractor_by_name(fidc.nome)
+
+    texto = await executar_agendado(
+        metrics.cronometrado(extrair_texto_pdf, "extrair_texto_pdf", fidc.nome), boleto.arquivo_path,
+        **_agendamento(item, "extracao"),
+    )
+    with metrics.medir("extrator_extrair", fidc.nome):
+        dados_boleto = extrator.extrair(texto, boleto.arquivo_original)
+
+    # Indice de XMLs compartilhado pelos itens da mesma operacao no lote
+    indice_xmls = indices.get(op.id)
+    if indice_xmls is None:
+        indice_xmls = indices[op.id] = await carregar_indice_xmls(db, op)
+
+    valores = {
+        **campos_extraidos(dados_boleto, gerar_nome_arquivo(dados_boleto)),
+        **validar_extraido(dados_boleto, fidc.nome, indice_xmls),
+    }
+    # Condicional: se o processar ja rodou para este boleto, nao sobrescrever
+    await db.execute(
+        update(Boleto.__table__)
+        .where(Boleto.__table__.c.id == boleto.id)
+        .where(Boleto.__table__.c.status == "pendente")
+        .values(**valores)
+    )
+
+
+async def _enviar_email(db, item, indices: dict) -> None:
+    """Envia (ou cria rascunho de) um Envio pendente.
+
+    Entrega pelo menos uma vez: se o worker morrer entre o SMTP e o commit,
+    o item volta para a fila e o email pode ser reenviado.
+    """
+    envio = (await db.execute(
+        select(Envio).where(Envio.id == uuid.UUID(item.payload["envio_id"])).with_for_update()
+    )).scalar_one_or_none()
+    if envio is None or envio.status != "pendente":
+        return
+
+    op = await db.get(Operacao, envio.operacao_id)
+    fidc = await db.get(Fidc, op.fidc_id)
+    group = await reconstruir_email_group(envio, op, db)
+    mailer = criar_mailer()
+    agendamento = _agendamento(item, "smtp")
+    try:
+        if envio.modo == "preview":
+            await executar_agendado(mailer.create_draft, group, **agendamento)
+            envio.status = "rascunho"
+        else:
+            await executar_agendado(
+                metrics.cronometrado(mailer.send_email, "smtp_envio", fidc.nome), group, **agendamento,
+            )
+            envio.status = "enviado"
+            envio.timestamp_envio = datetime.now(timezone.utc)
+    except RuntimeError as e:
+        envio.status = "erro"
+        envio.erro_detalhes = str(e)
+    metrics.EMAILS.labels(fidc.nome, envio.status).inc()
+    await db.flush()
+
+    # Auto-transicao: se todos os envios estao enviados, marcar operacao como enviada
+    if await todos_enviados(op, db):
+        op.status = "enviada"
+
+
+_HANDLERS = {
+    fila.TIPO_EXTRAIR_PAGINA: _extrair_pagina,
+    fila.TIPO_ENVIAR_EMAIL: _enviar_email,
+}
+
+
+# ── Loop principal ────────────────────────────────────────────
+
+
+class Worker:
+    def __init__(self, worker_id: str, lote: int) -> None:
+        self.worker_id = worker_id
+        self.lote = lote
+        self.em_execucao: set[uuid.UUID] = set()
+        self.parar = asyncio.Event()
+
+    async def _executar_item(self, item, indices: dict) -> None:
+        handler = _HANDLERS.get(item.tipo)
+        try:
+            if handler is None:
+                raise ValueError(f"Tipo de item desconhecido: {item.tipo}")
+            async with async_session() as db:
+                await handler(db, item, indices)
+                await fila.concluir(db, item.id)
+                await db.commit()
+        except Exception as exc:
+            logger.exception("Item %s (%s) falhou na tentativa %d", item.id, item.tipo, item.tentativas)
+            async with async_session() as db:
+                await fila.falhar(db, item.id, f"{type(exc).__name__}: {exc}", settings.WORKER_MAX_TENTATIVAS)
+                await db.commit()
+        finally:
+            self.em_execucao.discard(item.id)
+
+    async def _loop_heartbeat(self) -> None:
+        while not self.parar.is_set():
+            try:
+                await asyncio.wait_for(self.parar.wait(), timeout=settings.WORKER_HEARTBEAT_SEGUNDOS)
+            except asyncio.TimeoutError:
+                pass
+            if self.em_execucao:
+                try:
+                    async with async_session() as db:
+                        await fila.heartbeat(db, self.worker_id, list(self.em_execucao))
+                        await db.commit()
+                except Exception:
+                    logger.exception("Falha ao renovar heartbeat")
+
+    async def executar(self) -> None:
+        logger.info("Worker %s iniciado (lote=%d)", self.worker_id, self.lote)
+        heartbeat_task = asyncio.create_task(self._loop_heartbeat())
+        monitor = None
+        if settings.LOOP_MONITOR_ATIVO:
+            monitor = MonitorLoop(
+                settings.LOOP_MONITOR_INTERVALO_MS / 1000, settings.LOOP_MONITOR_LIMIAR_MS / 1000, "worker",
+            )
+            monitor.iniciar()
+        ultima_recuperacao = 0.0
+        try:
+            while not self.parar.is_set():
+                async with async_session() as db:
+                    # Recuperacao de travados: basta um worker por intervalo, mas e idempotente
+                    if time.monotonic() - ultima_recuperacao >= settings.WORKER_TIMEOUT_SEGUNDOS / 2:
+                        recuperados = await fila.recuperar_travados(
+                            db, settings.WORKER_TIMEOUT_SEGUNDOS, settings.WORKER_MAX_TENTATIVAS,
+                        )
+                        if recuperados:
+                            logger.warning("%d item(ns) travado(s) devolvido(s) para a fila", recuperados)
+                        ultima_recuperacao = time.monotonic()
+                    itens = await fila.reivindicar(db, self.worker_id, self.lote)
+                    await db.commit()
+
+                if not itens:
+                    try:
+                        await asyncio.wait_for(self.parar.wait(), timeout=settings.WORKER_OCIOSO_SEGUNDOS)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+
+                self.em_execucao.update(item.id for item in itens)
+                indices: dict = {}
+                await asyncio.gather(*(self._executar_item(item, indices) for item in itens))
+        finally:
+            self.parar.set()
+            await heartbeat_task
+            if monitor is not None:
+                await monitor.parar()
+            logger.info("Worker %s encerrado", self.worker_id)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Worker da fila de trabalho (work_items)")
+    parser.add_argument("--id", default=f"{socket.gethostname()}:{os.getpid()}", help="Identificador do worker")
+    parser.add_argument("--lote", type=int, default=settings.WORKER_LOTE, help="Itens reivindicados por vez")
+    parser.add_argument("--metrics-porta", type=int, default=0, help="Porta HTTP das metricas Prometheus (0 = desligado)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    if args.metrics_porta:
+        metrics.servir(args.metrics_porta)
+    worker = Worker(args.id, args.lote)
+    try:
+        asyncio.run(worker.executar())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
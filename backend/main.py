@@ -1,10 +1,19 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
 from pathlib import Path
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Header, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 
-from app.routers import auth, auditoria, email_layout, fidcs, operacoes, version
+from app.config import settings
+from app.routers import auth, auditoria, email_layout, fidcs, operacoes, perfis, version
+from app.services import metrics, profiler
+from app.services.audit import buffer_audit
+from app.services.consultas_sql import avisar_n_mais_1, contar_consultas
+from app.services.monitor_loop import MonitorLoop
 
 _version_file = Path(__file__).resolve().parent.parent / "VERSION"
 _app_version = (
@@ -13,11 +22,30 @@ _app_version = (
     else "1.0.0"
 )
 
+
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    monitor = None
+    if settings.LOOP_MONITOR_ATIVO:
+        monitor = MonitorLoop(
+            settings.LOOP_MONITOR_INTERVALO_MS / 1000, settings.LOOP_MONITOR_LIMIAR_MS / 1000, "api",
+        )
+        monitor.iniciar()
+    if not settings.AUDIT_SINCRONO:
+        buffer_audit.iniciar()
+    yield
+    await buffer_audit.parar()
+    if monitor is not None:
+        await monitor.parar()
+
+
 app = FastAPI(
     title="Sistema Automação Boletos - JotaJota",
     version=_app_version,
     docs_url="/api/docs",
     openapi_url="/api/openapi.json",
+    lifespan=lifespan,
 )
 
 app.add_middleware(
@@ -28,12 +56,66 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+@app.middleware("http")
+async def instrumentar_sql(request: Request, call_next):
+    """Conta consultas e tempo no banco por requisicao; avisa N+1 em desenvolvimento."""
+    with contar_consultas() as contador:
+        response = await call_next(request)
+
+    rota_match = request.scope.get("route")
+    rota = getattr(rota_match, "path", None) or "nao_roteada"
+    metrics.SQL_CONSULTAS_REQUISICAO.labels(rota).observe(contador.consultas)
+    metrics.SQL_TEMPO_REQUISICAO.labels(rota).observe(contador.tempo_total)
+
+    if settings.SQL_DETECTAR_N_MAIS_1:
+        avisar_n_mais_1(f"{request.method} {rota}", contador)
+        response.headers["Server-Timing"] = (
+            f'db;dur={contador.tempo_total * 1000:.1f};desc="{contador.consultas} consultas"'
+        )
+    return response
+
+
+@app.middleware("http")
+async def perfilar_requisicao(request: Request, call_next):
+    """Profiling sob demanda: so quando o header X-Profile bate com PROFILING_TOKEN."""
+    # Consultar perfis usa o mesmo header; perfilar essas chamadas so empurraria os perfis uteis para fora
+    if request.url.path.startswith("/api/v1/perfis") or not profiler.token_valido(request.headers.get("x-profile")):
+        return await call_next(request)
+
+    request_id = request.headers.get("x-request-id")
+    perfil_id = profiler.novo_perfil_id(request_id)
+    intervalo_ms = settings.PROFILING_INTERVALO_MS
+    amostrador = profiler.AmostradorPilhas(intervalo_ms / 1000)
+    inicio = time.perf_counter()
+    amostrador.iniciar()
+    response = None
+    try:
+        response = await call_next(request)
+    finally:
+        pilhas = await asyncio.to_thread(amostrador.parar)
+        metadados = {
+            "request_id": request_id or perfil_id,
+            "metodo": request.method,
+            "caminho": request.url.path,
+            "status_code": response.status_code if response is not None else None,
+            "duracao_ms": round((time.perf_counter() - inicio) * 1000, 1),
+            "amostras": amostrador.amostras,
+            "intervalo_ms": intervalo_ms,
+            "criado_em": datetime.now(timezone.utc).isoformat(),
+        }
+        await asyncio.to_thread(profiler.salvar_perfil, perfil_id, metadados, pilhas)
+
+    response.headers["X-Profile-Id"] = perfil_id
+    return response
+
 app.include_router(auth.router, prefix="/api/v1")
 app.include_router(fidcs.router, prefix="/api/v1")
 app.include_router(operacoes.router, prefix="/api/v1")
 app.include_router(auditoria.router, prefix="/api/v1")
 app.include_router(email_layout.router, prefix="/api/v1")
 app.include_router(version.router, prefix="/api/v1")
+app.include_router(perfis.router, prefix="/api/v1")
 
 app.mount("/api/v1/assets", StaticFiles(directory="app/assets"), name="assets")
 
@@ -41,3 +123,11 @@ app.mount("/api/v1/assets", StaticFiles(directory="app/assets"), name="assets")
 @app.get("/api/health")
 async def health():
     return {"status": "ok"}
+
+
+@app.get("/api/metrics", include_in_schema=False)
+async def prometheus_metrics(authorization: str | None = Header(None)):
+    if not metrics.token_valido(authorization):
+        raise HTTPException(status_code=403, detail="Metricas desabilitadas ou token invalido")
+    corpo, content_type = metrics.exportar()
+    return Response(content=corpo, media_type=content_type)
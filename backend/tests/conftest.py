@@ -0,0 +1,81 @@
+"""
+Configuracao dos testes (python -m pytest, a partir de backend/).
+
+Testes de funcoes puras rodam sem banco. Os que usam o fixture ``banco``
+precisam de um PostgreSQL vazio em TEST_DATABASE_URL (ex.: um banco criado
+no postgres do docker-compose); sem ele sao pulados. O schema e criado uma
+vez por sessao com ``alembic upgrade head``.
+"""
+
+import os
+import tempfile
+import uuid
+from pathlib import Path
+
+import pytest
+
+# Antes de importar o app: Settings e o engine sao criados no import
+os.environ.setdefault("JWT_SECRET_KEY", "testes")
+os.environ["STORAGE_DIR"] = tempfile.mkdtemp(prefix="boletos_testes_")
+os.environ["FILA_TRABALHO_ATIVA"] = "false"
+TEST_DATABASE_URL = os.environ.get("TEST_DATABASE_URL", "")
+if TEST_DATABASE_URL:
+    os.environ["DATABASE_URL"] = TEST_DATABASE_URL
+
+BACKEND = Path(__file__).resolve().parent.parent
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture(scope="session")
+def _schema():
+    if not TEST_DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL nao definido")
+    from alembic import command
+    from alembic.config import Config
+
+    config = Config(str(BACKEND / "alembic.ini"))
+    config.set_main_option("script_location", str(BACKEND / "alembic"))
+    command.upgrade(config, "head")
+
+
+@pytest.fixture
+async def banco(_schema):
+    """Sessao no banco de teste; o pool e descartado ao fim (um event loop por teste)."""
+    from app.database import async_session, engine
+
+    async with async_session() as db:
+        yield db
+    await engine.dispose()
+
+
+@pytest.fixture
+async def usuario(banco):
+    from app.models.usuario import Usuario
+
+    u = Usuario(nome="Teste", email=f"{uuid.uuid4().hex}@teste.local", senha_hash="x")
+    banco.add(u)
+    await banco.commit()
+    return u
+
+
+@pytest.fixture
+async def cliente(usuario):
+    """Cliente HTTP do app autenticado como ``usuario`` (usuario ja no cache)."""
+    import httpx
+
+    from app.security import create_access_token
+    from app.services.cache_usuarios import cache_usuarios
+    from main import app
+
+    cache_usuarios.guardar(usuario)
+    token = create_access_token({"sub": str(usuario.id)})
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app),
+        base_url="http://teste",
+        headers={"Authorization": f"Bearer {token}"},
+    ) as c:
+        yield c
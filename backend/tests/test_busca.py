@@ -0,0 +1,107 @@
+"""
+Colunas de busca da auditoria (busca_nome/busca_cnpj) e o filtro textual.
+"""
+
+import importlib.util
+from pathlib import Path
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
+
+from app.extractors.base import DadosBoleto
+from app.extractors.similaridade import cnpj_busca, nome_busca
+from app.models.xml_nfe import XmlNfe
+from app.routers.auditoria import _busca_textual
+from app.services.extracao import campos_extraidos
+
+NOMES = [
+    ("Açúcar & Cia. Ltda.", "ACUCAR CIA LTDA"),
+    ("  josé   da silva-ME ", "JOSE DA SILVAME"),
+    ("CONSTRUÇÕES SÃO JOÃO S/A", "CONSTRUCOES SAO JOAO SA"),
+    ("Ótica Irmãos Müller", "OTICA IRMAOS MULLER"),
+    ("EMPRESA_2 LTDA", "EMPRESA_2 LTDA"),
+]
+
+
+@pytest.mark.parametrize("nome, esperado", NOMES)
+def test_nome_busca(nome, esperado):
+    assert nome_busca(nome) == esperado
+
+
+@pytest.mark.parametrize("nome", [None, "", "   ", "-./"])
+def test_nome_busca_vazio(nome):
+    assert nome_busca(nome) is None
+
+
+@pytest.mark.parametrize(
+    "cnpj, esperado",
+    [("11.222.333/0001-81", "11222333000181"), ("123.456.789-09", "12345678909"), ("abc", None), ("", None), (None, None)],
+)
+def test_cnpj_busca(cnpj, esperado):
+    assert cnpj_busca(cnpj) == esperado
+
+
+def test_xml_sincroniza_busca_nome():
+    xml = XmlNfe(nome_destinatario="Açúcar & Cia. Ltda.")
+    assert xml.busca_nome == "ACUCAR CIA LTDA"
+
+    xml.nome_destinatario = None
+    assert xml.busca_nome is None
+
+
+def test_campos_extraidos_preenche_busca():
+    dados = DadosBoleto(pagador="josé da silva", cnpj="11.222.333/0001-81")
+
+    campos = campos_extraidos(dados, None)
+
+    assert campos["busca_nome"] == "JOSE DA SILVA"
+    assert campos["busca_cnpj"] == "11222333000181"
+    assert campos_extraidos(None, None)["busca_nome"] is None
+
+
+def _sql(condicao) -> str:
+    return str(condicao.compile(dialect=postgresql.dialect()))
+
+
+def test_busca_textual_sem_termo_buscavel():
+    assert _busca_textual("-./") == (None, None)
+
+
+def test_busca_textual_por_nome():
+    condicao, rank = _busca_textual("açúcar")
+
+    sql = _sql(condicao)
+    assert sql.count("SELECT boletos.id") == 2
+    assert "busca_cnpj" not in sql
+    assert "word_similarity" in _sql(rank)
+
+
+def test_busca_textual_por_cnpj():
+    # Digitos tambem sao um nome buscavel ("123" pode estar no nome)
+    condicao, rank = _busca_textual("11.222.333/0001-81")
+
+    sql = _sql(condicao)
+    assert "busca_cnpj" in sql and "busca_nome" in sql
+    assert "CASE" in _sql(rank)
+
+
+# ── Backfill da migration 012 (mesma normalizacao em SQL) ─────
+
+
+def _migration_012():
+    caminho = Path(__file__).resolve().parent.parent / "alembic" / "versions" / "012_busca_auditoria.py"
+    spec = importlib.util.spec_from_file_location("migration_012", caminho)
+    modulo = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(modulo)
+    return modulo
+
+
+@pytest.mark.anyio
+async def test_backfill_012_igual_a_nome_busca(banco):
+    migration = _migration_012()
+
+    for nome, _ in NOMES:
+        sql = f"SELECT {migration._NOME_NORMALIZADO.format(col=':nome')}"
+        resultado = (await banco.execute(text(sql), {"nome": nome})).scalar()
+        assert resultado == nome_busca(nome), nome
@@ -0,0 +1,107 @@
+"""
+Instrumentacao de SQL e detector de N+1 (app/services/consultas_sql.py).
+"""
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from app.services.consultas_sql import (
+    OrcamentoConsultasExcedido,
+    contar_consultas,
+    forma_consulta,
+    instrumentar,
+    orcamento_consultas,
+)
+
+
+@pytest.mark.parametrize(
+    "statement, esperado",
+    [
+        # asyncpg: $n, com ou sem cast
+        ("SELECT * FROM boletos WHERE id = $1::UUID", "SELECT * FROM boletos WHERE id = ?"),
+        ("SELECT 1 WHERE x = ANY($1::VARCHAR[])", "SELECT 1 WHERE x = ANY(?)"),
+        (
+            "SELECT * FROM boletos WHERE operacao_id = $1::UUID AND status = $2::VARCHAR",
+            "SELECT * FROM boletos WHERE operacao_id = ? AND status = ?",
+        ),
+        # psycopg (pyformat) e sqlite (qmark)
+        ("SELECT * FROM envios WHERE id = %(id_1)s", "SELECT * FROM envios WHERE id = ?"),
+        ("SELECT * FROM envios WHERE id = ?", "SELECT * FROM envios WHERE id = ?"),
+        (
+            "UPDATE boletos SET valor = $1::NUMERIC(12, 2), atualizado_em = $2::TIMESTAMP WITH TIME ZONE "
+            "WHERE id = $3::UUID",
+            "UPDATE boletos SET valor = ?, atualizado_em = ? WHERE id = ?",
+        ),
+        ("SELECT $1::DOUBLE PRECISION AS r", "SELECT ? AS r"),
+        # Listas do IN colapsadas, independente do tamanho
+        ("SELECT * FROM xmls WHERE id IN ($1, $2, $3)", "SELECT * FROM xmls WHERE id IN (?...)"),
+        ("SELECT * FROM xmls WHERE id IN ($1::UUID,$2::UUID)", "SELECT * FROM xmls WHERE id IN (?...)"),
+        # Espacos e quebras de linha normalizados
+        ("SELECT *\n  FROM boletos\n WHERE id = $1", "SELECT * FROM boletos WHERE id = ?"),
+    ],
+)
+def test_forma_consulta(statement, esperado):
+    assert forma_consulta(statement) == esperado
+
+
+def test_mesma_forma_para_parametros_diferentes():
+    a = forma_consulta("SELECT * FROM xmls WHERE operacao_id = $1 AND id IN ($2, $3)")
+    b = forma_consulta("SELECT * FROM xmls WHERE operacao_id = $1 AND id IN ($2, $3, $4, $5)")
+    assert a == b
+
+
+def test_contadores_aninhados():
+    with contar_consultas() as fora:
+        fora.registrar("SELECT 1", 0.5)
+        with contar_consultas() as dentro:
+            for i in range(3):
+                dentro.registrar(f"SELECT * FROM t WHERE id = ${i + 1}", 0.1)
+
+    assert dentro.consultas == 3
+    assert fora.consultas == 4
+    assert fora.tempo_total == pytest.approx(0.8)
+    assert dentro.repetidas(3) == [("SELECT * FROM t WHERE id = ?", 3)]
+    assert fora.repetidas(4) == []
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://")
+    instrumentar(engine)
+    yield engine
+    engine.dispose()
+
+
+def test_instrumentar_conta_no_contexto(engine):
+    with engine.connect() as conn:
+        # Fora de um contador: nada a registrar
+        conn.execute(text("SELECT 1"))
+        with contar_consultas() as contador:
+            for i in range(5):
+                conn.execute(text("SELECT :i"), {"i": i})
+
+    assert contador.consultas == 5
+    assert contador.repetidas(5) == [("SELECT ?", 5)]
+
+
+def test_consulta_com_erro_nao_desalinha_os_tempos(engine):
+    with engine.connect() as conn, contar_consultas() as contador:
+        with pytest.raises(Exception):
+            conn.execute(text("SELECT * FROM tabela_inexistente"))
+        conn.execute(text("SELECT 1"))
+
+        assert conn.info["inicio_consulta"] == []
+
+    assert contador.consultas == 1
+
+
+def test_orcamento_consultas(engine):
+    with engine.connect() as conn:
+        with orcamento_consultas(2):
+            conn.execute(text("SELECT 1"))
+            conn.execute(text("SELECT 2"))
+
+        with pytest.raises(OrcamentoConsultasExcedido, match=r"3 consultas \(orcamento: 2\)"):
+            with orcamento_consultas(2):
+                for i in range(3):
+                    conn.execute(text("SELECT :i"), {"i": i})
@@ -0,0 +1,205 @@
+"""
+Fila de trabalho em Postgres (app/services/fila.py) e o worker (app/worker.py).
+
+Os testes da fila precisam de TEST_DATABASE_URL (ver conftest.py) e nao fazem
+commit: os itens criados somem no rollback da sessao.
+"""
+
+import uuid
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import select
+
+from app.models.fidc import Fidc
+from app.models.operacao import Operacao
+from app.models.usuario import Usuario
+from app.models.work_item import WorkItem
+from app.services import fila
+from app.services.agendador import Prioridade
+
+pytestmark = pytest.mark.anyio
+
+
+async def _operacao(banco, usuario) -> Operacao:
+    fidc = Fidc(nome=f"T{uuid.uuid4().hex[:8]}", nome_completo="FIDC de teste", cor="#000000")
+    banco.add(fidc)
+    await banco.flush()
+    op = Operacao(numero=f"OP-{uuid.uuid4().hex[:8]}", fidc_id=fidc.id, usuario_id=usuario.id)
+    banco.add(op)
+    await banco.flush()
+    return op
+
+
+async def _status(banco, ids) -> dict:
+    linhas = (await banco.execute(
+        select(WorkItem.id, WorkItem.status).where(WorkItem.id.in_(ids)).execution_options(populate_existing=True)
+    )).all()
+    return dict(linhas)
+
+
+async def test_reivindicar_intercala_usuarios_e_operacoes(banco, usuario):
+    outro = Usuario(nome="Outro", email=f"{uuid.uuid4().hex}@teste.local", senha_hash="x")
+    banco.add(outro)
+    await banco.flush()
+    op_a1, op_a2, op_b = [await _operacao(banco, u) for u in (usuario, usuario, outro)]
+    for op, dono, n in ((op_a1, usuario, 6), (op_a2, usuario, 2), (op_b, outro, 2)):
+        await fila.enfileirar(
+            banco, fila.TIPO_EXTRAIR_PAGINA, op.id, [{"pagina": i} for i in range(n)], usuario_id=dono.id,
+        )
+
+    itens = await fila.reivindicar(banco, "w1", 4)
+
+    # Um item por usuario por rodada e, dentro do usuario, por operacao
+    assert sorted(str(i.operacao_id) for i in itens) == sorted(map(str, (op_a1.id, op_a2.id, op_b.id, op_b.id)))
+    assert all(i.tentativas == 1 for i in itens)
+    await banco.rollback()
+
+
+async def test_prioridade_vem_antes_da_ordem_de_chegada(banco, usuario):
+    op = await _operacao(banco, usuario)
+    await fila.enfileirar(
+        banco, fila.TIPO_EXTRAIR_PAGINA, op.id, [{"lote": i} for i in range(3)], usuario.id, Prioridade.LOTE,
+    )
+    await fila.enfileirar(banco, fila.TIPO_ENVIAR_EMAIL, op.id, [{"envio": "x"}], usuario.id, Prioridade.INTERATIVA)
+
+    itens = await fila.reivindicar(banco, "w1", 1)
+
+    assert [i.tipo for i in itens] == [fila.TIPO_ENVIAR_EMAIL]
+    await banco.rollback()
+
+
+async def test_workers_concorrentes_nao_dividem_itens(banco, usuario):
+    from app.database import async_session
+
+    op = await _operacao(banco, usuario)
+    await fila.enfileirar(banco, fila.TIPO_EXTRAIR_PAGINA, op.id, [{"pagina": i} for i in range(4)], usuario.id)
+    await banco.commit()
+
+    try:
+        async with async_session() as outra:
+            # w1 segura os row locks ate o fim da transacao; w2 pula esses itens
+            primeiros = await fila.reivindicar(banco, "w1", 2)
+            segundos = await fila.reivindicar(outra, "w2", 10)
+            ids_w1 = {i.id for i in primeiros}
+            ids_w2 = {i.id for i in segundos if i.operacao_id == op.id}
+            await outra.rollback()
+        assert len(ids_w1) == 2 and len(ids_w2) == 2
+        assert not ids_w1 & ids_w2
+    finally:
+        await banco.rollback()
+        await banco.execute(WorkItem.__table__.delete().where(WorkItem.operacao_id == op.id))
+        await banco.commit()
+
+
+async def test_falhar_devolve_ou_esgota(banco, usuario):
+    op = await _operacao(banco, usuario)
+    await fila.enfileirar(banco, fila.TIPO_EXTRAIR_PAGINA, op.id, [{"pagina": 1}], usuario.id)
+    (item,) = await fila.reivindicar(banco, "w1", 1)
+
+    await fila.falhar(banco, item.id, "RuntimeError: x", max_tentativas=2)
+    assert await _status(banco, [item.id]) == {item.id: "pendente"}
+
+    (item,) = await fila.reivindicar(banco, "w1", 1)
+    assert item.tentativas == 2
+    await fila.falhar(banco, item.id, "RuntimeError: x", max_tentativas=2)
+    assert await _status(banco, [item.id]) == {item.id: "erro"}
+    await banco.rollback()
+
+
+async def test_recuperar_travados(banco, usuario):
+    op = await _operacao(banco, usuario)
+    vencido = datetime.now(timezone.utc) - timedelta(hours=1)
+    itens = [
+        WorkItem(tipo=fila.TIPO_EXTRAIR_PAGINA, operacao_id=op.id, status="em_execucao",
+                 worker_id="morto", tentativas=t, heartbeat_at=h)
+        for t, h in ((1, vencido), (3, vencido), (1, datetime.now(timezone.utc)))
+    ]
+    banco.add_all(itens)
+    await banco.flush()
+
+    assert await fila.recuperar_travados(banco, timeout_segundos=60, max_tentativas=3) >= 2
+
+    assert await _status(banco, [i.id for i in itens]) == {
+        itens[0].id: "pendente", itens[1].id: "erro", itens[2].id: "em_execucao",
+    }
+    await banco.rollback()
+
+
+# ── Worker (sem banco) ────────────────────────────────────────
+
+
+class _SessaoFalsa:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def commit(self) -> None:
+        pass
+
+
+@pytest.fixture
+def worker(monkeypatch):
+    from app import worker as modulo
+
+    chamadas: list[tuple] = []
+
+    async def concluir(db, item_id):
+        chamadas.append(("concluir", item_id))
+
+    async def falhar(db, item_id, erro, max_tentativas):
+        chamadas.append(("falhar", item_id, erro))
+
+    monkeypatch.setattr(modulo, "async_session", _SessaoFalsa)
+    monkeypatch.setattr(modulo.fila, "concluir", concluir)
+    monkeypatch.setattr(modulo.fila, "falhar", falhar)
+    w = modulo.Worker("w1", lote=4)
+    w.chamadas = chamadas
+    return w
+
+
+def _item(tipo: str) -> SimpleNamespace:
+    return SimpleNamespace(id=uuid.uuid4(), tipo=tipo, tentativas=1, payload={})
+
+
+async def test_worker_conclui_item(worker, monkeypatch):
+    from app import worker as modulo
+
+    executados = []
+
+    async def handler(db, item, indices):
+        executados.append(item.id)
+
+    monkeypatch.setitem(modulo._HANDLERS, fila.TIPO_ENVIAR_EMAIL, handler)
+    item = _item(fila.TIPO_ENVIAR_EMAIL)
+    worker.em_execucao.add(item.id)
+
+    await worker._executar_item(item, {})
+
+    assert executados == [item.id]
+    assert worker.chamadas == [("concluir", item.id)]
+    assert worker.em_execucao == set()
+
+
+async def test_worker_devolve_item_com_erro(worker, monkeypatch):
+    from app import worker as modulo
+
+    async def handler(db, item, indices):
+        raise RuntimeError("smtp fora")
+
+    monkeypatch.setitem(modulo._HANDLERS, fila.TIPO_ENVIAR_EMAIL, handler)
+    item = _item(fila.TIPO_ENVIAR_EMAIL)
+    desconhecido = _item("outro")
+    worker.em_execucao.update({item.id, desconhecido.id})
+
+    await worker._executar_item(item, {})
+    await worker._executar_item(desconhecido, {})
+
+    assert worker.chamadas == [
+        ("falhar", item.id, "RuntimeError: smtp fora"),
+        ("falhar", desconhecido.id, "ValueError: Tipo de item desconhecido: outro"),
+    ]
+    assert worker.em_execucao == set()
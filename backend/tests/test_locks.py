@@ -0,0 +1,156 @@
+"""
+Lock exclusivo por operacao e coalescencia de pedidos (app/services/locks.py).
+
+O advisory lock roda contra uma sessao falsa: so a resposta de
+``pg_try_advisory_xact_lock`` importa aqui.
+"""
+
+import asyncio
+
+import pytest
+
+from app.services import locks
+from app.services.locks import OperacaoOcupada, executar_exclusivo
+
+pytestmark = pytest.mark.anyio
+
+
+class _Resultado:
+    def __init__(self, valor: bool) -> None:
+        self._valor = valor
+
+    def scalar(self) -> bool:
+        return self._valor
+
+
+class _BancoFalso:
+    """Sessao que responde ao ``pg_try_advisory_xact_lock`` com ``respostas`` (depois True)."""
+
+    def __init__(self, *respostas: bool) -> None:
+        self.respostas = list(respostas)
+        self.tentativas = 0
+
+    async def execute(self, statement, params):
+        assert "pg_try_advisory_xact_lock" in str(statement)
+        assert params["ns"] == locks.NAMESPACE_LOCK_OPERACAO
+        self.tentativas += 1
+        return _Resultado(self.respostas.pop(0) if self.respostas else True)
+
+
+@pytest.fixture(autouse=True)
+def _sem_espera(monkeypatch):
+    monkeypatch.setattr(locks, "INTERVALO_TENTATIVA_SEGUNDOS", 0)
+
+
+async def test_pedidos_repetidos_sao_coalescidos():
+    liberar = asyncio.Event()
+    chamadas = 0
+
+    async def processar():
+        nonlocal chamadas
+        chamadas += 1
+        await liberar.wait()
+        return {"processados": 3}
+
+    banco = _BancoFalso()
+    tarefas = [asyncio.create_task(executar_exclusivo(banco, "op-1", "processar", processar, 5)) for _ in range(3)]
+    await asyncio.sleep(0)
+    liberar.set()
+
+    assert await asyncio.gather(*tarefas) == [{"processados": 3}] * 3
+    assert chamadas == 1
+    assert banco.tentativas == 1
+    assert locks._em_execucao == {}
+
+
+async def test_acoes_diferentes_nao_sao_coalescidas():
+    async def acao(nome):
+        await asyncio.sleep(0)
+        return nome
+
+    resultados = await asyncio.gather(
+        executar_exclusivo(_BancoFalso(), "op-1", "processar", lambda: acao("processar"), 5),
+        executar_exclusivo(_BancoFalso(), "op-1", "enviar:preview", lambda: acao("enviar"), 5),
+    )
+
+    assert resultados == ["processar", "enviar"]
+
+
+async def test_erro_chega_a_quem_aguardava():
+    liberar = asyncio.Event()
+
+    async def falhar():
+        await liberar.wait()
+        raise ValueError("falhou")
+
+    tarefas = [asyncio.create_task(executar_exclusivo(_BancoFalso(), "op-1", "processar", falhar, 5)) for _ in range(2)]
+    await asyncio.sleep(0)
+    liberar.set()
+
+    resultados = await asyncio.gather(*tarefas, return_exceptions=True)
+    assert [type(r) for r in resultados] == [ValueError, ValueError]
+
+
+async def test_quem_aguardava_assume_se_o_executor_for_cancelado():
+    iniciou = asyncio.Event()
+    chamadas = 0
+
+    async def processar():
+        nonlocal chamadas
+        chamadas += 1
+        if chamadas == 1:
+            iniciou.set()
+            await asyncio.Event().wait()  # cliente desconecta antes de terminar
+        return "ok"
+
+    primeira = asyncio.create_task(executar_exclusivo(_BancoFalso(), "op-1", "processar", processar, 5))
+    await iniciou.wait()
+    segunda = asyncio.create_task(executar_exclusivo(_BancoFalso(), "op-1", "processar", processar, 5))
+    await asyncio.sleep(0)
+    primeira.cancel()
+
+    assert await segunda == "ok"
+    assert chamadas == 2
+    with pytest.raises(asyncio.CancelledError):
+        await primeira
+
+
+async def test_cancelar_quem_aguardava_nao_afeta_o_executor():
+    liberar = asyncio.Event()
+
+    async def processar():
+        await liberar.wait()
+        return "ok"
+
+    primeira = asyncio.create_task(executar_exclusivo(_BancoFalso(), "op-1", "processar", processar, 5))
+    await asyncio.sleep(0)
+    segunda = asyncio.create_task(executar_exclusivo(_BancoFalso(), "op-1", "processar", processar, 5))
+    await asyncio.sleep(0)
+    segunda.cancel()
+    liberar.set()
+
+    assert await primeira == "ok"
+    with pytest.raises(asyncio.CancelledError):
+        await segunda
+
+
+async def test_lock_de_outro_processo_sem_espera():
+    async def processar():
+        raise AssertionError("nao deveria executar")
+
+    banco = _BancoFalso(False)
+    with pytest.raises(OperacaoOcupada):
+        await executar_exclusivo(banco, "op-1", "processar", processar, 0)
+
+    assert banco.tentativas == 1
+    assert locks._em_execucao == {}
+
+
+async def test_lock_de_outro_processo_com_espera():
+    async def processar():
+        return "ok"
+
+    banco = _BancoFalso(False, False)
+
+    assert await executar_exclusivo(banco, "op-1", "processar", processar, 5) == "ok"
+    assert banco.tentativas == 3
@@ -0,0 +1,90 @@
+"""
+Fingerprint da validacao de cada boleto (app/services/memo_validacao.py).
+"""
+
+from types import SimpleNamespace
+
+import pytest
+
+from app.extractors.base import DadosBoleto
+from app.extractors.factory import versao_extrator
+from app.services import memo_validacao
+from app.services.extracao import campos_extraidos
+from app.services.memo_validacao import dados_boleto_do_registro, extracao_utilizavel, fingerprint_validacao
+
+XML = SimpleNamespace(id="7b0c1f4e-8a1d-4c9e-9f53-2d1f0a6b3c21", versao=1)
+
+
+def _dados(**campos) -> DadosBoleto:
+    padrao = {
+        "pagador": "Cliente Ltda",
+        "cnpj": "11.222.333/0001-81",
+        "numero_nota": "123",
+        "vencimento": "10-11",
+        "vencimento_completo": "10/11/2026",
+        "valor_centavos": 100000,
+        "valor_formatado": "R$ 1.000,00",
+        "fidc_detectada": "CAPITAL",
+    }
+    padrao.update(campos)
+    return DadosBoleto(**padrao)
+
+
+def test_fingerprint_do_boleto_gravado_bate_com_a_extracao():
+    dados = _dados()
+    boleto = SimpleNamespace(**campos_extraidos(dados, "renomeado.pdf"))
+
+    assert fingerprint_validacao(dados_boleto_do_registro(boleto), "CAPITAL", XML, None) == (
+        fingerprint_validacao(dados, "CAPITAL", XML, None)
+    )
+
+
+@pytest.mark.parametrize(
+    "campos",
+    [{"numero_nota": None}, {"numero_nota": ""}, {"valor_centavos": None}, {"vencimento": None}],
+)
+def test_extracao_incompleta_nao_tem_fingerprint(campos):
+    dados = _dados(**campos)
+
+    assert not extracao_utilizavel(dados)
+    assert fingerprint_validacao(dados, "CAPITAL", XML, None) is None
+
+
+def test_valor_zero_e_extracao_utilizavel():
+    assert fingerprint_validacao(_dados(valor_centavos=0), "CAPITAL", XML, None) is not None
+
+
+@pytest.mark.parametrize(
+    "mudanca",
+    [
+        {"dados": _dados(valor_centavos=100001)},
+        {"dados": _dados(pagador="Outro Cliente")},
+        {"extrator": "NOVAX"},
+        {"xml_record": SimpleNamespace(id=XML.id, versao=2)},
+        {"xml_record": None},
+        {"vinculo": {"xml_id": XML.id, "automatico": True, "confianca": 0.9}},
+    ],
+)
+def test_qualquer_entrada_muda_o_fingerprint(mudanca):
+    base = {"dados": _dados(), "extrator": "CAPITAL", "xml_record": XML, "vinculo": None}
+
+    assert fingerprint_validacao(**{**base, **mudanca}) != fingerprint_validacao(**base)
+
+
+def test_versao_das_regras_e_do_extrator_mudam_o_fingerprint(monkeypatch):
+    antes = fingerprint_validacao(_dados(), "CAPITAL", XML, None)
+
+    monkeypatch.setattr(memo_validacao, "VERSAO_REGRAS", "0000.00.0")
+    assert fingerprint_validacao(_dados(), "CAPITAL", XML, None) != antes
+    monkeypatch.undo()
+
+    monkeypatch.setattr(memo_validacao, "versao_extrator", lambda nome: "outra")
+    assert fingerprint_validacao(_dados(), "CAPITAL", XML, None) != antes
+
+
+def test_versao_extrator():
+    assert len(versao_extrator("CAPITAL")) == 16
+    assert versao_extrator("capital ") == versao_extrator("CAPITAL")
+    assert versao_extrator("CAPITAL") != versao_extrator("NOVAX")
+    # FIDC sem extrator especializado: versao do GenericExtractor
+    assert versao_extrator("FIDC NOVO") == versao_extrator("OUTRO FIDC")
@@ -0,0 +1,95 @@
+"""
+Orcamento de consultas por endpoint (app/services/consultas_sql.py).
+
+Os orcamentos nao dependem do numero de envios/arquivos: um N+1 (consulta
+por envio ou por arquivo) estoura o limite com os volumes usados aqui.
+Precisam de TEST_DATABASE_URL (ver conftest.py).
+"""
+
+import uuid
+
+import pytest
+
+from app.models.boleto import Boleto
+from app.models.envio import Envio
+from app.models.fidc import Fidc
+from app.models.operacao import Operacao
+from app.models.xml_nfe import XmlNfe
+from app.services.consultas_sql import orcamento_consultas
+
+pytestmark = pytest.mark.anyio
+
+VOLUME = 12
+
+
+async def _operacao(banco, usuario) -> Operacao:
+    fidc = Fidc(nome=f"T{uuid.uuid4().hex[:8]}", nome_completo="FIDC de teste", cor="#000000")
+    banco.add(fidc)
+    await banco.flush()
+    op = Operacao(numero=f"OP-{uuid.uuid4().hex[:8]}", fidc_id=fidc.id, usuario_id=usuario.id, status="aguardando_envio")
+    banco.add(op)
+    await banco.flush()
+    return op
+
+
+class _MailerFalso:
+    def send_email(self, group) -> None:
+        pass
+
+
+async def test_confirmar_todos_envios(banco, usuario, cliente, monkeypatch):
+    from app.routers import operacoes
+
+    monkeypatch.setattr(operacoes, "criar_mailer", _MailerFalso)
+
+    op = await _operacao(banco, usuario)
+    for i in range(VOLUME):
+        xml = XmlNfe(operacao_id=op.id, nome_arquivo=f"{i}.xml", numero_nota=str(i))
+        banco.add(xml)
+        banco.add(XmlNfe(operacao_id=op.id, nome_arquivo=f"{i}.pdf", numero_nota=str(i)))
+        boletos = [
+            Boleto(operacao_id=op.id, arquivo_original=f"{i}-{p}.pdf", numero_nota=str(i), status="aprovado")
+            for p in range(2)
+        ]
+        banco.add_all(boletos)
+        await banco.flush()
+        banco.add(Envio(
+            operacao_id=op.id, usuario_id=usuario.id, email_para=[f"c{i}@teste.local"],
+            assunto=f"Boletos NF {i}", modo="preview", status="rascunho",
+            boletos_ids=[b.id for b in boletos], xmls_anexados=[xml.nome_arquivo],
+        ))
+    await banco.commit()
+
+    with orcamento_consultas(15):
+        resposta = await cliente.post(f"/api/v1/operacoes/{op.id}/envios/confirmar-todos")
+
+    assert resposta.status_code == 200, resposta.text
+    assert resposta.json()["emails_enviados"] == VOLUME
+
+
+def _nfe(numero: int) -> bytes:
+    return f"""<?xml version="1.0" encoding="UTF-8"?>
+<nfeProc xmlns="http://www.portalfiscal.inf.br/nfe"><NFe><infNFe Id="NFe{numero:044d}">
+  <ide><nNF>{numero}</nNF></ide>
+  <dest><CNPJ>11222333000181</CNPJ><xNome>CLIENTE {numero}</xNome><email>c{numero}@teste.local</email></dest>
+  <total><ICMSTot><vNF>100.00</vNF></ICMSTot></total>
+</infNFe></NFe></nfeProc>""".encode()
+
+
+async def test_upload_xmls(banco, usuario, cliente):
+    op = await _operacao(banco, usuario)
+    op.status = "em_processamento"
+    await banco.commit()
+
+    # XMLs e os PDFs das mesmas NFs (enriquecidos com os dados do XML)
+    arquivos = [("files", (f"{n}.xml", _nfe(n), "application/xml")) for n in range(1, VOLUME + 1)]
+    arquivos += [("files", (f"3-{n:07d}.pdf", b"%PDF-1.4", "application/pdf")) for n in range(1, VOLUME + 1)]
+
+    with orcamento_consultas(10):
+        resposta = await cliente.post(f"/api/v1/operacoes/{op.id}/xmls/upload", files=arquivos)
+
+    assert resposta.status_code == 200, resposta.text
+    corpo = resposta.json()
+    assert corpo["total_xmls"] == 2 * VOLUME
+    pdfs = [x for x in corpo["xmls"] if x["nome_arquivo"].endswith(".pdf")]
+    assert all(x["cnpj"] == "11222333000181" for x in pdfs)
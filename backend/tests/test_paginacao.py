@@ -0,0 +1,82 @@
+"""
+Cursor opaco da paginacao keyset (app/services/paginacao.py).
+"""
+
+import base64
+import uuid
+from datetime import datetime, timezone
+
+import pytest
+from sqlalchemy import column
+from sqlalchemy.dialects import postgresql
+
+from app.services.paginacao import Cursor, CursorInvalido, apos_cursor, codificar_cursor, decodificar_cursor
+
+CRIADO_EM = datetime(2026, 10, 19, 13, 45, 7, 123456, tzinfo=timezone.utc)
+ID = uuid.UUID("7b0c1f4e-8a1d-4c9e-9f53-2d1f0a6b3c21")
+
+
+def test_ida_e_volta():
+    token = codificar_cursor(CRIADO_EM, ID)
+
+    assert decodificar_cursor(token) == Cursor(CRIADO_EM, ID, None)
+    # Opaco e seguro em query string: base64 urlsafe sem padding
+    assert "=" not in token and "+" not in token and "/" not in token
+
+
+def test_ida_e_volta_com_rank():
+    token = codificar_cursor(CRIADO_EM, ID, rank=0.0759)
+
+    assert decodificar_cursor(token) == Cursor(CRIADO_EM, ID, 0.0759)
+
+
+def test_rank_zero_e_mantido():
+    assert decodificar_cursor(codificar_cursor(CRIADO_EM, ID, rank=0.0)).rank == 0.0
+
+
+def _token(bruto: bytes) -> str:
+    return base64.urlsafe_b64encode(bruto).decode().rstrip("=")
+
+
+@pytest.mark.parametrize(
+    "token",
+    [
+        "",
+        "nao-e-base64!",
+        _token(b"\xff\xfe"),
+        _token(b"nao e json"),
+        _token(b"[]"),
+        _token(b'{"c": "2026-10-19T13:45:07"}'),
+        _token(b'{"c": "ontem", "i": "7b0c1f4e-8a1d-4c9e-9f53-2d1f0a6b3c21"}'),
+        _token(b'{"c": "2026-10-19T13:45:07", "i": "123"}'),
+        _token(b'{"c": 1, "i": "7b0c1f4e-8a1d-4c9e-9f53-2d1f0a6b3c21"}'),
+        _token(b'{"c": "2026-10-19T13:45:07", "i": "7b0c1f4e-8a1d-4c9e-9f53-2d1f0a6b3c21", "r": "x"}'),
+    ],
+)
+def test_cursor_invalido(token):
+    with pytest.raises(CursorInvalido):
+        decodificar_cursor(token)
+
+
+def _compilar(condicao) -> tuple[str, list]:
+    compilado = condicao.compile(dialect=postgresql.dialect())
+    return str(compilado).split(" < ")[0], list(compilado.params.values())
+
+
+def test_apos_cursor():
+    condicao = apos_cursor(Cursor(CRIADO_EM, ID), column("created_at"), column("id"))
+
+    assert _compilar(condicao) == ("(created_at, id)", [CRIADO_EM, ID])
+
+
+def test_apos_cursor_com_rank():
+    cursor = Cursor(CRIADO_EM, ID, 0.5)
+
+    condicao = apos_cursor(cursor, column("created_at"), column("id"), rank=column("rank"))
+
+    assert _compilar(condicao) == ("(rank, created_at, id)", [0.5, CRIADO_EM, ID])
+
+
+def test_apos_cursor_sem_rank_na_busca_por_relevancia():
+    with pytest.raises(CursorInvalido):
+        apos_cursor(Cursor(CRIADO_EM, ID), column("created_at"), column("id"), rank=column("rank"))
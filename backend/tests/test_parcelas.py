@@ -0,0 +1,104 @@
+"""
+Conciliacao de parcelas boleto x duplicata (app/services/parcelas.py).
+"""
+
+from datetime import date
+
+from app.services.parcelas import BoletoParcela, conciliar_parcelas, vencimento_iso
+
+DUPLICATAS = [
+    {"numero": "001", "vencimento": "2026-11-10", "valor_centavos": 100000},
+    {"numero": "002", "vencimento": "2026-12-10", "valor_centavos": 100000},
+    {"numero": "003", "vencimento": "2027-01-10", "valor": 1000.0},
+]
+
+
+def test_vencimento_iso():
+    assert vencimento_iso(date(2026, 11, 10)) == "2026-11-10"
+    assert vencimento_iso("2026-11-10") == "2026-11-10"
+    assert vencimento_iso("") is None
+    assert vencimento_iso(None) is None
+
+
+def test_sem_duplicatas():
+    resultado = conciliar_parcelas("123", [], [BoletoParcela("b1", "2026-11-10", 100000)])
+
+    assert resultado.atribuicoes == {}
+    assert resultado.alertas() == []
+
+
+def test_todas_as_parcelas_por_vencimento_e_valor():
+    boletos = [
+        BoletoParcela("b3", "2027-01-10", 100000),
+        BoletoParcela("b1", "2026-11-10", 100000),
+        BoletoParcela("b2", "2026-12-10", 100000),
+    ]
+
+    resultado = conciliar_parcelas("123", DUPLICATAS, boletos)
+
+    assert {b: p["numero"] for b, p in resultado.atribuicoes.items()} == {"b1": "001", "b2": "002", "b3": "003"}
+    assert resultado.atribuicoes["b3"] == {
+        "numero": "003", "vencimento": "2027-01-10", "valor": 1000.0, "criterio": "vencimento_valor",
+    }
+    assert resultado.alertas() == []
+
+
+def test_criterios_valor_e_vencimento():
+    duplicatas = [
+        {"numero": "001", "vencimento": "2026-11-10", "valor_centavos": 100000},
+        {"numero": "002", "vencimento": "2026-12-10", "valor_centavos": 150000},
+    ]
+    boletos = [
+        # Vencimento divergente: casa pelo valor
+        BoletoParcela("b1", "2026-11-15", 100000),
+        # Valor com juros: casa pelo vencimento
+        BoletoParcela("b2", "2026-12-10", 151234),
+    ]
+
+    resultado = conciliar_parcelas("123", duplicatas, boletos)
+
+    assert resultado.atribuicoes["b1"]["numero"] == "001"
+    assert resultado.atribuicoes["b1"]["criterio"] == "valor"
+    assert resultado.atribuicoes["b2"]["numero"] == "002"
+    assert resultado.atribuicoes["b2"]["criterio"] == "vencimento"
+    assert [a["tipo"] for a in resultado.alertas()] == ["desigual"]
+
+
+def test_faltante_duplicada_e_sem_parcela():
+    boletos = [
+        BoletoParcela("b1", "2026-11-10", 100000),
+        BoletoParcela("b1-copia", "2026-11-10", 100000),
+        BoletoParcela("b9", "2030-01-01", 1),
+    ]
+
+    resultado = conciliar_parcelas("123", DUPLICATAS, boletos)
+
+    assert resultado.atribuicoes["b1"]["numero"] == "001"
+    assert resultado.duplicados == ["b1-copia"]
+    assert resultado.sem_parcela == ["b9"]
+    assert [f["numero"] for f in resultado.faltantes] == ["002", "003"]
+    assert resultado.faltantes[0] == {"numero": "002", "vencimento": "2026-12-10", "valor": 1000.0}
+    assert [a["tipo"] for a in resultado.alertas()] == ["faltante", "faltante", "duplicada", "sem_parcela"]
+    assert all(a["numero_nota"] == "123" for a in resultado.alertas())
+
+
+def test_parcelas_iguais_sem_vencimento_seguem_a_ordem():
+    boletos = [BoletoParcela(f"b{i}", None, 100000) for i in range(3)]
+
+    resultado = conciliar_parcelas("123", DUPLICATAS, boletos)
+
+    assert {b: p["numero"] for b, p in resultado.atribuicoes.items()} == {"b0": "001", "b1": "002", "b2": "003"}
+    assert all(p["criterio"] == "valor" for p in resultado.atribuicoes.values())
+    assert resultado.parcelas_desiguais is False
+
+
+def test_cada_duplicata_atribuida_uma_vez():
+    duplicatas = [{"numero": f"{i:03d}", "vencimento": f"2027-{i:02d}-10", "valor_centavos": 5000} for i in range(1, 13)]
+    boletos = [BoletoParcela(f"b{i:02d}", None, 5000) for i in range(20)]
+
+    resultado = conciliar_parcelas("123", duplicatas, boletos)
+
+    numeros = [p["numero"] for p in resultado.atribuicoes.values()]
+    assert len(numeros) == 12 and len(set(numeros)) == 12
+    assert len(resultado.sem_parcela) == 8
+    assert resultado.faltantes == []
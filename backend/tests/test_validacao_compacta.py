@@ -0,0 +1,179 @@
+"""
+Colunas compactas da validacao em 5 camadas (app/services/validacao_compacta.py).
+
+A leitura (``decodificar_camada``) tem de devolver exatamente o dict que o
+validador produziria, a partir das colunas gravadas por ``codificar``.
+"""
+
+from types import SimpleNamespace
+
+import pytest
+
+from app.extractors import validator as v
+from app.extractors.base import DadosBoleto
+from app.extractors.xml_parser import DadosXmlNfe
+from app.services import validacao_compacta as vc
+
+
+def _boleto(**campos) -> DadosBoleto:
+    padrao = {
+        "pagador": "Cliente Exemplo Ltda",
+        "cnpj": "11.222.333/0001-81",
+        "numero_nota": "000123",
+        "vencimento_completo": "10/11/2026",
+        "valor_centavos": 100000,
+    }
+    padrao.update(campos)
+    return DadosBoleto(**padrao)
+
+
+def _xml(**campos) -> DadosXmlNfe:
+    padrao = {
+        "numero_nota": "123",
+        "cnpj": "11222333000181",
+        "nome_destinatario": "CLIENTE EXEMPLO LTDA",
+        "valor_total_centavos": 300000,
+        "emails": ["financeiro@cliente.local"],
+        "emails_invalidos": ["invalido@"],
+        "duplicatas": [
+            {"numero": "001", "vencimento": "2026-11-10", "valor_centavos": 100000},
+            {"numero": "002", "vencimento": "2026-12-10", "valor_centavos": 200000},
+        ],
+    }
+    padrao.update(campos)
+    return DadosXmlNfe(**padrao)
+
+
+VINCULO = {"xml_id": "x1", "numero_nota": "123", "confianca": 0.9, "caminho": ["cnpj", "duplicata"], "automatico": True}
+CANDIDATO = dict(VINCULO, confianca=0.8, caminho=["cnpj", "valor_total"], automatico=False)
+
+CENARIOS = {
+    "aprovado": (_boleto(), _xml(), None),
+    "sem_xml": (_boleto(), None, None),
+    "sem_xml_com_candidato": (_boleto(numero_nota="999"), None, CANDIDATO),
+    "xml_invalido": (_boleto(), _xml(xml_valido=False, erro="tag vNF ausente"), None),
+    "nf_divergente": (_boleto(numero_nota="124"), _xml(), None),
+    "vinculo_automatico": (_boleto(numero_nota="999"), _xml(), VINCULO),
+    "cnpj_divergente": (_boleto(cnpj="99.888.777/0001-66"), _xml(), None),
+    "cnpj_indisponivel": (_boleto(cnpj=None), _xml(), None),
+    "nome_baixo": (_boleto(pagador="Outra Empresa SA"), _xml(), None),
+    "nome_indisponivel": (_boleto(pagador=None), _xml(), None),
+    "valor_divergente": (_boleto(valor_centavos=100123), _xml(), None),
+    "valor_total": (_boleto(vencimento_completo=None, valor_centavos=300000), _xml(), None),
+    "valor_boleto_indisponivel": (_boleto(valor_centavos=None), _xml(), None),
+    "valor_xml_indisponivel": (_boleto(vencimento_completo=None), _xml(valor_total_centavos=0), None),
+    "sem_email": (_boleto(), _xml(emails=[]), None),
+    "sem_email_nem_invalidos": (_boleto(), _xml(emails=[], emails_invalidos=[]), None),
+}
+
+
+def _registro(dados: DadosBoleto, colunas: dict) -> SimpleNamespace:
+    """Boleto gravado: dados extraidos + colunas compactas."""
+    return SimpleNamespace(
+        numero_nota=dados.numero_nota,
+        cnpj=dados.cnpj,
+        pagador=dados.pagador,
+        valor_centavos=dados.valor_centavos,
+        **colunas,
+    )
+
+
+def _esperado(camada: v.ResultadoCamada) -> dict:
+    return {
+        "camada": camada.camada,
+        "nome": camada.nome,
+        "aprovado": camada.aprovado,
+        "mensagem": camada.mensagem,
+        "bloqueia": camada.bloqueia,
+        "detalhes": camada.detalhes,
+    }
+
+
+@pytest.mark.parametrize("cenario", CENARIOS)
+def test_ida_e_volta(cenario):
+    dados, dados_xml, vinculo = CENARIOS[cenario]
+    camadas = v.validar_5_camadas(dados, dados_xml, vinculo).camadas
+
+    colunas = vc.codificar(camadas, dados.numero_nota, dados.cnpj, dados.valor_centavos)
+    boleto = _registro(dados, colunas)
+
+    assert [vc.decodificar_camada(boleto, n) for n in range(1, 6)] == [_esperado(c) for c in camadas]
+
+
+def test_extra_so_guarda_o_que_difere_do_boleto():
+    dados = _boleto()
+    camadas = v.validar_5_camadas(dados, _xml()).camadas
+
+    colunas = vc.codificar(camadas, dados.numero_nota, dados.cnpj, dados.valor_centavos)
+
+    assert colunas["validacao_mascara"] == 0b11111
+    assert colunas["validacao_diferenca_centavos"] == 0
+    assert set(colunas["validacao_extra"]) == {"nome_xml", "emails", "emails_invalidos"}
+
+
+def test_boleto_nao_validado():
+    boleto = _registro(_boleto(), vc.vazio())
+
+    assert [vc.decodificar_camada(boleto, n) for n in range(1, 6)] == [None] * 5
+
+
+def test_codigo_e_mascaras():
+    codigos = 0
+    for n in range(1, 6):
+        codigos |= (n + 10) << (4 * (n - 1))
+
+    assert [vc.codigo(codigos, n) for n in range(1, 6)] == [11, 12, 13, 14, 15]
+    assert vc.codigo(None, 3) == 0
+    assert vc.MASCARA_BLOQUEIA == 0b1111100000
+    assert all(vc.bit_aprovado(n) & vc.MASCARA_BLOQUEIA == 0 for n in range(1, 6))
+
+
+def test_substituir_camada():
+    dados = _boleto()
+    dados_xml = _xml(emails=[])
+    camadas = v.validar_5_camadas(dados, dados_xml).camadas
+    boleto = _registro(dados, vc.codificar(camadas, dados.numero_nota, dados.cnpj, dados.valor_centavos))
+    assert vc.decodificar_camada(boleto, 5)["bloqueia"] is True
+
+    # Emails editados: so a Camada 5 e regravada
+    dados_xml.emails = ["novo@cliente.local"]
+    nova = v.revalidar_camada5(dados_xml)
+    for coluna, valor in vc.substituir_camada(boleto, nova).items():
+        setattr(boleto, coluna, valor)
+
+    assert vc.decodificar_camada(boleto, 5) == _esperado(nova)
+    outras = v.validar_5_camadas(dados, dados_xml).camadas[:4]
+    assert [vc.decodificar_camada(boleto, n) for n in range(1, 5)] == [_esperado(c) for c in outras]
+    assert not boleto.validacao_mascara & vc.MASCARA_BLOQUEIA
+
+
+def test_substituir_camada_com_coluna_propria():
+    dados = _boleto()
+    camadas = v.validar_5_camadas(dados, _xml()).camadas
+    boleto = _registro(dados, vc.codificar(camadas, dados.numero_nota, dados.cnpj, dados.valor_centavos))
+
+    nova = v.validar_5_camadas(dados, _xml(duplicatas=[], valor_total_centavos=90000)).camadas[3]
+    valores = vc.substituir_camada(boleto, nova)
+
+    assert valores["validacao_diferenca_centavos"] == 10000
+    assert "validacao_similaridade" not in valores
+
+
+def test_anotar_parcela():
+    dados = _boleto()
+    camadas = v.validar_5_camadas(dados, _xml()).camadas
+    boleto = _registro(dados, vc.codificar(camadas, dados.numero_nota, dados.cnpj, dados.valor_centavos))
+    parcela = {"numero": "001", "vencimento": "2026-11-10", "valor": 1000.0, "criterio": "vencimento_valor"}
+
+    vc.anotar_parcela(boleto, parcela=parcela)
+    assert vc.decodificar_camada(boleto, 4)["detalhes"]["parcela"] == parcela
+    # As chaves das outras camadas continuam no extra
+    assert vc.decodificar_camada(boleto, 5)["detalhes"]["emails"] == ["financeiro@cliente.local"]
+
+    vc.anotar_parcela(boleto, alerta="duplicada")
+    detalhes = vc.decodificar_camada(boleto, 4)["detalhes"]
+    assert detalhes["alerta_parcela"] == "duplicada"
+    assert "parcela" not in detalhes
+
+    vc.anotar_parcela(boleto)
+    assert set(vc.decodificar_camada(boleto, 4)["detalhes"]) == {"valor_boleto", "valor_xml"}
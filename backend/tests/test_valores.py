@@ -0,0 +1,57 @@
+"""
+Conversao de valores monetarios para centavos inteiros (app/extractors).
+"""
+
+import pytest
+
+from app.extractors.base import BaseExtractor, formatar_centavos
+from app.extractors.xml_parser import _centavos, valor_centavos_duplicata
+
+
+@pytest.mark.parametrize(
+    "entrada, esperado",
+    [
+        ("2.833,34", (283334, "R$ 2.833,34")),
+        ("2833,34", (283334, "R$ 2.833,34")),
+        ("2833.34", (283334, "R$ 2.833,34")),
+        ("R$ 1.234.567,89", (123456789, "R$ 1.234.567,89")),
+        ("0,10", (10, "R$ 0,10")),
+        # Arredondamento comercial (meio para cima), sem erro de float
+        ("0,005", (1, "R$ 0,01")),
+        ("0,004", (0, "R$ 0,00")),
+        ("1,115", (112, "R$ 1,12")),
+    ],
+)
+def test_formatar_valor(entrada, esperado):
+    assert BaseExtractor.formatar_valor(entrada) == esperado
+
+
+@pytest.mark.parametrize("entrada", [None, "", "R$", "abc", "1,2,3"])
+def test_formatar_valor_invalido(entrada):
+    assert BaseExtractor.formatar_valor(entrada) == (None, None)
+
+
+@pytest.mark.parametrize(
+    "centavos, esperado",
+    [(0, "R$ 0,00"), (5, "R$ 0,05"), (100, "R$ 1,00"), (283334, "R$ 2.833,34"), (100000000, "R$ 1.000.000,00")],
+)
+def test_formatar_centavos(centavos, esperado):
+    assert formatar_centavos(centavos) == esperado
+
+
+@pytest.mark.parametrize(
+    "entrada, esperado",
+    [("1234.56", 123456), ("100", 10000), ("0.1", 10), ("1.005", 101), ("1.004", 100), ("2.675", 268)],
+)
+def test_centavos_xml(entrada, esperado):
+    assert _centavos(entrada) == esperado
+
+
+def test_valor_centavos_duplicata():
+    assert valor_centavos_duplicata({"valor_centavos": 1999, "valor": 99.0}) == 1999
+    assert valor_centavos_duplicata({"valor_centavos": 0, "valor": 99.0}) == 0
+    # Duplicatas gravadas antes da migracao so tem o valor em reais
+    assert valor_centavos_duplicata({"valor": 0.29}) == 29
+    assert valor_centavos_duplicata({"valor": 1416.67}) == 141667
+    assert valor_centavos_duplicata({"valor": None}) == 0
+    assert valor_centavos_duplicata({}) == 0
@@ -0,0 +1,154 @@
+"""
+Localizacao do XML de um boleto (app/services/xml_matcher.py).
+"""
+
+from types import SimpleNamespace
+
+from app.extractors.base import DadosBoleto
+from app.services.xml_matcher import IndiceXmls
+
+CNPJ = "11.222.333/0001-81"
+
+
+def _xml(numero_nota: str, nome_arquivo: str | None = None, **campos) -> SimpleNamespace:
+    """Registro XmlNfe falso, com os campos lidos pelo indice."""
+    padrao = {
+        "id": f"id-{numero_nota}",
+        "versao": 1,
+        "numero_nota": numero_nota,
+        "nome_arquivo": nome_arquivo or f"{numero_nota}.xml",
+        "xml_valido": True,
+        "cnpj": "11222333000181",
+        "nome_destinatario": "CLIENTE LTDA",
+        "valor_total_centavos": 300000,
+        "emails": ["cliente@teste.local"],
+        "emails_invalidos": [],
+        "duplicatas": [
+            {"numero": "001", "vencimento": "2026-11-10", "valor_centavos": 100000},
+            {"numero": "002", "vencimento": "2026-12-10", "valor": 2000.0},
+        ],
+    }
+    padrao.update(campos)
+    return SimpleNamespace(**padrao)
+
+
+def _boleto(**campos) -> DadosBoleto:
+    padrao = {
+        "pagador": "Cliente Ltda",
+        "cnpj": CNPJ,
+        "numero_nota": "999",
+        "vencimento_completo": "10/11/2026",
+        "valor_centavos": 100000,
+    }
+    padrao.update(campos)
+    return DadosBoleto(**padrao)
+
+
+def test_nf_direta_ignora_zeros_a_esquerda():
+    xml = _xml("123")
+    indice = IndiceXmls.from_registros([xml])
+
+    registro, dados, vinculo = indice.localizar(_boleto(numero_nota="000123"))
+
+    assert registro is xml
+    assert dados.numero_nota == "123"
+    assert vinculo is None
+
+
+def test_xml_tem_prioridade_sobre_pdf_da_mesma_nf():
+    xml = _xml("123")
+    pdf = _xml("123", nome_arquivo="123.pdf", id="id-pdf")
+    indice = IndiceXmls.from_registros([xml, pdf])
+
+    assert indice.buscar("123")[0] is xml
+
+
+def test_vinculo_automatico_com_duplicata():
+    xml = _xml("123")
+    indice = IndiceXmls.from_registros([xml])
+
+    registro, dados, vinculo = indice.localizar(_boleto())
+
+    assert registro is xml
+    assert dados.numero_nota == "123"
+    assert vinculo["automatico"] is True
+    assert vinculo["xml_id"] == "id-123"
+    assert vinculo["caminho"][:2] == ["cnpj", "duplicata"]
+
+
+def test_duplicata_gravada_em_reais():
+    indice = IndiceXmls.from_registros([_xml("123")])
+
+    candidato = indice.sugerir(_boleto(vencimento_completo="10/12/2026", valor_centavos=200000))
+
+    assert candidato is not None
+    assert candidato.automatico is True
+    assert "duplicata" in candidato.caminho
+
+
+def test_sem_duplicata_fica_so_como_sugestao():
+    indice = IndiceXmls.from_registros([_xml("123")])
+
+    # CNPJ + valor total + nome: confianca alta, mas sem evidencia de duplicata
+    registro, dados, vinculo = indice.localizar(_boleto(vencimento_completo=None, valor_centavos=300000))
+
+    assert registro is None and dados is None
+    assert vinculo["automatico"] is False
+    assert vinculo["confianca"] == 1.0
+    assert "duplicata" not in vinculo["caminho"]
+
+
+def test_confianca_baixa_nao_gera_sugestao():
+    indice = IndiceXmls.from_registros([_xml("123")])
+
+    # Apenas o nome confere (0.2)
+    assert indice.localizar(_boleto(cnpj=None, valor_centavos=1)) == (None, None, None)
+
+
+def test_empate_nao_vincula_automaticamente():
+    indice = IndiceXmls.from_registros([_xml("123"), _xml("456")])
+
+    candidato = indice.sugerir(_boleto())
+
+    assert candidato is not None
+    assert candidato.automatico is False
+
+
+def test_xml_invalido_nao_e_candidato():
+    indice = IndiceXmls.from_registros([_xml("123", xml_valido=False)])
+
+    assert indice.sugerir(_boleto()) is None
+
+
+def test_nf_de_outro_boleto_nao_e_candidata():
+    indice = IndiceXmls.from_registros([_xml("123")], nfs_boletos=["0123"])
+
+    assert indice.sugerir(_boleto()) is None
+    # A NF continua disponivel para o proprio boleto
+    assert indice.localizar(_boleto(numero_nota="123"))[2] is None
+
+
+def test_vinculo_automatico_reserva_a_nf():
+    xml = _xml("123")
+    indice = IndiceXmls.from_registros([xml])
+
+    assert indice.localizar(_boleto())[0] is xml
+    # O mesmo XML nunca vai automaticamente para um segundo boleto
+    assert indice.localizar(_boleto(numero_nota="998")) == (None, None, None)
+
+
+def test_nf_direta_reserva_a_nf():
+    indice = IndiceXmls.from_registros([_xml("123")])
+
+    indice.localizar(_boleto(numero_nota="123"))
+
+    assert indice.sugerir(_boleto()) is None
+
+
+def test_localizar_sem_reservar():
+    xml = _xml("123")
+    indice = IndiceXmls.from_registros([xml])
+
+    assert indice.localizar(_boleto(), reservar=False)[0] is xml
+    assert indice.localizar(_boleto(numero_nota="123"), reservar=False)[0] is xml
+    assert indice.localizar(_boleto(numero_nota="998"))[0] is xml